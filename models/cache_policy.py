@@ -0,0 +1,197 @@
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator, Optional, Tuple
+
+def approx_size(value: Any) -> int:
+    """Approximate the memory held by a value and the containers nested in it."""
+    stack = [value]
+    seen = set()
+    size = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(type(item), "__slots__"):
+            stack.extend(getattr(item, name) for name in type(item).__slots__ if hasattr(item, name))
+    return size
+
+class FrequencySketch:
+    """Count-min sketch estimating how often keys were accessed recently.
+
+    Counters are halved once ``sample_size`` increments have been recorded,
+    so the estimates follow recent popularity.
+    """
+
+    _ROWS = 4
+
+    def __init__(self, width: int = 4096, sample_size: Optional[int] = None):
+        self.width = 1 << max(4, (width - 1).bit_length())
+        self._mask = self.width - 1
+        self._table = [array("H", bytes(2 * self.width)) for _ in range(self._ROWS)]
+        self.sample_size = sample_size or self.width * 10
+        self._additions = 0
+
+    def _indexes(self, key: Hashable) -> Iterator[int]:
+        h = hash(key)
+        for row in range(self._ROWS):
+            yield (h ^ (h >> (16 + row)) ^ (0x9E3779B9 * (row + 1))) & self._mask
+
+    def increment(self, key: Hashable):
+        for row, index in zip(self._table, self._indexes(key)):
+            if row[index] < 0xFFFF:
+                row[index] += 1
+        self._additions += 1
+        if self._additions >= self.sample_size:
+            self._reset()
+
+    def frequency(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self._table, self._indexes(key)))
+
+    def _reset(self):
+        for row in self._table:
+            for i in range(len(row)):
+                row[i] >>= 1
+        self._additions //= 2
+
+class BoundedCache:
+    """Mapping bounded by the approximate bytes of its values, with a TTL.
+
+    ``policy`` picks what is evicted when the byte budget is exceeded:
+
+    - "lru": the least recently used entry.
+    - "lfu": the least frequently used among the ``sample`` least recent entries.
+    - "tinylfu": LRU eviction behind a TinyLFU admission filter; a new entry
+      only displaces the LRU victim if it has been requested more often, so
+      one-off lookups cannot push hot entries out.
+    """
+
+    POLICIES = ("lru", "lfu", "tinylfu")
+
+    def __init__(self, max_bytes: int, ttl: float, policy: str = "tinylfu",
+                 sizeof: Callable[[Any], int] = approx_size, sample: int = 8,
+                 timer: Callable[[], float] = time.monotonic):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy}")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self.sizeof = sizeof
+        self.sample = sample
+        self.timer = timer
+        self.current_bytes = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, int, float]]" = OrderedDict()
+        self._sketch = FrequencySketch()
+        self.stats = {"evictions": 0, "expirations": 0, "admissions": 0, "rejections": 0}
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[2] > self.timer()
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._data))
+
+    def __getitem__(self, key: Hashable) -> Any:
+        value = self.get(key, _missing)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        self._sketch.increment(key)
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if item[2] <= self.timer():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            return default
+        self._data.move_to_end(key)
+        return item[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry without counting an access or refreshing its recency."""
+        item = self._data.get(key)
+        if item is None or item[2] <= self.timer():
+            return default
+        return item[0]
+
+    def __setitem__(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            self.stats["rejections"] += 1
+            return
+        if key in self._data:
+            self._remove(key)
+        elif self.policy == "tinylfu" and self.current_bytes + size > self.max_bytes:
+            victim = self._lru_victim()
+            if victim is not None and self._sketch.frequency(key) <= self._sketch.frequency(victim):
+                self.stats["rejections"] += 1
+                return
+        self._make_room(size)
+        self._data[key] = (value, size, self.timer() + self.ttl)
+        self.current_bytes += size
+        self.stats["admissions"] += 1
+
+    def __delitem__(self, key: Hashable):
+        if key not in self._data:
+            raise KeyError(key)
+        self._remove(key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        value = self._data[key][0]
+        self._remove(key)
+        return value
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
+
+    def _lru_victim(self) -> Optional[Hashable]:
+        """Return the entry next in line for eviction, dropping expired ones first."""
+        now = self.timer()
+        while self._data:
+            key, (_, _, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                return key
+            self._remove(key)
+            self.stats["expirations"] += 1
+        return None
+
+    def _choose_victim(self) -> Optional[Hashable]:
+        victim = self._lru_victim()
+        if victim is None or self.policy != "lfu":
+            return victim
+        candidates = []
+        for key in self._data:
+            candidates.append(key)
+            if len(candidates) >= self.sample:
+                break
+        return min(candidates, key=self._sketch.frequency)
+
+    def _make_room(self, size: int):
+        while self._data and self.current_bytes + size > self.max_bytes:
+            victim = self._choose_victim()
+            if victim is None:
+                break
+            self._remove(victim)
+            self.stats["evictions"] += 1
+
+_missing = object()
@@ -0,0 +1,361 @@
+import asyncio
+import sys
+from collections import deque
+from datetime import time
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from models.user_preferences import UserPreferences
+
+NO_LOCATION = -1
+NO_NOTIFICATION = -1
+_MINUTES = tuple(range(24 * 60))  # Shared int objects for notification minutes
+
+@lru_cache(maxsize=2048)
+def _parse_hhmm(value: str) -> int:
+    """Convert an "HH:MM" string into minutes after midnight."""
+    try:
+        hour, minute = map(int, value.split(":"))
+        return _MINUTES[time(hour, minute).hour * 60 + minute]
+    except (ValueError, TypeError, AttributeError):
+        return NO_NOTIFICATION
+
+def parse_notification_minute(value) -> int:
+    """Convert a stored "HH:MM" string or a time into minutes after midnight."""
+    if value is None:
+        return NO_NOTIFICATION
+    if isinstance(value, time):
+        return _MINUTES[value.hour * 60 + value.minute]
+    if isinstance(value, str):
+        return _parse_hhmm(value)
+    return NO_NOTIFICATION
+
+class UserRecord:
+    """Compact, mutable view of one user's preferences.
+
+    Exposes the same attributes as UserPreferences, but stores the location as
+    an interned id and the notification time as minutes after midnight, and
+    keeps the registry's secondary indexes current when either changes.
+    """
+
+    __slots__ = ("user_id", "_location_id", "language", "temperature_unit",
+                 "_notification_minute", "temp_alert_thresholds", "daily_forecast", "_registry")
+
+    def __init__(self, registry: "UserRegistry", user_id: int, language: str = "es",
+                 temperature_unit: str = "C", temp_alert_thresholds: Optional[Tuple[float, float]] = None,
+                 daily_forecast: bool = False):
+        self._registry = registry
+        self.user_id = user_id
+        self._location_id = NO_LOCATION
+        self._notification_minute = NO_NOTIFICATION
+        self.language = sys.intern(language)
+        self.temperature_unit = sys.intern(temperature_unit)
+        self.temp_alert_thresholds = temp_alert_thresholds
+        self.daily_forecast = daily_forecast
+
+    @property
+    def location_id(self) -> int:
+        return self._location_id
+
+    @property
+    def location(self) -> Optional[str]:
+        if self._location_id == NO_LOCATION:
+            return None
+        return self._registry.location_name(self._location_id)
+
+    @location.setter
+    def location(self, value: Optional[str]):
+        self._registry._move_location(self, value)
+
+    @property
+    def notification_minute(self) -> int:
+        return self._notification_minute
+
+    @property
+    def notification_time(self) -> Optional[time]:
+        if self._notification_minute == NO_NOTIFICATION:
+            return None
+        return time(self._notification_minute // 60, self._notification_minute % 60)
+
+    @notification_time.setter
+    def notification_time(self, value):
+        self._registry._move_minute(self, parse_notification_minute(value))
+
+    def to_dict(self) -> dict:
+        """Convert the record to the dictionary format used by storage."""
+        minute = self._notification_minute
+        return {
+            "user_id": self.user_id,
+            "location": self.location,
+            "language": self.language,
+            "temperature_unit": self.temperature_unit,
+            "notification_time": f"{minute // 60:02d}:{minute % 60:02d}" if minute != NO_NOTIFICATION else None,
+            "temp_alert_thresholds": self.temp_alert_thresholds,
+            "daily_forecast": self.daily_forecast
+        }
+
+class UserRegistry:
+    """In-memory registry of every user's preferences, backed by a storage backend.
+
+    Lookups are plain dict hits with no decoding. Secondary indexes map
+    location ids and notification minutes to the users that have them.
+    The last ``changelog_size`` changes are kept as (version, user id)
+    pairs, so derived views can update only the users that changed.
+    """
+
+    def __init__(self, storage=None, changelog_size: int = 10000):
+        self.storage = storage
+        self._users: Dict[int, UserRecord] = {}
+        self._locations: List[str] = []
+        self._location_ids: Dict[str, int] = {}
+        self._by_location: Dict[int, Set[int]] = {}
+        self._by_minute: Dict[int, Set[int]] = {}
+        self.version = 0  # Bumped on every persisted change, for derived views
+        self._changelog: Deque[Tuple[int, int]] = deque(maxlen=changelog_size)
+        self._changelog_floor = 0  # Changes after this version are all in the log
+        self._cursor = "0-0"  # Position in the storage's change feed
+        if storage is not None:
+            # Taken before loading: changes made meanwhile are replayed by sync
+            self._cursor = storage.latest_change()
+            self.load(storage.iter_user_data())
+
+    def load(self, rows: Iterable[dict]):
+        """Populate the registry and its indexes from stored preference dictionaries.
+
+        This is the startup rebuild of the notification schedule, so it fills
+        the indexes directly instead of going through the per-record setters.
+        """
+        users, by_location, by_minute = self._users, self._by_location, self._by_minute
+        location_id = self.location_id
+        version = self.version + 1
+        for data in rows:
+            thresholds = data.get("temp_alert_thresholds")
+            user_id = int(data["user_id"])
+            record = UserRecord(
+                self,
+                user_id,
+                language=data.get("language") or "es",
+                temperature_unit=data.get("temperature_unit") or "C",
+                temp_alert_thresholds=tuple(thresholds) if thresholds else None,
+                daily_forecast=bool(data.get("daily_forecast"))
+            )
+            previous = users.get(user_id)
+            if previous is not None:
+                self._move_location(previous, None)
+                self._move_minute(previous, NO_NOTIFICATION)
+            users[user_id] = record
+            location = data.get("location")
+            if location:
+                record._location_id = location_id(location)
+                by_location.setdefault(record._location_id, set()).add(user_id)
+            minute = parse_notification_minute(data.get("notification_time"))
+            if minute != NO_NOTIFICATION:
+                record._notification_minute = minute
+                by_minute.setdefault(minute, set()).add(user_id)
+            self._log_change(version, user_id)
+        self.version = version
+
+    def _log_change(self, version: int, user_id: int):
+        if len(self._changelog) == self._changelog.maxlen:
+            self._changelog_floor = self._changelog[0][0]
+        self._changelog.append((version, user_id))
+
+    def _changed(self, user_id: int):
+        """Bump the version for a change to one user."""
+        self.version += 1
+        self._log_change(self.version, user_id)
+
+    def changed_since(self, version: int) -> Optional[Set[int]]:
+        """Return the ids of the users changed after ``version``.
+
+        Returns None when older changes have dropped out of the log, and the
+        caller must rebuild from every user instead.
+        """
+        if version < self._changelog_floor:
+            return None
+        return {user_id for changed, user_id in self._changelog if changed > version}
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __iter__(self) -> Iterator[UserRecord]:
+        return iter(list(self._users.values()))
+
+    def location_id(self, location: str) -> int:
+        """Return the interned id of a location, assigning one if needed."""
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            location_id = len(self._locations)
+            self._locations.append(location)
+            self._location_ids[location] = location_id
+        return location_id
+
+    def location_name(self, location_id: int) -> str:
+        """Return the location string of an interned id."""
+        return self._locations[location_id]
+
+    def _move_location(self, record: UserRecord, location: Optional[str]):
+        """Change a record's location and keep the location index in sync."""
+        new_id = self.location_id(location) if location else NO_LOCATION
+        old_id = record._location_id
+        if new_id == old_id:
+            return
+        if old_id != NO_LOCATION:
+            users = self._by_location.get(old_id)
+            if users is not None:
+                users.discard(record.user_id)
+                if not users:
+                    del self._by_location[old_id]
+        record._location_id = new_id
+        if new_id != NO_LOCATION and record.user_id in self._users:
+            self._by_location.setdefault(new_id, set()).add(record.user_id)
+
+    def _move_minute(self, record: UserRecord, minute: int):
+        """Change a record's notification minute and keep the minute index in sync."""
+        old_minute = record._notification_minute
+        if minute == old_minute:
+            return
+        if old_minute != NO_NOTIFICATION:
+            users = self._by_minute.get(old_minute)
+            if users is not None:
+                users.discard(record.user_id)
+                if not users:
+                    del self._by_minute[old_minute]
+        record._notification_minute = minute
+        if minute != NO_NOTIFICATION and record.user_id in self._users:
+            self._by_minute.setdefault(minute, set()).add(record.user_id)
+
+    def create(self, user_id: int) -> UserRecord:
+        """Register a user with default preferences, without persisting it."""
+        record = self._users.get(user_id)
+        if record is None:
+            record = UserRecord(self, user_id)
+            self._users[user_id] = record
+        return record
+
+    def get_user_preferences(self, user_id: int) -> Optional[UserRecord]:
+        """Get a user's preferences record."""
+        return self._users.get(user_id)
+
+    async def load_user_preferences(self, user_id: int) -> Optional[UserRecord]:
+        """Get a user's preferences record, re-read from a shared storage backend first.
+
+        Another process may have changed the user since the last sync, and
+        the record is saved whole, so handlers that modify it start here
+        rather than from a copy that may be seconds old.
+        """
+        if self.storage is not None and self.storage.shared:
+            preferences = await asyncio.to_thread(self.storage.get_user_preferences, user_id)
+            data = preferences.to_dict() if preferences is not None else None
+            record = self._users.get(user_id)
+            if data is None or record is None or record.to_dict() != data:
+                self.apply(user_id, data)
+        return self._users.get(user_id)
+
+    async def save_user_preferences(self, record: UserRecord):
+        """Persist a user's preferences record to the storage backend.
+
+        The write runs in a worker thread, on a copy taken when called.
+        """
+        if record.user_id not in self._users:
+            self._users[record.user_id] = record
+            # Index values set before the record was registered
+            location_id, minute = record._location_id, record._notification_minute
+            record._location_id, record._notification_minute = NO_LOCATION, NO_NOTIFICATION
+            self._move_location(record, self._locations[location_id] if location_id != NO_LOCATION else None)
+            self._move_minute(record, minute)
+        self._changed(record.user_id)
+        if self.storage is not None:
+            await asyncio.to_thread(self.storage.save_user_preferences, UserPreferences.from_dict(record.to_dict()))
+
+    def _remove(self, user_id: int):
+        record = self._users.get(user_id)
+        if record is not None:
+            self._move_location(record, None)
+            self._move_minute(record, NO_NOTIFICATION)
+            del self._users[user_id]
+            self._changed(user_id)
+
+    async def delete_user_preferences(self, user_id: int):
+        """Remove a user from the registry and the storage backend."""
+        self._remove(user_id)
+        if self.storage is not None:
+            await asyncio.to_thread(self.storage.delete_user_preferences, user_id)
+
+    def apply(self, user_id: int, data: Optional[dict]):
+        """Bring a user's record in line with its stored dictionary, without persisting it.
+
+        The existing record is updated in place, so references to it stay
+        valid. ``None`` removes the user.
+        """
+        if data is None:
+            self._remove(user_id)
+            return
+        record = self._users.get(user_id)
+        if record is None:
+            self.load([data])
+            return
+        thresholds = data.get("temp_alert_thresholds")
+        record.language = sys.intern(data.get("language") or "es")
+        record.temperature_unit = sys.intern(data.get("temperature_unit") or "C")
+        record.temp_alert_thresholds = tuple(thresholds) if thresholds else None
+        record.daily_forecast = bool(data.get("daily_forecast"))
+        record.location = data.get("location")
+        record.notification_time = data.get("notification_time")
+        self._changed(user_id)
+
+    def fetch_changes(self) -> Optional[Tuple[str, bool, Dict[int, Optional[dict]]]]:
+        """Read the changes other processes made to a shared storage backend.
+
+        Returns the new feed cursor, whether every user was reloaded because
+        the backend lost part of its change feed, and the stored dictionary
+        of each changed user (None for deleted ones). Only reads storage, so
+        it can run in a worker thread; apply_changes applies the result.
+        """
+        if self.storage is None or not self.storage.shared:
+            return None
+        changes, complete = self.storage.changes(self._cursor)
+        if not complete:
+            cursor = self.storage.latest_change()
+            rows = {int(data["user_id"]): data for data in self.storage.iter_user_data()}
+            return cursor, True, rows
+        rows = {}
+        for user_id in dict.fromkeys(user_id for _, user_id in changes):
+            preferences = self.storage.get_user_preferences(user_id)
+            rows[user_id] = preferences.to_dict() if preferences is not None else None
+        return changes[-1][0] if changes else self._cursor, False, rows
+
+    def apply_changes(self, result: Optional[Tuple[str, bool, Dict[int, Optional[dict]]]]) -> int:
+        """Apply what fetch_changes read; return the number of users updated."""
+        if result is None:
+            return 0
+        cursor, reloaded, rows = result
+        if reloaded:
+            for user_id in set(self._users) - set(rows):
+                self._remove(user_id)
+        for user_id, data in rows.items():
+            self.apply(user_id, data)
+        self._cursor = cursor
+        return len(rows)
+
+    def sync(self) -> int:
+        """Apply the changes other processes made to a shared storage backend.
+
+        Reloads every user when the backend lost part of its change feed.
+        Returns the number of users updated.
+        """
+        return self.apply_changes(self.fetch_changes())
+
+    def users_at_location(self, location: str) -> Set[int]:
+        """Get the ids of users whose location is ``location``."""
+        location_id = self._location_ids.get(location)
+        if location_id is None:
+            return set()
+        return set(self._by_location.get(location_id, ()))
+
+    def users_at_minute(self, minute: int) -> Set[int]:
+        """Get the ids of users notified at ``minute`` minutes after midnight."""
+        return set(self._by_minute.get(minute, ()))
+
+    def locations(self) -> List[str]:
+        """Get every location that at least one user has set."""
+        return [self._locations[location_id] for location_id in self._by_location]
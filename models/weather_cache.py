@@ -1,32 +1,403 @@
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple, Union
 from cachetools import TTLCache
+from models.cache_policy import BoundedCache
+from models.weather_snapshot import CurrentSnapshot, ForecastSnapshot
+from utils.weather_client import LocationNotFoundError
+
+Snapshot = Union[CurrentSnapshot, ForecastSnapshot]
+
+def normalize_location(location: str) -> str:
+    """Normalize free-text location input into a cache key."""
+    return " ".join(location.split()).casefold()
+
+def forecast_days(data: ForecastSnapshot) -> int:
+    """Return the number of forecast days held by a forecast snapshot."""
+    return len(data.days)
+
+def slice_forecast(data: ForecastSnapshot, days: int) -> ForecastSnapshot:
+    """Return a forecast snapshot limited to its first ``days`` days."""
+    return data.slice(days)
+
+_DECODERS = {
+    "current": CurrentSnapshot.from_dict,
+    "forecast": ForecastSnapshot.from_dict,
+}
+
+def _decode(endpoint: str, data: Dict) -> Optional[Snapshot]:
+    """Rebuild a snapshot from its L2 form, ignoring entries in an older format."""
+    try:
+        return _DECODERS[endpoint](data)
+    except (KeyError, TypeError):
+        return None
 
 class WeatherCache:
-    def __init__(self, ttl_seconds: int = 300):  # Cache for 5 minutes by default
-        self.current_weather_cache = TTLCache(maxsize=100, ttl=ttl_seconds)
-        self.forecast_cache = TTLCache(maxsize=100, ttl=ttl_seconds * 2)  # Cache forecast for longer
+    """Two-tier cache of WeatherAPI responses.
+
+    L1 is an in-process TTLCache per endpoint. The optional L2 ``store`` (see
+    utils.cache_store) keeps entries on disk with their fetch time: L1 misses
+    read through to it, and its still-valid entries are loaded into L1 at
+    startup so a restart does not begin cold. L2 reads and writes run in a
+    worker thread, so a slow store does not hold up the event loop.
+
+    Entries older than their TTL stay usable for ``stale_ttl`` more seconds:
+    get_or_fetch serves them at once and revalidates in the background.
+    Locations WeatherAPI does not know are remembered for ``negative_ttl``.
+
+    Each L1 tier is a BoundedCache capped at an approximate byte budget, with
+    an eviction ``policy`` of "lru", "lfu" or "tinylfu".
+
+    When several processes share the L2 store, pass their state backend as
+    ``locks``: a fetch then also takes a lock on the key in the backend, and
+    a process finding it held waits up to ``lock_ttl`` seconds for the
+    holder's result to appear in L2 instead of calling WeatherAPI too.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, forecast_horizon: int = 3, store=None,
+                 stale_ttl: Optional[int] = None, negative_ttl: int = 3600,
+                 refresh_ahead: float = 0.8, policy: str = "tinylfu",
+                 current_max_bytes: int = 8 * 1024 * 1024,
+                 forecast_max_bytes: int = 32 * 1024 * 1024,
+                 locks=None, lock_ttl: float = 10.0):  # Cache for 5 minutes by default
+        stale_ttl = ttl_seconds if stale_ttl is None else stale_ttl
+        self.current_weather_cache = BoundedCache(current_max_bytes, ttl_seconds + stale_ttl, policy=policy)
+        self.forecast_cache = BoundedCache(forecast_max_bytes, ttl_seconds * 2 + stale_ttl, policy=policy)  # Cache forecast for longer
+        self.negative_cache = TTLCache(maxsize=10000, ttl=negative_ttl)
+        self.forecast_horizon = forecast_horizon  # Minimum number of days fetched per forecast request
+        self.stale_ttl = stale_ttl
+        self.refresh_ahead = refresh_ahead  # Fraction of the TTL after which hot entries are refreshed
+        self.store = store
+        self.locks = locks
+        self.lock_ttl = lock_ttl
+        self._caches = {
+            "current": self.current_weather_cache,
+            "forecast": self.forecast_cache,
+        }
+        self._ttls = {
+            "current": ttl_seconds,
+            "forecast": ttl_seconds * 2,
+        }
+        self._in_flight: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._access_counts: Counter = Counter()
+        self._refreshers: Dict[Tuple[str, str], Tuple[Tuple, Callable, Callable]] = {}
+        self._failed_refreshes: Set[Tuple[str, str]] = set()  # Keys whose last fetch failed
+        self.stats = {
+            "l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0,
+            "fetches": 0, "coalesced": 0, "rehydrated": 0,
+            "stale_served": 0, "background_refreshes": 0, "negative_hits": 0,
+            "shared_waits": 0, "shared_hits": 0
+        }
+        if self.store is not None:
+            self.rehydrate()
+
+    def rehydrate(self):
+        """Load the still-usable L2 entries into L1."""
+        for endpoint, cache in self._caches.items():
+            for key, fetched_at, data in self.store.entries(endpoint, self._ttls[endpoint] + self.stale_ttl):
+                snapshot = _decode(endpoint, data)
+                if snapshot is not None:
+                    cache[key] = (fetched_at, snapshot)
+                    self.stats["rehydrated"] += 1
+
+    def policy_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return admission and eviction counters and memory use of each L1 cache."""
+        return {
+            endpoint: {**cache.stats, "bytes": cache.current_bytes, "entries": len(cache)}
+            for endpoint, cache in self._caches.items()
+        }
+
+    def hit_ratios(self) -> Dict[str, float]:
+        """Return the hit ratio of each tier."""
+        ratios = {}
+        for tier in ("l1", "l2"):
+            lookups = self.stats[f"{tier}_hits"] + self.stats[f"{tier}_misses"]
+            ratios[tier] = self.stats[f"{tier}_hits"] / lookups if lookups else 0.0
+        return ratios
+
+    def _is_fresh(self, endpoint: str, entry: Tuple[float, Any]) -> bool:
+        """Check whether an entry is younger than its endpoint's TTL."""
+        return time.time() - entry[0] < self._ttls[endpoint]
+
+    async def _lookup(self, endpoint: str, key: str) -> Optional[Tuple[float, Any]]:
+        """Look a key up in L1, then L2, counting hits and misses per tier.
+
+        Returns the (fetched_at, data) entry if it is fresh or still within
+        the stale window.
+        """
+        max_age = self._ttls[endpoint] + self.stale_ttl
+        entry = self._caches[endpoint].get(key)
+        if entry is not None and time.time() - entry[0] < max_age:
+            self.stats["l1_hits"] += 1
+            return entry
+        self.stats["l1_misses"] += 1
+        if self.store is None:
+            return None
+        entry = await asyncio.to_thread(self.store.get, endpoint, key)
+        if entry is not None and time.time() - entry[0] < max_age:
+            snapshot = _decode(endpoint, entry[1])
+            if snapshot is not None:
+                self.stats["l2_hits"] += 1
+                entry = (entry[0], snapshot)
+                self._caches[endpoint][key] = entry
+                return entry
+        self.stats["l2_misses"] += 1
+        return None
+
+    async def last_known(self, endpoint: str, location: str) -> Optional[Tuple[float, Snapshot]]:
+        """Return the newest (fetched_at, data) entry for a location, however old.
 
-    def get_current_weather(self, location: str) -> Optional[Dict]:
+        Used when the upstream is unavailable; L2 entries are kept until the
+        store is purged, long after they stop being served normally.
+        """
+        key = normalize_location(location)
+        entry = self._caches[endpoint].peek(key)
+        if entry is not None:
+            return entry
+        if self.store is None:
+            return None
+        entry = await asyncio.to_thread(self.store.get, endpoint, key)
+        if entry is None:
+            return None
+        snapshot = _decode(endpoint, entry[1])
+        return (entry[0], snapshot) if snapshot is not None else None
+
+    async def failed_refresh_age(self, endpoint: str, location: str) -> Optional[float]:
+        """Return the age in seconds of a location's entry if it is past its TTL and the last fetch failed."""
+        key = normalize_location(location)
+        if (endpoint, key) not in self._failed_refreshes:
+            return None
+        entry = await self.last_known(endpoint, location)
+        if entry is None or self._is_fresh(endpoint, entry):
+            return None
+        return max(0.0, time.time() - entry[0])
+
+    async def _store(self, endpoint: str, key: str, data: Snapshot):
+        """Write an entry through both tiers; the L2 write runs in a worker thread."""
+        fetched_at = time.time()
+        self._caches[endpoint][key] = (fetched_at, data)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set, endpoint, key, fetched_at, data.to_dict())
+
+    async def get_current_weather(self, location: str, allow_stale: bool = False) -> Optional[CurrentSnapshot]:
         """Get cached current weather data for a location."""
-        return self.current_weather_cache.get(location)
+        entry = await self._lookup("current", normalize_location(location))
+        if entry is None or not (allow_stale or self._is_fresh("current", entry)):
+            return None
+        return entry[1]
 
-    def set_current_weather(self, location: str, data: Dict):
+    async def set_current_weather(self, location: str, data: CurrentSnapshot):
         """Cache current weather data for a location."""
-        self.current_weather_cache[location] = data
+        await self._store("current", normalize_location(location), data)
 
-    def get_forecast(self, location: str) -> Optional[Dict]:
-        """Get cached forecast data for a location."""
-        return self.forecast_cache.get(location)
+    async def get_forecast(self, location: str, days: Optional[int] = None,
+                           allow_stale: bool = False) -> Optional[ForecastSnapshot]:
+        """Get cached forecast data for a location, covering at least ``days`` days."""
+        entry = await self._lookup("forecast", normalize_location(location))
+        if entry is None or not (allow_stale or self._is_fresh("forecast", entry)):
+            return None
+        data = entry[1]
+        if days is None:
+            return data
+        if forecast_days(data) < days:
+            return None
+        return slice_forecast(data, days)
 
-    def set_forecast(self, location: str, data: Dict):
-        """Cache forecast data for a location."""
-        self.forecast_cache[location] = data
+    async def set_forecast(self, location: str, data: ForecastSnapshot):
+        """Cache forecast data for a location, keeping the longest horizon seen."""
+        key = normalize_location(location)
+        cached = self.forecast_cache.peek(key)
+        if (cached is None or not self._is_fresh("forecast", cached)
+                or forecast_days(data) >= forecast_days(cached[1])):
+            await self._store("forecast", key, data)
+        # Forecast responses embed current conditions, which are a valid current.json answer
+        await self._store("current", key, data.current)
 
     def is_current_weather_cached(self, location: str) -> bool:
         """Check if current weather data is cached for a location."""
-        return location in self.current_weather_cache
+        return normalize_location(location) in self.current_weather_cache
 
     def is_forecast_cached(self, location: str) -> bool:
         """Check if forecast data is cached for a location."""
-        return location in self.forecast_cache
+        return normalize_location(location) in self.forecast_cache
+
+    def is_known_invalid(self, location: str) -> bool:
+        """Check if WeatherAPI recently reported this location as unknown."""
+        return normalize_location(location) in self.negative_cache
+
+    def _check_negative(self, key: str):
+        """Raise the remembered lookup error for a location WeatherAPI does not know."""
+        error = self.negative_cache.get(key)
+        if error is not None:
+            self.stats["negative_hits"] += 1
+            raise type(error)(*error.args)
+
+    async def _single_flight(self, flight_key: Tuple[str, Hashable],
+                             fetch: Callable[[], Awaitable[Any]],
+                             store: Callable[[Any], Awaitable[None]]) -> Any:
+        """Run ``fetch`` once for all concurrent callers of the same key."""
+        pending = self._in_flight.get(flight_key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[flight_key] = future
+        self.stats["fetches"] += 1
+        try:
+            data = await self._fetch_shared(flight_key, fetch, store)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if isinstance(e, LocationNotFoundError):
+                # Unknown location: remember it so repeated bad input stays local.
+                # A KeyError from a malformed payload must not blacklist a valid one.
+                self.negative_cache[flight_key[1]] = e
+            else:
+                self._failed_refreshes.add(flight_key[:2])
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody else is waiting
+            raise
+        else:
+            self._failed_refreshes.discard(flight_key[:2])
+            future.set_result(data)
+            return data
+        finally:
+            self._in_flight.pop(flight_key, None)
+
+    async def _fetch_shared(self, flight_key: Tuple[str, Hashable],
+                            fetch: Callable[[], Awaitable[Any]],
+                            store: Callable[[Any], Awaitable[None]]) -> Any:
+        """Fetch and store an entry, holding the key's cross-process lock when ``locks`` is set."""
+        if self.locks is None:
+            data = await fetch()
+            await store(data)
+            return data
+        locks = self.locks
+        name = "weather:" + ":".join(map(str, flight_key))
+        token = await locks.call(locks.acquire_lock, name, self.lock_ttl)
+        if token is None:
+            self.stats["shared_waits"] += 1
+            data = await self._await_shared(flight_key, name)
+            if data is not None:
+                self.stats["shared_hits"] += 1
+                return data
+            token = await locks.call(locks.acquire_lock, name, self.lock_ttl)
+        try:
+            data = await fetch()
+            await store(data)
+            return data
+        finally:
+            if token is not None:
+                await locks.call(locks.release_lock, name, token)
+
+    async def _await_shared(self, flight_key: Tuple[str, Hashable], name: str,
+                            interval: float = 0.05) -> Optional[Any]:
+        """Wait for another process's fetch of a key to land in L2; return None if it does not."""
+        endpoint, key = flight_key[0], flight_key[1]
+        days = flight_key[2] if len(flight_key) > 2 else 0
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            entry = await asyncio.to_thread(self.store.get, endpoint, key) if self.store is not None else None
+            if entry is not None and self._is_fresh(endpoint, entry):
+                snapshot = _decode(endpoint, entry[1])
+                if snapshot is not None and (endpoint != "forecast" or forecast_days(snapshot) >= days):
+                    self._caches[endpoint][key] = (entry[0], snapshot)
+                    return snapshot
+            if not await self.locks.call(self.locks.lock_held, name):
+                return None  # The holder failed or gave up
+        return None
+
+    def _revalidate(self, flight_key: Tuple[str, Hashable],
+                    fetch: Callable[[], Awaitable[Any]], store: Callable[[Any], Awaitable[None]]):
+        """Refresh an entry in the background unless a fetch for it is already running."""
+        if flight_key in self._in_flight:
+            return
+        self.stats["background_refreshes"] += 1
+        task = asyncio.get_running_loop().create_task(self._single_flight(flight_key, fetch, store))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()  # Failed refreshes keep serving the stale entry
+
+    def _track(self, endpoint: str, key: str, flight_key: Tuple, fetch: Callable, store: Callable):
+        """Count an access and remember how to refresh the key."""
+        self._access_counts[(endpoint, key)] += 1
+        self._refreshers[(endpoint, key)] = (flight_key, fetch, store)
+
+    async def get_or_fetch(self, endpoint: str, location: str,
+                           fetch: Callable[[], Awaitable[Snapshot]]) -> Snapshot:
+        """Return cached data for a key, or fetch it once for all concurrent callers.
+
+        Only one upstream request per (endpoint, location) key is in flight at
+        a time; callers arriving while it runs await the same result. Stale
+        entries are returned immediately while a background fetch refreshes them.
+        """
+        key = normalize_location(location)
+        self._check_negative(key)
+        flight_key = (endpoint, key)
+        store = lambda result: self._store(endpoint, key, result)
+        self._track(endpoint, key, flight_key, fetch, store)
+        entry = await self._lookup(endpoint, key)
+        if entry is not None:
+            if not self._is_fresh(endpoint, entry):
+                self.stats["stale_served"] += 1
+                self._revalidate(flight_key, fetch, store)
+            return entry[1]
+        return await self._single_flight(flight_key, fetch, store)
+
+    async def get_or_fetch_forecast(self, location: str, days: int,
+                                    fetch: Callable[[int], Awaitable[ForecastSnapshot]]) -> ForecastSnapshot:
+        """Return a ``days``-day forecast, fetching at least ``forecast_horizon`` days on a miss.
+
+        Shorter requests are served by slicing the longest cached horizon, so a
+        1-day and a 3-day request for the same place cost one upstream call.
+        """
+        key = normalize_location(location)
+        self._check_negative(key)
+        horizon = max(days, self.forecast_horizon)
+        flight_key = ("forecast", key, horizon)
+        fetch_horizon = lambda: fetch(horizon)
+        store = lambda result: self.set_forecast(location, result)
+        self._track("forecast", key, flight_key, fetch_horizon, store)
+        entry = await self._lookup("forecast", key)
+        if entry is not None and forecast_days(entry[1]) >= days:
+            if not self._is_fresh("forecast", entry):
+                self.stats["stale_served"] += 1
+                self._revalidate(flight_key, fetch_horizon, store)
+            return slice_forecast(entry[1], days)
+        data = await self._single_flight(flight_key, fetch_horizon, store)
+        return slice_forecast(data, days)
+
+    async def refresh_hot(self, top_n: int = 50) -> int:
+        """Refresh the most requested keys that are close to expiring.
+
+        Access counts are halved afterwards, so the ranking follows recent
+        traffic. Returns the number of refreshes started.
+        """
+        started = 0
+        for (endpoint, key), _ in self._access_counts.most_common(top_n):
+            entry = self._caches[endpoint].peek(key)
+            age_limit = self._ttls[endpoint] * self.refresh_ahead
+            if entry is not None and time.time() - entry[0] < age_limit:
+                continue
+            if key in self.negative_cache:
+                continue
+            flight_key, fetch, store = self._refreshers[(endpoint, key)]
+            if flight_key not in self._in_flight:
+                self._revalidate(flight_key, fetch, store)
+                started += 1
+        for access_key in list(self._access_counts):
+            self._access_counts[access_key] //= 2
+            if not self._access_counts[access_key]:
+                del self._access_counts[access_key]
+                self._refreshers.pop(access_key, None)
+                self._failed_refreshes.discard(access_key)
+        return started
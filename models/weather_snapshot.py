@@ -0,0 +1,110 @@
+from dataclasses import asdict, dataclass
+from typing import Dict, Tuple
+
+@dataclass(frozen=True, slots=True)
+class CurrentSnapshot:
+    """The fields of a current.json response the bot renders."""
+    location_name: str
+    country: str
+    lat: float
+    lon: float
+    temp_c: float
+    temp_f: float
+    condition_text: str
+    condition_code: int
+    is_day: bool
+    humidity: int
+    wind_kph: float
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "CurrentSnapshot":
+        """Parse a WeatherAPI response holding "location" and "current" blocks."""
+        location = data["location"]
+        current = data["current"]
+        condition = current.get("condition", {})
+        return cls(
+            location_name=location["name"],
+            country=location.get("country", ""),
+            lat=location["lat"],
+            lon=location["lon"],
+            temp_c=current["temp_c"],
+            temp_f=current["temp_f"],
+            condition_text=condition.get("text", ""),
+            condition_code=condition.get("code", 0),
+            is_day=bool(current.get("is_day", 1)),
+            humidity=current.get("humidity", 0),
+            wind_kph=current.get("wind_kph", 0.0),
+        )
+
+    def to_dict(self) -> Dict:
+        """Convert the snapshot to a JSON-serializable dictionary."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CurrentSnapshot":
+        """Create a snapshot from a dictionary produced by to_dict."""
+        return cls(**data)
+
+@dataclass(frozen=True, slots=True)
+class ForecastDay:
+    """The fields of one forecast day the bot renders."""
+    date: str
+    maxtemp_c: float
+    maxtemp_f: float
+    mintemp_c: float
+    mintemp_f: float
+    condition_text: str
+    condition_code: int
+    chance_of_rain: int
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "ForecastDay":
+        """Parse one entry of a forecast response's "forecastday" list."""
+        day = data["day"]
+        condition = day.get("condition", {})
+        return cls(
+            date=data["date"],
+            maxtemp_c=day["maxtemp_c"],
+            maxtemp_f=day["maxtemp_f"],
+            mintemp_c=day["mintemp_c"],
+            mintemp_f=day["mintemp_f"],
+            condition_text=condition.get("text", ""),
+            condition_code=condition.get("code", 0),
+            chance_of_rain=day.get("daily_chance_of_rain", 0),
+        )
+
+@dataclass(frozen=True, slots=True)
+class ForecastSnapshot:
+    """The fields of a forecast.json response the bot renders."""
+    current: CurrentSnapshot
+    days: Tuple[ForecastDay, ...]
+
+    @property
+    def location_name(self) -> str:
+        return self.current.location_name
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "ForecastSnapshot":
+        """Parse a WeatherAPI forecast response."""
+        return cls(
+            current=CurrentSnapshot.from_response(data),
+            days=tuple(ForecastDay.from_response(day) for day in data["forecast"]["forecastday"]),
+        )
+
+    def slice(self, days: int) -> "ForecastSnapshot":
+        """Return the snapshot limited to its first ``days`` days."""
+        if len(self.days) <= days:
+            return self
+        return ForecastSnapshot(current=self.current, days=self.days[:days])
+
+    def to_dict(self) -> Dict:
+        """Convert the snapshot to a JSON-serializable dictionary."""
+        return {"current": self.current.to_dict(), "days": [asdict(day) for day in self.days]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ForecastSnapshot":
+        """Create a snapshot from a dictionary produced by to_dict."""
+        return cls(
+            current=CurrentSnapshot.from_dict(data["current"]),
+            days=tuple(ForecastDay(**day) for day in data["days"]),
+        )
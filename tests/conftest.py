@@ -0,0 +1,58 @@
+import pytest
+from models.weather_snapshot import CurrentSnapshot
+from utils.fake_redis import FakeRedis
+from utils.fake_weather_api import FakeWeatherAPI, fake_current, fake_location
+from utils.state_backend import SQLiteStateBackend
+
+class FakeClock:
+    """Timer that only moves when a test sets ``now``."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+@pytest.fixture
+def make_snapshot():
+    """Build the current weather the fake WeatherAPI would return for a query."""
+    def build(query: str) -> CurrentSnapshot:
+        return CurrentSnapshot.from_response({"location": fake_location(query), "current": fake_current(query)})
+
+    return build
+
+@pytest.fixture
+def fake_api():
+    """A started fake WeatherAPI server; tests may flip ``bulk_enabled``."""
+    api = FakeWeatherAPI().start()
+    yield api
+    api.stop()
+
+@pytest.fixture
+def fake_redis():
+    """A started in-process Redis-protocol server."""
+    server = FakeRedis().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def state_path(tmp_path):
+    """Path of a SQLite state database that several backends can open, like separate workers."""
+    return str(tmp_path / "state.db")
+
+@pytest.fixture
+def shared_state(state_path):
+    backends = []
+
+    def open_backend() -> SQLiteStateBackend:
+        backend = SQLiteStateBackend(state_path)
+        backends.append(backend)
+        return backend
+
+    yield open_backend
+    for backend in backends:
+        backend.close()
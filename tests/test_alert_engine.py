@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+import numpy as np
+from models.user_registry import UserRegistry
+from utils.alert_engine import ABOVE_MAX, BELOW_MIN, IN_RANGE, AlertEngine, LocationSubscribers, evaluate
+
+def subscribers(count: int = 1, fahrenheit: bool = False) -> LocationSubscribers:
+    return LocationSubscribers(
+        np.arange(count, dtype=np.int64),
+        np.full(count, 0.0), np.full(count, 30.0),
+        np.full(count, fahrenheit, dtype=bool),
+        np.full(count, IN_RANGE, dtype=np.int8)
+    )
+
+def test_reading_hovering_at_a_threshold_alerts_once():
+    group = subscribers()
+    alerts = [len(evaluate(group, temp, temp * 9 / 5 + 32, hysteresis=1.0)) for temp in (31.0, 29.5, 30.5, 29.5)]
+    assert alerts == [1, 0, 0, 0]
+    assert group.states.tolist() == [ABOVE_MAX]
+    assert len(evaluate(group, 28.9, 84.0, hysteresis=1.0)) == 0
+    assert group.states.tolist() == [IN_RANGE]
+    assert len(evaluate(group, 31.0, 87.8, hysteresis=1.0)) == 1
+
+def test_crossing_to_the_other_threshold_alerts_again():
+    group = subscribers()
+    evaluate(group, 31.0, 87.8, hysteresis=1.0)
+    assert len(evaluate(group, -1.0, 30.2, hysteresis=1.0)) == 1
+    assert group.states.tolist() == [BELOW_MIN]
+
+def test_fahrenheit_users_are_compared_in_fahrenheit():
+    group = subscribers(fahrenheit=True)
+    group.mins[:], group.maxs[:] = 32.0, 86.0
+    assert len(evaluate(group, 31.0, 87.8, hysteresis=1.0)) == 1
+
+class Sent:
+    def __init__(self):
+        self.alerts = []
+
+    async def __call__(self, user_id: int, text: str):
+        self.alerts.append(user_id)
+
+def engine(registry: UserRegistry, temps: dict, sent: Sent, state_file: str) -> AlertEngine:
+    async def fetch_current(location):
+        return SimpleNamespace(temp_c=temps[location], temp_f=temps[location] * 9 / 5 + 32)
+
+    return AlertEngine(registry, fetch_current, lambda record, temp, direction: "alert", sent,
+                       state_file=state_file)
+
+def subscribe(registry: UserRegistry, user_id: int, location: str, thresholds=(0.0, 30.0)):
+    record = registry.create(user_id)
+    record.location = location
+    record.temp_alert_thresholds = thresholds
+    asyncio.run(registry.save_user_preferences(record))
+
+def arrays(alert_engine: AlertEngine) -> dict:
+    return {
+        location: sorted(zip(*(getattr(group, column).tolist() for column in LocationSubscribers.__slots__)))
+        for location, group in alert_engine._subscribers.items()
+    }
+
+def test_incremental_updates_match_a_full_rebuild(tmp_path):
+    registry = UserRegistry()
+    for user_id in range(6):
+        subscribe(registry, user_id, ("Madrid", "Paris")[user_id % 2])
+    sent = Sent()
+    alerts = engine(registry, {"Madrid": 35.0, "Paris": 20.0, "Oslo": -5.0}, sent, str(tmp_path / "alerts.json"))
+    asyncio.run(alerts.sweep())
+    subscribe(registry, 1, "Madrid", (0.0, 40.0))
+    subscribe(registry, 2, "Oslo")
+    subscribe(registry, 6, "Paris")
+    asyncio.run(registry.delete_user_preferences(3))
+    asyncio.run(alerts.refresh())
+    incremental = arrays(alerts)
+    alerts.rebuild()
+    assert incremental == arrays(alerts)
+    assert [row[0] for row in incremental["Madrid"]] == [0, 1, 4]
+
+def test_alerted_users_are_not_alerted_again_after_a_restart(tmp_path):
+    state_file = str(tmp_path / "alerts.json")
+    registry = UserRegistry()
+    subscribe(registry, 1, "Madrid")
+    subscribe(registry, 2, "Paris")
+    temps = {"Madrid": 35.0, "Paris": 20.0}
+    sent = Sent()
+    assert asyncio.run(engine(registry, temps, sent, state_file).sweep()) == 1
+
+    temps["Paris"] = -3.0
+    restarted = engine(registry, temps, sent, state_file)
+    assert asyncio.run(restarted.sweep()) == 1
+    assert sent.alerts == [1, 2]
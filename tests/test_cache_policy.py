@@ -0,0 +1,47 @@
+from models.cache_policy import BoundedCache
+
+def sized(max_bytes: int, clock, policy: str = "tinylfu") -> BoundedCache:
+    """Cache where every value takes one byte."""
+    return BoundedCache(max_bytes, ttl=60, policy=policy, sizeof=lambda value: 1, timer=clock)
+
+def test_evicts_within_the_byte_budget(clock):
+    cache = sized(3, clock, policy="lru")
+    for key in "abcd":
+        cache[key] = key
+    assert list(cache) == ["b", "c", "d"]
+    assert cache.current_bytes == 3
+    assert cache.stats["evictions"] == 1
+
+def test_tinylfu_keeps_hot_entries_from_one_off_keys(clock):
+    cache = sized(2, clock)
+    cache["hot"], cache["warm"] = 1, 2
+    for _ in range(5):
+        cache.get("hot")
+        cache.get("warm")
+    cache["once"] = 3
+    assert "once" not in cache
+    assert cache.stats["rejections"] == 1
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = sized(2, clock)
+    cache["a"] = 1
+    clock.now = 60.0
+    assert cache.get("a") is None
+    assert cache.stats["expirations"] == 1
+
+def test_peek_does_not_count_as_an_access(clock):
+    cache = sized(2, clock, policy="lru")
+    cache["a"], cache["b"] = 1, 2
+    assert cache.peek("a") == 1
+    cache["c"] = 3  # "a" is still the least recently used entry
+    assert list(cache) == ["b", "c"]
+    assert cache.peek("a", "missing") == "missing"
+
+def test_peeked_keys_are_not_admitted_over_hot_ones(clock):
+    cache = sized(1, clock)
+    cache["hot"] = 1
+    cache.get("hot")
+    for _ in range(5):
+        cache.peek("cold")
+    cache["cold"] = 2
+    assert "cold" not in cache
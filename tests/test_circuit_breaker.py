@@ -0,0 +1,70 @@
+import pytest
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+def open_breaker(clock) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, timer=clock)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, timer=clock)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, timer=clock)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+def test_lets_one_probe_through_after_the_reset_timeout(clock):
+    breaker = open_breaker(clock)
+    clock.now = 29.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now = 30.0
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+def test_failed_probe_opens_the_circuit_again(clock):
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now = 59.0
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now = 60.0
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+
+def test_released_probe_lets_the_next_call_probe(clock):
+    breaker = open_breaker(clock)
+    clock.now = 30.0
+    breaker.before_call()
+    breaker.release()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
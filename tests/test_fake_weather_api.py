@@ -0,0 +1,29 @@
+from models.weather_snapshot import CurrentSnapshot
+from utils.fake_weather_api import FakeWeatherAPI
+from utils.location_resolver import LocationResolver
+
+def test_canonical_key_answers_with_the_place_it_was_resolved_from():
+    api = FakeWeatherAPI()
+    status, body = api.answer("current.json", "Madrid", 1)
+    assert status == 200
+    canonical = LocationResolver.canonical_key(CurrentSnapshot.from_response(body))
+    status, by_coordinates = api.answer("forecast.json", canonical, 3)
+    assert status == 200
+    assert by_coordinates["location"]["name"] == "Madrid"
+    assert by_coordinates["current"]["temp_c"] == body["current"]["temp_c"]
+    assert LocationResolver.canonical_key(CurrentSnapshot.from_response(by_coordinates)) == canonical
+    api.stop()
+
+def test_unknown_coordinates_keep_their_position():
+    api = FakeWeatherAPI()
+    status, body = api.answer("current.json", "12.5,-3.25", 1)
+    assert status == 200
+    assert (body["location"]["lat"], body["location"]["lon"]) == (12.5, -3.25)
+    api.stop()
+
+def test_invalid_queries_are_not_found():
+    api = FakeWeatherAPI()
+    status, body = api.answer("current.json", "invalid place", 1)
+    assert status == 400
+    assert body["error"]["code"] == 1006
+    api.stop()
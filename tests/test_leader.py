@@ -0,0 +1,103 @@
+import asyncio
+from utils.leader import LeaderLease
+from utils.state_backend import MemoryStateBackend, StateBackendError
+
+class Events:
+    """Records the elected/deposed callbacks of one lease."""
+
+    def __init__(self):
+        self.log = []
+
+    async def elected(self):
+        self.log.append("elected")
+
+    async def deposed(self):
+        self.log.append("deposed")
+
+def lease(backend, events: Events, ttl: float = 15.0) -> LeaderLease:
+    return LeaderLease(backend, ttl=ttl, on_elected=events.elected, on_deposed=events.deposed)
+
+def test_only_one_worker_takes_the_lease(shared_state):
+    events = [Events(), Events(), Events()]
+    leases = [lease(shared_state(), worker_events) for worker_events in events]
+
+    async def run():
+        return [await worker.step() for worker in leases]
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert events[0].log == ["elected"]
+    assert events[1].log == events[2].log == []
+
+def test_holder_keeps_the_lease_by_extending_it(clock):
+    backend = MemoryStateBackend(timer=clock)
+    holder, other = lease(backend, Events()), lease(backend, Events())
+
+    async def run():
+        await holder.step()
+        for now in (5.0, 10.0, 15.0, 20.0):
+            clock.now = now
+            assert await holder.step()
+            assert not await other.step()
+
+    asyncio.run(run())
+
+def test_another_worker_takes_over_when_the_holder_dies(clock):
+    backend = MemoryStateBackend(timer=clock)
+    events = Events()
+    holder, other = lease(backend, Events()), lease(backend, events)
+
+    async def run():
+        await holder.step()
+        clock.now = 14.0
+        assert not await other.step()
+        clock.now = 15.0  # The holder stopped extending the lease
+        assert await other.step()
+
+    asyncio.run(run())
+    assert events.log == ["elected"]
+
+def test_holder_that_lost_the_lease_steps_down(clock):
+    backend = MemoryStateBackend(timer=clock)
+    events = Events()
+    holder, other = lease(backend, events), lease(backend, Events())
+
+    async def run():
+        await holder.step()
+        clock.now = 20.0  # Paused past the TTL; the other worker took over meanwhile
+        assert await other.step()
+        assert not await holder.step()
+
+    asyncio.run(run())
+    assert events.log == ["elected", "deposed"]
+
+def test_release_hands_the_lease_over_at_once(shared_state):
+    holder, other = lease(shared_state(), Events()), lease(shared_state(), Events())
+
+    async def run():
+        await holder.step()
+        await holder.release()
+        return await other.step()
+
+    assert asyncio.run(run())
+    assert not holder.is_leader
+
+def test_holder_steps_down_when_the_backend_fails():
+    class FlakyBackend(MemoryStateBackend):
+        failing = False
+
+        def extend_if_equal(self, key, value, ttl):
+            if self.failing:
+                raise StateBackendError("connection reset")
+            return super().extend_if_equal(key, value, ttl)
+
+    backend = FlakyBackend()
+    events = Events()
+    holder = lease(backend, events)
+
+    async def run():
+        await holder.step()
+        backend.failing = True
+        return await holder.step()
+
+    assert not asyncio.run(run())
+    assert events.log == ["elected", "deposed"]
@@ -0,0 +1,35 @@
+import asyncio
+from utils.location_resolver import LocationResolver
+
+def test_spellings_resolve_to_one_key_without_refetching(tmp_path, make_snapshot):
+    resolver = LocationResolver(str(tmp_path / "location_aliases.json"))
+    calls = []
+
+    async def fetch(text):
+        calls.append(text)
+        return make_snapshot("Madrid")
+
+    async def run():
+        return [await resolver.resolve(text, fetch) for text in ("Madrid", " madrid ", "MADRID")]
+
+    results = asyncio.run(run())
+    assert calls == ["Madrid"]
+    assert {canonical for canonical, _ in results} == {LocationResolver.canonical_key(make_snapshot("Madrid"))}
+    reloaded = LocationResolver(str(tmp_path / "location_aliases.json"))
+    assert reloaded.lookup("madrid") == results[0][0]
+
+def test_workers_see_the_aliases_others_learned(tmp_path, shared_state, make_snapshot):
+    first = LocationResolver(str(tmp_path / "first.json"), backend=shared_state())
+    second = LocationResolver(str(tmp_path / "second.json"), backend=shared_state())
+    calls = []
+
+    async def fetch(text):
+        calls.append(text)
+        return make_snapshot("Madrid")
+
+    canonical, _ = asyncio.run(first.resolve("Madrid", fetch))
+    assert second.lookup("madrid") is None  # Not cached locally yet
+    assert asyncio.run(second.resolve("madrid", fetch)) == (canonical, None)
+    assert second.get_name(canonical) == "Madrid, Fakeland"
+    assert calls == ["Madrid"]
+    assert not (tmp_path / "second.json").exists()
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from models.user_registry import UserRegistry
+from utils.notification_dispatcher import NotificationDispatcher
+
+class Delivery:
+    """Fake forecast fetches and message sends of one dispatcher."""
+
+    def __init__(self):
+        self.fetched = []
+        self.sent = []
+
+    async def fetch_forecast(self, location: str, days: int):
+        self.fetched.append(location)
+        return {"location": location}
+
+    async def send_message(self, user_id: int, text: str):
+        self.sent.append(user_id)
+
+def dispatcher(registry: UserRegistry, delivery: Delivery, state_file: str) -> NotificationDispatcher:
+    return NotificationDispatcher(registry, delivery.fetch_forecast, lambda record, data: data["location"],
+                                  delivery.send_message, state_file=state_file, catch_up_minutes=15)
+
+def subscribe(registry: UserRegistry, user_id: int, location: str, moment: datetime):
+    record = registry.create(user_id)
+    record.location = location
+    record.notification_time = moment.strftime("%H:%M")
+    record.daily_forecast = True
+    asyncio.run(registry.save_user_preferences(record))
+
+def test_minutes_missed_while_down_are_dispatched_once(tmp_path):
+    state_file = str(tmp_path / "dispatcher_state.json")
+    now = datetime.now().replace(second=0, microsecond=0)
+    with open(state_file, "w", encoding="utf-8") as f:
+        json.dump({"last_dispatched": (now - timedelta(minutes=3)).isoformat()}, f)
+    registry = UserRegistry()
+    subscribe(registry, 1, "Madrid", now - timedelta(minutes=3))  # Sent before the restart
+    subscribe(registry, 2, "Madrid", now - timedelta(minutes=2))
+    subscribe(registry, 3, "Paris", now - timedelta(minutes=1))
+    subscribe(registry, 4, "Oslo", now - timedelta(minutes=20))  # Beyond the catch-up window
+    delivery = Delivery()
+
+    async def run():
+        restarted = dispatcher(registry, delivery, state_file)
+        await restarted.tick()
+        await restarted.tick()
+
+    asyncio.run(run())
+    assert sorted(delivery.sent) == [2, 3]
+    assert dispatcher(registry, Delivery(), state_file).last_dispatched >= now
+
+def test_each_location_is_fetched_once_per_minute(tmp_path):
+    registry = UserRegistry()
+    now = datetime.now().replace(second=0, microsecond=0)
+    for user_id in range(6):
+        subscribe(registry, user_id, ("Madrid", "Paris")[user_id % 2], now)
+    delivery = Delivery()
+    sent = asyncio.run(dispatcher(registry, delivery, None).dispatch(now.hour * 60 + now.minute))
+    assert sent == 6
+    assert sorted(delivery.fetched) == ["Madrid", "Paris"]
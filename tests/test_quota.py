@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from utils.quota import BACKGROUND, INTERACTIVE, VALIDATION, QuotaBudgeter, QuotaExceededError, quota_priority
+
+def spend(budget: QuotaBudgeter, priority: int) -> int:
+    """Spend single tokens at ``priority`` until refused; return how many were granted."""
+    granted = 0
+    while budget.try_acquire(priority=priority):
+        granted += 1
+    return granted
+
+def test_lower_priorities_leave_their_reserve(clock):
+    budget = QuotaBudgeter(60, burst=10, timer=clock)
+    assert spend(budget, BACKGROUND) == 5
+    assert spend(budget, VALIDATION) == 3
+    assert spend(budget, INTERACTIVE) == 2
+    assert budget.available(INTERACTIVE) == 0
+
+def test_interactive_requests_can_drain_the_bucket(clock):
+    budget = QuotaBudgeter(60, burst=10, timer=clock)
+    assert spend(budget, INTERACTIVE) == 10
+    assert not budget.try_acquire(priority=BACKGROUND)
+
+def test_refill_is_spent_by_the_caller_allowed_to(clock):
+    budget = QuotaBudgeter(60, burst=10, timer=clock)
+    spend(budget, INTERACTIVE)
+    clock.now = 3.0  # One token a second
+    assert budget.available(BACKGROUND) == 0
+    assert spend(budget, INTERACTIVE) == 3
+
+def test_background_work_is_refused_without_waiting(clock):
+    budget = QuotaBudgeter(60, burst=10, timer=clock)
+    spend(budget, BACKGROUND)
+
+    async def run():
+        with quota_priority(BACKGROUND):
+            await budget.acquire()
+
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(run())
+
+def test_throttle_blocks_every_priority_until_retry_after(clock):
+    budget = QuotaBudgeter(60, burst=10, timer=clock)
+    budget.throttle(retry_after=30)
+    clock.now = 20.0
+    assert budget.available(INTERACTIVE) == 0
+    clock.now = 31.0
+    assert budget.available(INTERACTIVE) == 10
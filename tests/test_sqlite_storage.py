@@ -0,0 +1,48 @@
+import json
+from models.user_preferences import UserPreferences
+from utils.sqlite_storage import SQLiteStorage
+
+def write_json(path, users):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({str(user["user_id"]): user for user in users}, f)
+
+def test_json_users_are_migrated_once(tmp_path):
+    json_file = str(tmp_path / "user_preferences.json")
+    db_file = str(tmp_path / "user_preferences.db")
+    write_json(json_file, [
+        {"user_id": 1, "location": "Madrid", "language": "en", "temperature_unit": "F",
+         "notification_time": "08:00", "temp_alert_thresholds": [0.0, 30.0], "daily_forecast": True},
+        {"user_id": 2, "location": "Paris"},
+    ])
+    storage = SQLiteStorage(db_file, migrate_from=json_file)
+    first = storage.get_user_preferences(1)
+    assert (first.location, first.language, first.temperature_unit) == ("Madrid", "en", "F")
+    assert first.temp_alert_thresholds == (0.0, 30.0)
+    assert first.daily_forecast
+    assert storage.get_user_preferences(2).language == "es"
+    storage.delete_user_preferences(2)
+    storage.close()
+
+    write_json(json_file, [{"user_id": 3, "location": "Oslo"}])
+    restarted = SQLiteStorage(db_file, migrate_from=json_file)
+    assert sorted(data["user_id"] for data in restarted.iter_user_data()) == [1]
+    restarted.close()
+
+def test_write_errors_are_reported_not_raised(tmp_path, capsys):
+    storage = SQLiteStorage(str(tmp_path / "user_preferences.db"), migrate_from=None)
+    storage.save_user_preferences(UserPreferences(user_id=1, location="Madrid"))
+    storage.conn.execute("CREATE TRIGGER readonly BEFORE DELETE ON users BEGIN SELECT RAISE(ABORT, 'read-only'); END")
+    storage.delete_user_preferences(1)
+    assert "Error deleting data: read-only" in capsys.readouterr().out
+    assert storage.get_user_preferences(1) is not None
+    storage.close()
+
+def test_indexes_no_longer_used_are_dropped(tmp_path):
+    db_file = str(tmp_path / "user_preferences.db")
+    storage = SQLiteStorage(db_file, migrate_from=None)
+    storage.conn.execute("CREATE INDEX idx_users_location ON users (location)")  # Created by earlier versions
+    storage.close()
+    storage = SQLiteStorage(db_file, migrate_from=None)
+    indexes = storage.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")
+    assert indexes.fetchall() == []
+    storage.close()
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from models.user_registry import UserRegistry
+from utils.state_backend import MemoryStateBackend, RedisStateBackend, SQLiteStateBackend, StateBackendError
+from utils.state_storage import StateStorage
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def open_backend(request, state_path):
+    """Factory of connections to one state, for each backend kind."""
+    backends = []
+    memory = MemoryStateBackend(feed_maxlen=5)
+    server = request.getfixturevalue("fake_redis") if request.param == "redis" else None
+
+    def connect():
+        if request.param == "memory":
+            return memory
+        if request.param == "sqlite":
+            backend = SQLiteStateBackend(state_path, feed_maxlen=5)
+        else:
+            backend = RedisStateBackend(server.url, feed_maxlen=5)
+        backends.append(backend)
+        return backend
+
+    yield connect
+    for backend in backends:
+        backend.close()
+
+def test_keys_expire_after_their_ttl(open_backend):
+    backend = open_backend()
+    backend.set("plain", "1")
+    backend.set("short", "2", ttl=0.05)
+    assert backend.get("short") == "2"
+    time.sleep(0.1)
+    assert backend.get("short") is None
+    assert backend.get("plain") == "1"
+    backend.delete("plain")
+    assert backend.get("plain") is None
+
+def test_lock_is_held_by_one_token(open_backend):
+    first, second = open_backend(), open_backend()
+    token = first.acquire_lock("refresh", ttl=5)
+    assert token is not None
+    assert second.acquire_lock("refresh", ttl=5) is None
+    assert second.lock_held("refresh")
+    assert not second.release_lock("refresh", "someone else")
+    assert not second.extend_lock("refresh", "someone else", ttl=5)
+    assert first.extend_lock("refresh", token, ttl=5)
+    assert first.release_lock("refresh", token)
+    assert second.acquire_lock("refresh", ttl=5) is not None
+
+def test_hashes(open_backend):
+    first, second = open_backend(), open_backend()
+    first.hset("aliases", "madrid", "40.4,-3.7")
+    first.hset("aliases", "paris", "48.9,2.4")
+    first.hdel("aliases", "paris")
+    assert second.hget("aliases", "madrid") == "40.4,-3.7"
+    assert second.hgetall("aliases") == {"madrid": "40.4,-3.7"}
+    assert second.hgetall("missing") == {}
+
+def test_feed_reports_trimmed_changes(open_backend):
+    writer, reader = open_backend(), open_backend()
+    assert reader.latest_change("users") == "0-0"
+    first = writer.publish("users", "1")
+    second = writer.publish("users", "2")
+    assert reader.latest_change("users") == second
+    assert reader.changes("users", first) == ([(second, "2")], True)
+    for user_id in range(3, 120):
+        writer.publish("users", str(user_id))
+    messages, complete = reader.changes("users", second)
+    assert not complete
+    assert messages[-1][1] == "119"
+
+def test_workers_share_preferences_through_redis(fake_redis):
+    first = UserRegistry(StateStorage(RedisStateBackend(fake_redis.url)))
+    second = UserRegistry(StateStorage(RedisStateBackend(fake_redis.url)))
+    record = first.create(1)
+    record.location = "Madrid"
+    asyncio.run(first.save_user_preferences(record))
+    assert second.sync() == 1
+    assert second.users_at_location("Madrid") == {1}
+
+def test_unreachable_redis_raises_state_backend_errors(fake_redis):
+    url = fake_redis.url
+    fake_redis.stop()
+    with pytest.raises(StateBackendError):
+        RedisStateBackend(url, timeout=0.5).get("key")
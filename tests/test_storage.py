@@ -0,0 +1,50 @@
+import threading
+import time
+from models.user_preferences import UserPreferences
+from utils.storage import Storage
+
+def open_storage(tmp_path, **options) -> Storage:
+    """JSON storage that only writes a snapshot when asked to."""
+    return Storage(str(tmp_path / "user_preferences.json"), flush_interval=3600, **options)
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    crashed = open_storage(tmp_path)
+    crashed.save_user_preferences(UserPreferences(user_id=1, location="Madrid"))
+    crashed.save_user_preferences(UserPreferences(user_id=2, location="Paris"))
+    crashed.delete_user_preferences(2)
+    crashed.save_user_preferences(UserPreferences(user_id=1, location="Oslo"))
+    # No snapshot was written; the next process starts from the journal
+    restarted = open_storage(tmp_path)
+    assert restarted.get_user_preferences(1).location == "Oslo"
+    assert restarted.get_user_preferences(2) is None
+    with open(restarted.journal_file, encoding="utf-8") as f:
+        assert f.read() == ""
+    restarted.close()
+    crashed.close()
+
+def test_torn_journal_line_is_ignored(tmp_path):
+    crashed = open_storage(tmp_path)
+    crashed.save_user_preferences(UserPreferences(user_id=1, location="Madrid"))
+    with open(crashed.journal_file, "a", encoding="utf-8") as f:
+        f.write('{"op":"set","id":"2","data":{"user_')
+    restarted = open_storage(tmp_path, write_behind=False)
+    assert restarted.get_user_preferences(1).location == "Madrid"
+    assert restarted.get_user_preferences(2) is None
+    crashed.close()
+
+def test_flusher_survives_a_failed_flush(tmp_path):
+    storage = open_storage(tmp_path)
+    flushed = threading.Event()
+
+    def failing_flush():
+        storage.flush = lambda: flushed.set()
+        raise OSError("disk full")
+
+    storage.flush = failing_flush
+    storage._flush_now.set()
+    time.sleep(0.1)
+    storage._flush_now.set()
+    assert flushed.wait(1)
+    assert storage._flusher.is_alive()
+    del storage.flush
+    storage.close()
@@ -0,0 +1,72 @@
+import asyncio
+from models.user_registry import UserRegistry
+from utils.state_backend import SQLiteStateBackend
+from utils.state_storage import StateStorage
+
+def worker_registry(backend) -> UserRegistry:
+    """Registry of one worker process, backed by the shared state."""
+    return UserRegistry(StateStorage(backend))
+
+def save(registry: UserRegistry, user_id: int, **changes):
+    """Apply one handler's read-modify-write of a user's preferences."""
+    async def run():
+        record = await registry.load_user_preferences(user_id) or registry.create(user_id)
+        for name, value in changes.items():
+            setattr(record, name, value)
+        await registry.save_user_preferences(record)
+
+    asyncio.run(run())
+
+def test_workers_do_not_overwrite_each_others_changes(shared_state):
+    first, second = worker_registry(shared_state()), worker_registry(shared_state())
+    save(first, 1)
+    second.sync()
+    save(first, 1, location="Madrid")
+    # The second worker has not synced since, and changes another field
+    save(second, 1, temperature_unit="F")
+    first.sync()
+    for registry in (first, second):
+        record = registry.get_user_preferences(1)
+        assert (record.location, record.temperature_unit) == ("Madrid", "F")
+        assert registry.users_at_location("Madrid") == {1}
+
+def test_sync_applies_other_workers_saves_and_deletes(shared_state):
+    first, second = worker_registry(shared_state()), worker_registry(shared_state())
+    save(first, 1, location="Madrid", notification_time="08:00")
+    save(first, 2, location="Paris")
+    assert second.sync() == 2
+    assert second.users_at_minute(8 * 60) == {1}
+    asyncio.run(first.delete_user_preferences(2))
+    save(first, 1, location="Paris")
+    assert second.sync() == 2
+    assert second.get_user_preferences(2) is None
+    assert second.users_at_location("Paris") == {1}
+    assert second.users_at_location("Madrid") == set()
+    assert second.sync() == 0
+
+def test_sync_reloads_everything_when_the_feed_was_trimmed(state_path):
+    backend = SQLiteStateBackend(state_path, feed_maxlen=10)
+    first, second = worker_registry(backend), worker_registry(SQLiteStateBackend(state_path, feed_maxlen=10))
+    for user_id in range(120):
+        save(first, user_id, location=f"City {user_id % 3}")
+    asyncio.run(first.delete_user_preferences(0))
+    second.sync()
+    assert len(second) == 119
+    assert second.users_at_location("City 1") == first.users_at_location("City 1")
+
+def test_workers_started_later_load_the_shared_state(shared_state):
+    first = worker_registry(shared_state())
+    save(first, 1, location="Madrid", temp_alert_thresholds=(0.0, 30.0))
+    late = worker_registry(shared_state())
+    assert late.get_user_preferences(1).to_dict() == first.get_user_preferences(1).to_dict()
+
+def test_changed_since_lists_the_changed_users():
+    registry = UserRegistry(changelog_size=4)
+    version = registry.version
+    for user_id in (1, 2, 1):
+        asyncio.run(registry.save_user_preferences(registry.create(user_id)))
+    assert registry.changed_since(version) == {1, 2}
+    assert registry.changed_since(registry.version) == set()
+    for user_id in (3, 4, 5):
+        asyncio.run(registry.save_user_preferences(registry.create(user_id)))
+    assert registry.changed_since(version) is None
@@ -0,0 +1,138 @@
+import asyncio
+import pytest
+from models.weather_cache import WeatherCache
+from utils.cache_store import SQLiteCacheStore, StateCacheStore
+from utils.state_backend import SQLiteStateBackend, StateBackendError
+from utils.weather_client import LocationNotFoundError
+
+def test_concurrent_misses_share_one_fetch(make_snapshot):
+    cache = WeatherCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return make_snapshot("Madrid")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("current", "Madrid", fetch) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.stats["coalesced"] == 9
+
+def test_concurrent_callers_share_the_failure():
+    cache = WeatherCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("current", "Madrid", fetch) for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_unknown_location_is_remembered():
+    cache = WeatherCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        raise LocationNotFoundError("No matching location found.")
+
+    for _ in range(3):
+        with pytest.raises(LocationNotFoundError):
+            asyncio.run(cache.get_or_fetch("current", "Nowhere Town", fetch))
+    assert len(calls) == 1
+    assert cache.is_known_invalid("nowhere town")
+    assert cache.stats["negative_hits"] == 2
+
+def test_malformed_payload_is_not_remembered_as_unknown(make_snapshot):
+    cache = WeatherCache()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            raise KeyError("location")
+        return make_snapshot("Madrid")
+
+    with pytest.raises(KeyError):
+        asyncio.run(cache.get_or_fetch("current", "Madrid", fetch))
+    assert not cache.is_known_invalid("Madrid")
+    assert asyncio.run(cache.get_or_fetch("current", "Madrid", fetch)).location_name == "Madrid"
+    assert len(calls) == 2
+
+def test_restarted_cache_starts_warm(tmp_path, make_snapshot):
+    db_file = str(tmp_path / "weather_cache.db")
+    cache = WeatherCache(store=SQLiteCacheStore(db_file))
+    asyncio.run(cache.set_current_weather("Madrid", make_snapshot("Madrid")))
+    cache.store.close()
+
+    restarted = WeatherCache(store=SQLiteCacheStore(db_file))
+    assert restarted.stats["rehydrated"] == 1
+    assert asyncio.run(restarted.get_current_weather("madrid")) == make_snapshot("Madrid")
+    assert restarted.stats["l1_hits"] == 1
+    restarted.store.close()
+
+def test_stale_entry_reports_its_age_once_the_refresh_failed(make_snapshot):
+    cache = WeatherCache(ttl_seconds=0, stale_ttl=60)
+    failing = False
+
+    async def fetch():
+        if failing:
+            raise RuntimeError("upstream down")
+        return make_snapshot("Madrid")
+
+    async def run():
+        await cache.get_or_fetch("current", "Madrid", fetch)
+        assert await cache.failed_refresh_age("current", "Madrid") is None
+        await cache.get_or_fetch("current", "Madrid", fetch)  # Served stale, refreshed in the background
+        await asyncio.sleep(0)
+        assert await cache.failed_refresh_age("current", "Madrid") is None
+        nonlocal failing
+        failing = True
+        served = await cache.get_or_fetch("current", "Madrid", fetch)
+        await asyncio.sleep(0)
+        assert served.location_name == "Madrid"
+        assert 0 <= await cache.failed_refresh_age("current", "Madrid") < 60
+        failing = False
+        await cache.get_or_fetch("current", "Madrid", fetch)
+        await asyncio.sleep(0)
+        assert await cache.failed_refresh_age("current", "Madrid") is None
+
+    asyncio.run(run())
+    assert cache.stats["background_refreshes"] == 3
+
+def test_workers_sharing_the_state_backend_fetch_once(shared_state, make_snapshot):
+    first, second = shared_state(), shared_state()
+    caches = [WeatherCache(store=StateCacheStore(backend), locks=backend) for backend in (first, second)]
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.2)
+        return make_snapshot("Madrid")
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch("current", "Madrid", fetch) for cache in caches))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert results[0] == results[1]
+    assert caches[0].stats["shared_hits"] + caches[1].stats["shared_hits"] == 1
+
+def test_rehydrate_starts_cold_when_the_backend_is_down(state_path):
+    class DownBackend(SQLiteStateBackend):
+        def hgetall(self, name):
+            raise StateBackendError("connection refused")
+
+    cache = WeatherCache(store=StateCacheStore(DownBackend(state_path)))
+    assert cache.stats["rehydrated"] == 0
@@ -0,0 +1,27 @@
+import asyncio
+from utils.weather_client import WeatherClient
+
+def fetch_current(api, locations, **options):
+    async def run():
+        client = WeatherClient("key", base_url=api.base_url, **options)
+        try:
+            return client, await client.get_current_bulk(locations)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+def test_bulk_fetch_sends_one_request_per_chunk(fake_api):
+    client, results = fetch_current(fake_api, [f"City {i}" for i in range(5)], bulk_chunk_size=2)
+    assert sorted(results) == [f"City {i}" for i in range(5)]
+    assert results["City 3"].location_name == "City 3"
+    assert fake_api.requests == {"POST current.json": 3}
+    assert client.bulk_supported
+
+def test_bulk_fetch_falls_back_to_single_requests(fake_api):
+    fake_api.bulk_enabled = False
+    locations = ["Madrid", "Paris", "invalid place"]
+    client, results = fetch_current(fake_api, locations)
+    assert sorted(results) == ["Madrid", "Paris"]
+    assert fake_api.requests == {"POST current.json": 1, "GET current.json": 3}
+    assert not client.bulk_supported
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+import numpy as np
+from models.user_registry import UserRecord, UserRegistry
+from models.weather_snapshot import CurrentSnapshot
+from utils.metrics import NOTIFICATIONS
+from utils.state_backend import StateBackend, StateBackendError
+
+logger = logging.getLogger('weather_bot.alerts')
+
+IN_RANGE = 0
+BELOW_MIN = -1
+ABOVE_MAX = 1
+
+class LocationSubscribers:
+    """Column arrays holding every temperature alert subscription of one location."""
+
+    __slots__ = ("user_ids", "mins", "maxs", "fahrenheit", "states")
+
+    def __init__(self, user_ids: np.ndarray, mins: np.ndarray, maxs: np.ndarray,
+                 fahrenheit: np.ndarray, states: np.ndarray):
+        self.user_ids = user_ids
+        self.mins = mins
+        self.maxs = maxs
+        self.fahrenheit = fahrenheit
+        self.states = states
+
+def evaluate(subscribers: LocationSubscribers, temp_c: float, temp_f: float,
+             hysteresis: float) -> np.ndarray:
+    """Update alert states for one reading and return the indexes that need an alert.
+
+    A subscriber enters BELOW_MIN or ABOVE_MAX when the temperature crosses a
+    threshold, and only returns to IN_RANGE once it is back inside by
+    ``hysteresis`` degrees, so readings hovering at a threshold alert once.
+    """
+    temps = np.where(subscribers.fahrenheit, temp_f, temp_c)
+    states = subscribers.states
+    below = temps < subscribers.mins
+    above = temps > subscribers.maxs
+    still_low = (states == BELOW_MIN) & (temps < subscribers.mins + hysteresis)
+    still_high = (states == ABOVE_MAX) & (temps > subscribers.maxs - hysteresis)
+    new_states = np.where(
+        below | still_low, BELOW_MIN,
+        np.where(above | still_high, ABOVE_MAX, IN_RANGE)
+    ).astype(np.int8)
+    triggered = np.flatnonzero((new_states != IN_RANGE) & (new_states != states))
+    subscribers.states = new_states
+    return triggered
+
+class AlertEngine:
+    """Periodic sweep evaluating every temperature alert threshold.
+
+    Subscriptions are grouped per location into NumPy column arrays. When
+    the registry changes only the locations of the changed users are
+    rebuilt. Each sweep fetches every subscribed location once and
+    evaluates all of its thresholds in one array operation.
+
+    Alert states outlive the process: with a shared state backend they are
+    kept in one of its hashes, otherwise in ``state_file``, so a restarted or
+    newly elected leader knows which users were already alerted.
+    """
+
+    def __init__(self, users: UserRegistry,
+                 fetch_current: Callable[[str], Awaitable[CurrentSnapshot]],
+                 format_alert: Callable[[UserRecord, float, int], str],
+                 send_message: Callable[[int, str], Awaitable[None]],
+                 hysteresis: float = 1.0, max_concurrency: int = 20,
+                 prefetch: Optional[Callable[[List[str]], Awaitable[None]]] = None,
+                 state: Optional[StateBackend] = None, states_key: str = "alerts:states",
+                 state_file: Optional[str] = "data/alert_states.json"):
+        self.users = users
+        self.fetch_current = fetch_current
+        self.format_alert = format_alert
+        self.send_message = send_message
+        self.hysteresis = hysteresis
+        self.max_concurrency = max_concurrency
+        self.prefetch = prefetch
+        self.state = state if state is not None and state.shared else None
+        self.states_key = states_key
+        self.state_file = state_file
+        self._subscribers: Dict[str, LocationSubscribers] = {}
+        self._user_locations: Dict[int, str] = {}
+        self._version: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    def reset(self):
+        """Drop the arrays, so the next sweep rebuilds them with the persisted alert states."""
+        self._subscribers = {}
+        self._user_locations = {}
+        self._version = None
+
+    async def _load_states(self) -> Dict[int, int]:
+        """Read the persisted alert states of the users outside the normal range."""
+        if self.state is None:
+            return self._load_state_file()
+        try:
+            values = await self.state.call(self.state.hgetall, self.states_key)
+            return {int(user_id): int(value) for user_id, value in values.items()}
+        except StateBackendError as e:
+            logger.error("Error loading alert states: %s", e)
+            return {}
+
+    def _load_state_file(self) -> Dict[int, int]:
+        """Read the alert states from the state file."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return {int(user_id): int(value) for user_id, value in json.load(f).items()}
+        except Exception as e:
+            logger.error("Error loading alert states: %s", e)
+            return {}
+
+    def _save_state_file(self):
+        """Atomically persist the alert states of the users outside the normal range."""
+        if not self.state_file:
+            return
+        states = {str(user_id): value for user_id, value in self._current_states().items() if value != IN_RANGE}
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(states, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error("Error saving alert states: %s", e)
+
+    def _current_states(self) -> Dict[int, int]:
+        states: Dict[int, int] = {}
+        for subscribers in self._subscribers.values():
+            states.update(zip(subscribers.user_ids.tolist(), subscribers.states.tolist()))
+        return states
+
+    def _build(self, location: str, records: Iterable[UserRecord], states: Dict[int, int],
+               keep: Optional[LocationSubscribers] = None, drop: Iterable[int] = ()):
+        """Rebuild the arrays of one location from kept rows of ``keep`` plus ``records``."""
+        columns = [[], [], [], [], []]
+        for record in records:
+            thresholds = record.temp_alert_thresholds
+            columns[0].append(record.user_id)
+            columns[1].append(thresholds[0])
+            columns[2].append(thresholds[1])
+            columns[3].append(record.temperature_unit == 'F')
+            columns[4].append(states.get(record.user_id, IN_RANGE))
+        user_ids, mins, maxs, fahrenheit, alert_states = columns
+        subscribers = LocationSubscribers(
+            np.array(user_ids, dtype=np.int64),
+            np.array(mins, dtype=np.float64),
+            np.array(maxs, dtype=np.float64),
+            np.array(fahrenheit, dtype=bool),
+            np.array(alert_states, dtype=np.int8)
+        )
+        if keep is not None:
+            mask = ~np.isin(keep.user_ids, np.fromiter(drop, dtype=np.int64))
+            subscribers = LocationSubscribers(*(
+                np.concatenate((getattr(keep, column)[mask], getattr(subscribers, column)))
+                for column in LocationSubscribers.__slots__
+            ))
+        if len(subscribers.user_ids):
+            self._subscribers[location] = subscribers
+        else:
+            self._subscribers.pop(location, None)
+
+    def rebuild(self, states: Optional[Dict[int, int]] = None):
+        """Rebuild every per-location array with ``states``, or else each user's current alert state."""
+        if states is None:
+            states = self._current_states()
+        groups: Dict[str, List[UserRecord]] = {}
+        for record in self.users:
+            if record.temp_alert_thresholds and record.location:
+                groups.setdefault(record.location, []).append(record)
+        self._subscribers = {}
+        self._user_locations = {}
+        for location, records in groups.items():
+            self._build(location, records, states)
+            self._user_locations.update((record.user_id, location) for record in records)
+        self._version = self.users.version
+
+    def update(self, user_ids: Set[int]):
+        """Move the changed users between the per-location arrays, keeping their alert state."""
+        states = {}
+        for location in {self._user_locations[user_id] for user_id in user_ids if user_id in self._user_locations}:
+            subscribers = self._subscribers[location]
+            changed = np.isin(subscribers.user_ids, list(user_ids))
+            states.update(zip(subscribers.user_ids[changed].tolist(), subscribers.states[changed].tolist()))
+        added: Dict[str, List[UserRecord]] = {}
+        touched = set()
+        for user_id in user_ids:
+            old_location = self._user_locations.pop(user_id, None)
+            if old_location is not None:
+                touched.add(old_location)
+            record = self.users.get_user_preferences(user_id)
+            if record is not None and record.temp_alert_thresholds and record.location:
+                added.setdefault(record.location, []).append(record)
+                self._user_locations[user_id] = record.location
+                touched.add(record.location)
+        for location in touched:
+            self._build(location, added.get(location, ()), states, self._subscribers.get(location), user_ids)
+        self._version = self.users.version
+
+    async def refresh(self):
+        """Bring the arrays up to date with the registry."""
+        if self._version == self.users.version:
+            return
+        if self._version is None:
+            self.rebuild(await self._load_states())
+            return
+        changed = self.users.changed_since(self._version)
+        if changed is None:
+            self.rebuild()
+        else:
+            self.update(changed)
+
+    async def _save_states(self, states: Dict[int, int]):
+        """Persist changed alert states; users back in range are removed from the hash."""
+        if not states:
+            return
+        if self.state is None:
+            self._save_state_file()
+            return
+        try:
+            for user_id, value in states.items():
+                if value == IN_RANGE:
+                    await self.state.call(self.state.hdel, self.states_key, str(user_id))
+                else:
+                    await self.state.call(self.state.hset, self.states_key, str(user_id), str(value))
+        except StateBackendError as e:
+            logger.error("Error saving alert states: %s", e)
+
+    def subscription_count(self) -> int:
+        """Return the number of threshold pairs being evaluated."""
+        return sum(len(subscribers.user_ids) for subscribers in self._subscribers.values())
+
+    async def sweep(self) -> int:
+        """Evaluate every subscribed location once; return the number of alerts sent."""
+        async with self._lock:
+            await self.refresh()
+            if not self._subscribers:
+                return 0
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.prefetch is not None:
+                try:
+                    await self.prefetch(list(self._subscribers))
+                except Exception as e:
+                    logger.error("Error prefetching weather for alerts: %s", e)
+
+            changed_states: Dict[int, int] = {}
+
+            async def check(location: str, subscribers: LocationSubscribers) -> List[tuple]:
+                async with semaphore:
+                    try:
+                        current = await self.fetch_current(location)
+                    except Exception as e:
+                        logger.error("Error fetching weather for alerts in %s: %s", location, e)
+                        return []
+                temp_c, temp_f = current.temp_c, current.temp_f
+                previous = subscribers.states
+                triggered = evaluate(subscribers, temp_c, temp_f, self.hysteresis)
+                changed = np.flatnonzero(previous != subscribers.states)
+                changed_states.update(zip(subscribers.user_ids[changed].tolist(),
+                                          subscribers.states[changed].tolist()))
+                return [
+                    (int(subscribers.user_ids[i]),
+                     temp_f if subscribers.fahrenheit[i] else temp_c,
+                     int(subscribers.states[i]))
+                    for i in triggered
+                ]
+
+            results = await asyncio.gather(*(
+                check(location, subscribers) for location, subscribers in list(self._subscribers.items())
+            ))
+            await self._save_states(changed_states)
+
+        sent_ok = NOTIFICATIONS.labels("alert", "sent")
+        sent_failed = NOTIFICATIONS.labels("alert", "failed")
+
+        async def send(user_id: int, temp: float, direction: int) -> bool:
+            record = self.users.get_user_preferences(user_id)
+            if record is None:
+                return False
+            async with semaphore:
+                try:
+                    await self.send_message(user_id, self.format_alert(record, temp, direction))
+                    sent_ok.inc()
+                    return True
+                except Exception as e:
+                    logger.error("Error sending temperature alert to %s: %s", user_id, e)
+                    sent_failed.inc()
+                    return False
+
+        sent = sum(await asyncio.gather(*(send(*alert) for alerts in results for alert in alerts)))
+        logger.info("Alert sweep: %s locations, %s thresholds, %s alerts sent",
+                    len(results), self.subscription_count(), sent)
+        return sent
@@ -0,0 +1,142 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+from utils.state_backend import StateBackend, StateBackendError
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather_cache (
+    endpoint TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (endpoint, key)
+);
+CREATE INDEX IF NOT EXISTS idx_weather_cache_fetched_at ON weather_cache (fetched_at);
+"""
+
+class SQLiteCacheStore:
+    """Second-tier weather cache on local disk, surviving restarts.
+
+    Entries are stored with the wall-clock time they were fetched at, so
+    their remaining freshness is known after a restart.
+    """
+
+    def __init__(self, db_file: str = "data/weather_cache.db"):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def get(self, endpoint: str, key: str) -> Optional[Tuple[float, Dict]]:
+        """Return the (fetched_at, data) entry stored for a key, if any."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, payload FROM weather_cache WHERE endpoint = ? AND key = ?",
+                (endpoint, key)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, endpoint: str, key: str, fetched_at: float, data: Dict):
+        """Store an entry, replacing any previous one for the key."""
+        payload = json.dumps(data, separators=(",", ":"))
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO weather_cache (endpoint, key, fetched_at, payload) VALUES (?, ?, ?, ?)",
+                    (endpoint, key, fetched_at, payload)
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing weather cache: {e}")
+
+    def entries(self, endpoint: str, max_age: float) -> Iterator[Tuple[str, float, Dict]]:
+        """Iterate over the (key, fetched_at, data) entries younger than ``max_age`` seconds."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, fetched_at, payload FROM weather_cache WHERE endpoint = ? AND fetched_at >= ?",
+                (endpoint, time.time() - max_age)
+            ).fetchall()
+        return ((key, fetched_at, json.loads(payload)) for key, fetched_at, payload in rows)
+
+    def purge(self, max_age: float) -> int:
+        """Delete entries older than ``max_age`` seconds; return how many were removed."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "DELETE FROM weather_cache WHERE fetched_at < ?", (time.time() - max_age,)
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self.conn.close()
+
+class StateCacheStore:
+    """Second-tier weather cache kept in the shared state backend.
+
+    Every bot process reads and writes the same entries, so a location
+    fetched by one worker is an L2 hit for the others. Each endpoint's
+    entries live in one hash, as JSON ``[fetched_at, data]`` values.
+    """
+
+    def __init__(self, backend: StateBackend, prefix: str = "weather_cache",
+                 endpoints: Tuple[str, ...] = ("current", "forecast")):
+        self.backend = backend
+        self.prefix = prefix
+        self.endpoints = endpoints
+
+    def _name(self, endpoint: str) -> str:
+        return f"{self.prefix}:{endpoint}"
+
+    def get(self, endpoint: str, key: str) -> Optional[Tuple[float, Dict]]:
+        """Return the (fetched_at, data) entry stored for a key, if any."""
+        try:
+            value = self.backend.hget(self._name(endpoint), key)
+        except StateBackendError as e:
+            print(f"Error reading weather cache: {e}")
+            return None
+        if value is None:
+            return None
+        fetched_at, data = json.loads(value)
+        return fetched_at, data
+
+    def set(self, endpoint: str, key: str, fetched_at: float, data: Dict):
+        """Store an entry, replacing any previous one for the key."""
+        try:
+            self.backend.hset(self._name(endpoint), key, json.dumps([fetched_at, data], separators=(",", ":")))
+        except StateBackendError as e:
+            print(f"Error writing weather cache: {e}")
+
+    def entries(self, endpoint: str, max_age: float) -> Iterator[Tuple[str, float, Dict]]:
+        """Iterate over the (key, fetched_at, data) entries younger than ``max_age`` seconds."""
+        cutoff = time.time() - max_age
+        try:
+            values = self.backend.hgetall(self._name(endpoint))
+        except StateBackendError as e:
+            print(f"Error reading weather cache: {e}")
+            return
+        for key, value in values.items():
+            fetched_at, data = json.loads(value)
+            if fetched_at >= cutoff:
+                yield key, fetched_at, data
+
+    def purge(self, max_age: float) -> int:
+        """Delete entries older than ``max_age`` seconds; return how many were removed."""
+        cutoff = time.time() - max_age
+        removed = 0
+        for endpoint in self.endpoints:
+            name = self._name(endpoint)
+            expired = [key for key, value in self.backend.hgetall(name).items() if json.loads(value)[0] < cutoff]
+            self.backend.hdel(name, *expired)
+            removed += len(expired)
+        return removed
+
+    def close(self):
+        """Nothing to release; the backend is closed by its owner."""
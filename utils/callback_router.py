@@ -0,0 +1,101 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from utils.logger import log_context
+from utils.metrics import HANDLER_ERRORS, HANDLER_LATENCY
+
+logger = logging.getLogger('weather_bot.router')
+
+# Handlers receive (update, context, preferences, argument); preferences is
+# None for routes that do not declare needs_preferences, argument is the part
+# of the callback data after a prefix route's prefix
+RouteHandler = Callable[[Any, Any, Any, Optional[str]], Awaitable[None]]
+
+class Route:
+    """One callback route and the latency histogram and error count recorded for it."""
+
+    __slots__ = ("name", "handler", "needs_preferences", "latency", "errors")
+
+    def __init__(self, name: str, handler: RouteHandler, needs_preferences: bool):
+        self.name = name
+        self.handler = handler
+        self.needs_preferences = needs_preferences
+        self.latency = HANDLER_LATENCY.labels(f"callback:{name}")
+        self.errors = HANDLER_ERRORS.labels(f"callback:{name}")
+
+    def observe(self, seconds: float, failed: bool):
+        if failed:
+            self.errors.inc()
+        self.latency.observe(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the route's counters with cumulative bucket counts keyed by upper bound."""
+        return {
+            "calls": self.latency.count,
+            "errors": int(self.errors.value),
+            "latency_sum": self.latency.sum,
+            "latency_buckets": dict(self.latency.cumulative()),
+        }
+
+class CallbackRouter:
+    """Dispatch callback query data to handlers through lookup tables.
+
+    Exact routes ("settings") are one dict lookup. Prefix routes ("unit_")
+    match callback data of the form ``<prefix><argument>`` through a second
+    dict keyed by everything up to and including the first underscore.
+    """
+
+    def __init__(self, load_preferences: Callable[[int], Awaitable[Any]]):
+        self.load_preferences = load_preferences
+        self._exact: Dict[str, Route] = {}
+        self._prefixes: Dict[str, Route] = {}
+        self.unmatched = 0
+
+    def add(self, data: str, handler: RouteHandler, needs_preferences: bool = False):
+        """Route callback data equal to ``data`` to ``handler``."""
+        self._exact[data] = Route(data, handler, needs_preferences)
+
+    def add_prefix(self, prefix: str, handler: RouteHandler, needs_preferences: bool = False):
+        """Route callback data starting with ``prefix`` to ``handler``; the prefix must end with "_"."""
+        if not prefix.endswith("_") or "_" in prefix[:-1]:
+            raise ValueError(f"Prefix routes must contain exactly one trailing underscore: {prefix}")
+        self._prefixes[prefix] = Route(f"{prefix}*", handler, needs_preferences)
+
+    def resolve(self, data: str) -> Tuple[Optional[Route], Optional[str]]:
+        """Return the route matching callback data and its argument, if any."""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, None
+        head, sep, argument = data.partition("_")
+        if sep:
+            route = self._prefixes.get(head + sep)
+            if route is not None:
+                return route, argument
+        return None, None
+
+    async def dispatch(self, update, context) -> bool:
+        """Run the handler for an update's callback query; return False if no route matched."""
+        query = update.callback_query
+        route, argument = self.resolve(query.data or "")
+        if route is None:
+            self.unmatched += 1
+            logger.warning("No route for callback data %r", query.data)
+            return False
+        with log_context(update_id=update.update_id, user_id=query.from_user.id, route=route.name):
+            preferences = await self.load_preferences(query.from_user.id) if route.needs_preferences else None
+            started = time.perf_counter()
+            failed = True
+            try:
+                await route.handler(update, context, preferences, argument)
+                failed = False
+            finally:
+                route.observe(time.perf_counter() - started, failed)
+        return True
+
+    def routes(self) -> Dict[str, Route]:
+        """Return every route keyed by its name."""
+        return {route.name: route for route in (*self._exact.values(), *self._prefixes.values())}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the counters and latency histogram of every route."""
+        return {name: route.snapshot() for name, route in self.routes().items()}
@@ -0,0 +1,71 @@
+import random
+import time
+from typing import Callable
+from utils.metrics import REGISTRY
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "weatherapi_circuit_transitions_total", "Circuit breaker state changes.", ("endpoint", "state")
+)
+
+class CircuitOpenError(RuntimeError):
+    """The circuit for an upstream endpoint is open; the call was not attempted."""
+
+class CircuitBreaker:
+    """Stop calling an upstream endpoint after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail immediately with CircuitOpenError. Once ``reset_timeout``
+    seconds have passed a single probe call is let through (half-open); its
+    success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 timer: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.timer = timer
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str):
+        if state != self.state:
+            self.state = state
+            BREAKER_TRANSITIONS.labels(self.name, state).inc()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be attempted now."""
+        if self.state == OPEN:
+            if self.timer() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit for {self.name} is open")
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probing:
+                raise CircuitOpenError(f"Circuit for {self.name} is half-open and probing")
+            self._probing = True
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        self._transition(CLOSED)
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self.timer()
+            self._transition(OPEN)
+
+    def release(self):
+        """End a probe whose outcome says nothing about the upstream's health."""
+        self._probing = False
+
+def backoff_delay(attempt: int, base: float = 0.2, cap: float = 5.0) -> float:
+    """Return a full-jitter backoff delay for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,35 @@
+from typing import Optional
+from utils.state_backend import StateBackend
+
+# What a user's next text message is expected to answer
+EXPECTING_LOCATION = "location"
+EXPECTING_TIME = "time"
+EXPECTING_TEMP_LIMITS = "temp_limits"
+
+class ConversationState:
+    """Per-user conversation step, kept in the state backend.
+
+    With a shared backend the reply to a prompt can be handled by a
+    different worker than the one that sent the prompt. Steps expire after
+    ``ttl`` seconds, so abandoned prompts do not linger.
+    """
+
+    def __init__(self, backend: StateBackend, ttl: float = 24 * 3600, prefix: str = "conversation"):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    async def get(self, user_id: int) -> Optional[str]:
+        """Return what the user's next message is expected to answer, if anything."""
+        return await self.backend.call(self.backend.get, self._key(user_id))
+
+    async def expect(self, user_id: int, step: str):
+        """Remember that the user's next message answers ``step``."""
+        await self.backend.call(self.backend.set, self._key(user_id), step, self.ttl)
+
+    async def clear(self, user_id: int):
+        """Forget the user's pending step."""
+        await self.backend.call(self.backend.delete, self._key(user_id))
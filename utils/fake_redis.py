@@ -0,0 +1,312 @@
+"""Local in-memory stand-in for Redis, for running several bot processes without a Redis server.
+
+Speaks RESP and implements the commands used by utils.state_backend: keys
+with expiry (GET, SET with NX/EX/PX, DEL), hashes, streams (XADD with
+MAXLEN, XRANGE, XREVRANGE) and WATCH/MULTI/EXEC transactions. Data lives
+in the server process only.
+
+Run it with ``python -m utils.fake_redis --port 6399`` and point the bot at
+it with ``STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6399/0``.
+"""
+import argparse
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+class CommandError(Exception):
+    """An error reply sent back to the client."""
+
+def _stream_id(value: str, default_seq: int) -> Tuple[int, int]:
+    if value in ("-", "+"):
+        return (0, 0) if value == "-" else (2 ** 63, 2 ** 63)
+    ms, _, seq = value.partition("-")
+    return int(ms), int(seq) if seq else default_seq
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class FakeRedis:
+    """Threaded TCP server imitating the subset of Redis used by the bot."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._lock = threading.Lock()
+        self._values: Dict[bytes, Tuple[object, float]] = {}
+        self._versions: Dict[bytes, int] = {}
+        self.commands = 0
+        self._server = _Server((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    # Storage helpers; the lock is held by the caller
+
+    def _touch(self, key: bytes):
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _get(self, key: bytes, kind: type):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] and entry[1] <= time.time():
+            del self._values[key]
+            self._touch(key)
+            return None
+        if not isinstance(entry[0], kind):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return entry[0]
+
+    def _put(self, key: bytes, value, expires_at: float = 0.0):
+        self._values[key] = (value, expires_at)
+        self._touch(key)
+
+    def version(self, key: bytes) -> int:
+        with self._lock:
+            self._get(key, object)
+            return self._versions.get(key, 0)
+
+    # Commands
+
+    def execute(self, name: str, args: List[bytes]):
+        """Run one command atomically and return its reply."""
+        handler = getattr(self, f"cmd_{name.lower()}", None)
+        if handler is None:
+            raise CommandError(f"ERR unknown command '{name}'")
+        with self._lock:
+            self.commands += 1
+            return handler(*args)
+
+    def cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_flushall(self):
+        for key in list(self._values):
+            self._touch(key)
+        self._values.clear()
+        return "OK"
+
+    def cmd_get(self, key):
+        return self._get(key, bytes)
+
+    def cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        expires_at = 0.0
+        if b"EX" in options:
+            expires_at = time.time() + int(options[options.index(b"EX") + 1])
+        if b"PX" in options:
+            expires_at = time.time() + int(options[options.index(b"PX") + 1]) / 1000
+        if b"NX" in options and self._get(key, object) is not None:
+            return None
+        self._put(key, value, expires_at)
+        return "OK"
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._get(key, object) is not None:
+                del self._values[key]
+                self._touch(key)
+                removed += 1
+        return removed
+
+    def cmd_hget(self, name, field):
+        return (self._get(name, dict) or {}).get(field)
+
+    def cmd_hset(self, name, *pairs):
+        values = self._get(name, dict)
+        if values is None:
+            values = {}
+        added = sum(1 for field in pairs[::2] if field not in values)
+        values.update(zip(pairs[::2], pairs[1::2]))
+        self._put(name, values)
+        return added
+
+    def cmd_hdel(self, name, *fields):
+        values = self._get(name, dict) or {}
+        removed = sum(1 for field in fields if values.pop(field, None) is not None)
+        if removed:
+            self._touch(name)
+        return removed
+
+    def cmd_hgetall(self, name):
+        values = self._get(name, dict) or {}
+        return [item for pair in values.items() for item in pair]
+
+    def cmd_xadd(self, key, *args):
+        args = list(args)
+        maxlen = None
+        if args[0].upper() == b"MAXLEN":
+            args.pop(0)
+            if args[0] in (b"~", b"="):
+                args.pop(0)
+            maxlen = int(args.pop(0))
+        requested = args.pop(0).decode()
+        fields = args
+        stream = self._get(key, list)
+        if stream is None:
+            stream = []
+        last = stream[-1][0] if stream else (0, 0)
+        if requested == "*":
+            ms = int(time.time() * 1000)
+            new_id = (ms, 0) if ms > last[0] else (last[0], last[1] + 1)
+        else:
+            new_id = _stream_id(requested, 0)
+            if new_id <= last:
+                raise CommandError("ERR The ID specified in XADD is equal or smaller than the target stream top item")
+        stream.append((new_id, list(fields)))
+        if maxlen is not None and len(stream) > maxlen:
+            del stream[:len(stream) - maxlen]
+        self._put(key, stream)
+        return f"{new_id[0]}-{new_id[1]}".encode()
+
+    def _range(self, key, start: bytes, end: bytes, count: Optional[int], reverse: bool):
+        start, end = start.decode(), end.decode()
+        low = _stream_id(start.lstrip("("), 0)
+        high = _stream_id(end.lstrip("("), 2 ** 63)
+        entries = [
+            entry for entry in (self._get(key, list) or [])
+            if (low < entry[0] if start.startswith("(") else low <= entry[0])
+            and (entry[0] < high if end.startswith("(") else entry[0] <= high)
+        ]
+        if reverse:
+            entries.reverse()
+        if count is not None:
+            entries = entries[:count]
+        return [[f"{ms}-{seq}".encode(), fields] for (ms, seq), fields in entries]
+
+    def cmd_xrange(self, key, start, end, *options):
+        count = int(options[1]) if options and options[0].upper() == b"COUNT" else None
+        return self._range(key, start, end, count, reverse=False)
+
+    def cmd_xrevrange(self, key, end, start, *options):
+        count = int(options[1]) if options and options[0].upper() == b"COUNT" else None
+        return self._range(key, start, end, count, reverse=True)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _read(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.split()  # Inline command, as typed in telnet
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(length + 2)[:-2])
+                return args
+
+            def _encode(self, reply) -> bytes:
+                if reply is None:
+                    return b"$-1\r\n"
+                if isinstance(reply, CommandError):
+                    return b"-%s\r\n" % str(reply).encode()
+                if isinstance(reply, bool):
+                    return b":%d\r\n" % int(reply)
+                if isinstance(reply, int):
+                    return b":%d\r\n" % reply
+                if isinstance(reply, str):
+                    return b"+%s\r\n" % reply.encode()
+                if isinstance(reply, bytes):
+                    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+                return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
+
+            def handle(self):
+                watched: Dict[bytes, int] = {}
+                queued: Optional[List[List[bytes]]] = None
+                while True:
+                    args = self._read()
+                    if args is None:
+                        return
+                    if not args:
+                        continue
+                    name = args[0].decode().upper()
+                    if name == "WATCH":
+                        watched.update((key, server.version(key)) for key in args[1:])
+                        reply = "OK"
+                    elif name == "UNWATCH":
+                        watched.clear()
+                        reply = "OK"
+                    elif name == "MULTI":
+                        queued = []
+                        reply = "OK"
+                    elif name == "DISCARD":
+                        queued = None
+                        watched.clear()
+                        reply = "OK"
+                    elif name == "EXEC":
+                        if queued is None:
+                            reply = CommandError("ERR EXEC without MULTI")
+                        else:
+                            reply = self._exec(queued, watched)
+                            queued = None
+                            watched.clear()
+                    elif queued is not None:
+                        queued.append(args)
+                        reply = "QUEUED"
+                    else:
+                        try:
+                            reply = server.execute(name, args[1:])
+                        except CommandError as e:
+                            reply = e
+                        except (ValueError, IndexError, TypeError):
+                            reply = CommandError(f"ERR wrong arguments for '{name.lower()}' command")
+                    self.wfile.write(self._encode(reply))
+
+            def _exec(self, queued: List[List[bytes]], watched: Dict[bytes, int]):
+                with server._lock:
+                    for key, version in watched.items():
+                        server._get(key, object)
+                        if server._versions.get(key, 0) != version:
+                            return None
+                    replies = []
+                    for args in queued:
+                        handler = getattr(server, f"cmd_{args[0].decode().lower()}", None)
+                        try:
+                            if handler is None:
+                                raise CommandError(f"ERR unknown command '{args[0].decode()}'")
+                            replies.append(handler(*args[1:]))
+                        except CommandError as e:
+                            replies.append(e)
+                    return replies
+
+        return Handler
+
+    def start(self) -> "FakeRedis":
+        """Serve clients from a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    fake = FakeRedis(args.host, args.port)
+    print(f"Fake Redis listening on {fake.url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Local stand-in for WeatherAPI, for running the bot and its bulk paths offline.
+
+Serves ``current.json`` and ``forecast.json`` over GET and their bulk variants
+(``q=bulk`` with a JSON ``locations`` payload) over POST, with deterministic
+synthetic weather derived from the query text. Queries starting with
+"invalid" answer with WeatherAPI's "No matching location found" error.
+A "lat,lon" query for the coordinates of a place looked up before answers
+with that place, like the real API does for the bot's canonical keys.
+
+Run it with ``python -m utils.fake_weather_api --port 8099`` and point the
+bot at it with ``WEATHER_BASE_URL=http://127.0.0.1:8099/v1``.
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+_CONDITIONS = [
+    (1000, "Sunny"), (1003, "Partly cloudy"), (1006, "Cloudy"), (1009, "Overcast"),
+    (1063, "Patchy rain possible"), (1183, "Light rain"), (1195, "Heavy rain"), (1213, "Light snow"),
+]
+
+_COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+def _coordinates(query: str) -> Optional[Tuple[float, float]]:
+    match = _COORDINATES.match(query)
+    return (float(match[1]), float(match[2])) if match else None
+
+def _seed(query: str) -> int:
+    return int(hashlib.sha1(query.strip().casefold().encode("utf-8")).hexdigest()[:8], 16)
+
+def fake_location(query: str) -> Dict:
+    """Build a deterministic location block for a query.
+
+    Coordinates no place was looked up by are echoed back as an unnamed place.
+    """
+    seed = _seed(query)
+    coordinates = _coordinates(query)
+    if coordinates is not None:
+        name, (lat, lon) = "Nowhere", coordinates
+    else:
+        name = query.strip().split(",")[0].title() or "Nowhere"
+        lat, lon = round((seed % 18000) / 100 - 90, 2), round((seed // 18000 % 36000) / 100 - 180, 2)
+    return {
+        "name": name,
+        "region": "",
+        "country": "Fakeland",
+        "lat": lat,
+        "lon": lon,
+        "tz_id": "UTC",
+        "localtime": datetime.utcnow().strftime("%Y-%m-%d %H:%M"),
+    }
+
+def fake_current(query: str) -> Dict:
+    """Build a deterministic current block for a query."""
+    seed = _seed(query)
+    temp_c = round(seed % 400 / 10 - 5, 1)
+    code, text = _CONDITIONS[seed % len(_CONDITIONS)]
+    return {
+        "last_updated": datetime.utcnow().strftime("%Y-%m-%d %H:%M"),
+        "temp_c": temp_c,
+        "temp_f": round(temp_c * 9 / 5 + 32, 1),
+        "is_day": 1,
+        "condition": {"text": text, "icon": "", "code": code},
+        "wind_kph": round(seed % 300 / 10, 1),
+        "humidity": seed % 100,
+    }
+
+def fake_forecast_days(query: str, days: int) -> list:
+    """Build deterministic forecast days for a query."""
+    seed = _seed(query)
+    forecast = []
+    for offset in range(days):
+        day_seed = seed + offset * 7919
+        max_c = round(day_seed % 300 / 10 + 5, 1)
+        min_c = round(max_c - 3 - day_seed % 80 / 10, 1)
+        code, text = _CONDITIONS[day_seed % len(_CONDITIONS)]
+        forecast.append({
+            "date": (date.today() + timedelta(days=offset)).isoformat(),
+            "day": {
+                "maxtemp_c": max_c,
+                "maxtemp_f": round(max_c * 9 / 5 + 32, 1),
+                "mintemp_c": min_c,
+                "mintemp_f": round(min_c * 9 / 5 + 32, 1),
+                "daily_chance_of_rain": day_seed % 101,
+                "condition": {"text": text, "icon": "", "code": code},
+            },
+            "hour": [],
+        })
+    return forecast
+
+class FakeWeatherAPI:
+    """Threaded HTTP server imitating the WeatherAPI endpoints used by the bot."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, bulk_enabled: bool = True):
+        self.bulk_enabled = bulk_enabled
+        self.requests = Counter()
+        self.places: Dict[str, str] = {}  # "lat,lon" -> the query that first found the place
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def answer(self, endpoint: str, query: str, days: int) -> Tuple[int, Dict]:
+        """Return the status and body WeatherAPI would send for one query."""
+        if not query or query.strip().casefold().startswith("invalid"):
+            return 400, {"error": {"code": 1006, "message": "No matching location found."}}
+        coordinates = _coordinates(query)
+        if coordinates is not None:
+            query = self.places.get("{},{}".format(*coordinates), query)
+        location = fake_location(query)
+        self.places.setdefault(f"{location['lat']},{location['lon']}", query)
+        body = {"location": location, "current": fake_current(query)}
+        if endpoint == "forecast.json":
+            body["forecast"] = {"forecastday": fake_forecast_days(query, max(1, min(days, 14)))}
+        return 200, body
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status: int, body: Dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _route(self) -> Tuple[str, Dict]:
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                return url.path.rsplit("/", 1)[-1], params
+
+            def do_GET(self):
+                endpoint, params = self._route()
+                api.requests[f"GET {endpoint}"] += 1
+                if endpoint not in ("current.json", "forecast.json"):
+                    self._reply(404, {"error": {"code": 1005, "message": "API request url is invalid"}})
+                    return
+                if not params.get("key"):
+                    self._reply(401, {"error": {"code": 1002, "message": "API key is invalid or not provided."}})
+                    return
+                self._reply(*api.answer(endpoint, params.get("q", ""), int(params.get("days", 1))))
+
+            def do_POST(self):
+                endpoint, params = self._route()
+                api.requests[f"POST {endpoint}"] += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if params.get("q") != "bulk" or endpoint not in ("current.json", "forecast.json"):
+                    self._reply(400, {"error": {"code": 1005, "message": "API request url is invalid"}})
+                    return
+                if not api.bulk_enabled:
+                    self._reply(403, {"error": {"code": 2009, "message": "API key does not have access to the resource."}})
+                    return
+                bulk = []
+                for item in payload.get("locations", []):
+                    status, body = api.answer(endpoint, item.get("q", ""), int(params.get("days", 1)))
+                    query = {"custom_id": item.get("custom_id"), "q": item.get("q"), **body}
+                    bulk.append({"query": query})
+                self._reply(200, {"bulk": bulk})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeWeatherAPI":
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-weather-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the port."""
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--no-bulk", action="store_true", help="reject bulk requests like a free plan")
+    args = parser.parse_args()
+    api = FakeWeatherAPI(args.host, args.port, bulk_enabled=not args.no_bulk)
+    print(f"Fake WeatherAPI listening on {api.base_url}")
+    try:
+        api._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
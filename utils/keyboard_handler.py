@@ -1,83 +1,122 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+from typing import Dict
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from utils.messages import DEFAULT_LANGUAGE, LANGUAGES, language_of
 
-class KeyboardHandler:
-    @staticmethod
-    def get_main_menu() -> InlineKeyboardMarkup:
-        """Create the main menu keyboard."""
-        keyboard = [
-            [
-                InlineKeyboardButton("🌤️ Clima Actual", callback_data="weather"),
-                InlineKeyboardButton("📅 Pronóstico", callback_data="forecast")
-            ],
-            [
-                InlineKeyboardButton("⚙️ Configuración", callback_data="settings"),
-                InlineKeyboardButton("🔔 Alertas", callback_data="alerts")
-            ],
-            [
-                InlineKeyboardButton("❓ Ayuda", callback_data="help")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+_LABELS = {
+    "es": {
+        "weather": "🌤️ Clima Actual",
+        "forecast": "📅 Pronóstico",
+        "settings": "⚙️ Configuración",
+        "alerts": "🔔 Alertas",
+        "help": "❓ Ayuda",
+        "change_location": "📍 Cambiar Ubicación",
+        "change_unit": "🌡️ Unidad de Temperatura",
+        "daily_notification": "🕒 Notificaciones Diarias",
+        "change_language": "🌍 Idioma",
+        "temp_alerts": "🌡️ Alertas de Temperatura",
+        "daily_summary": "📅 Resumen Diario",
+        "disable_alerts": "❌ Desactivar Alertas",
+        "back": "« Volver",
+        "back_main": "« Volver al Menú Principal",
+        "back_settings": "« Volver a Configuración",
+    },
+    "en": {
+        "weather": "🌤️ Current Weather",
+        "forecast": "📅 Forecast",
+        "settings": "⚙️ Settings",
+        "alerts": "🔔 Alerts",
+        "help": "❓ Help",
+        "change_location": "📍 Change Location",
+        "change_unit": "🌡️ Temperature Unit",
+        "daily_notification": "🕒 Daily Notifications",
+        "change_language": "🌍 Language",
+        "temp_alerts": "🌡️ Temperature Alerts",
+        "daily_summary": "📅 Daily Summary",
+        "disable_alerts": "❌ Disable Alerts",
+        "back": "« Back",
+        "back_main": "« Back to Main Menu",
+        "back_settings": "« Back to Settings",
+    },
+}
 
-    @staticmethod
-    def get_settings_menu() -> InlineKeyboardMarkup:
-        """Create the settings menu keyboard."""
-        keyboard = [
-            [
-                InlineKeyboardButton("📍 Cambiar Ubicación", callback_data="change_location"),
-                InlineKeyboardButton("🌡️ Unidad de Temperatura", callback_data="change_unit")
-            ],
-            [
-                InlineKeyboardButton("🕒 Notificaciones Diarias", callback_data="daily_notification"),
-                InlineKeyboardButton("🌍 Idioma", callback_data="change_language")
-            ],
-            [
-                InlineKeyboardButton("« Volver al Menú Principal", callback_data="main_menu")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+def _build(language: str) -> Dict[str, InlineKeyboardMarkup]:
+    """Build every keyboard of one language."""
+    labels = _LABELS[language]
 
-    @staticmethod
-    def get_temperature_unit_menu() -> InlineKeyboardMarkup:
-        """Create the temperature unit selection keyboard."""
-        keyboard = [
+    def button(label: str, callback_data: str = None) -> InlineKeyboardButton:
+        return InlineKeyboardButton(labels[label], callback_data=callback_data or label)
+
+    return {
+        "main": InlineKeyboardMarkup([
+            [button("weather"), button("forecast")],
+            [button("settings"), button("alerts")],
+            [button("help")]
+        ]),
+        "settings": InlineKeyboardMarkup([
+            [button("change_location"), button("change_unit")],
+            [button("daily_notification"), button("change_language")],
+            [button("back_main", "main_menu")]
+        ]),
+        "unit": InlineKeyboardMarkup([
             [
                 InlineKeyboardButton("Celsius (°C)", callback_data="unit_C"),
                 InlineKeyboardButton("Fahrenheit (°F)", callback_data="unit_F")
             ],
-            [
-                InlineKeyboardButton("« Volver a Configuración", callback_data="settings")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
-
-    @staticmethod
-    def get_language_menu() -> InlineKeyboardMarkup:
-        """Create the language selection keyboard."""
-        keyboard = [
+            [button("back_settings", "settings")]
+        ]),
+        "language": InlineKeyboardMarkup([
             [
                 InlineKeyboardButton("🇪🇸 Español", callback_data="lang_es"),
                 InlineKeyboardButton("🇺🇸 English", callback_data="lang_en")
             ],
-            [
-                InlineKeyboardButton("« Volver a Configuración", callback_data="settings")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+            [button("back_settings", "settings")]
+        ]),
+        "alerts": InlineKeyboardMarkup([
+            [button("temp_alerts"), button("daily_summary")],
+            [button("disable_alerts")],
+            [button("back_main", "main_menu")]
+        ]),
+        "back_main": InlineKeyboardMarkup([[button("back", "main_menu")]]),
+        "back_settings": InlineKeyboardMarkup([[button("back", "settings")]]),
+        "back_alerts": InlineKeyboardMarkup([[button("back", "alerts")]]),
+    }
 
+# Telegram objects are immutable once built, so one instance per language is
+# shared by every reply
+_KEYBOARDS = {language: _build(language) for language in LANGUAGES}
+
+class KeyboardHandler:
     @staticmethod
-    def get_alert_menu() -> InlineKeyboardMarkup:
-        """Create the alerts menu keyboard."""
-        keyboard = [
-            [
-                InlineKeyboardButton("🌡️ Alertas de Temperatura", callback_data="temp_alerts"),
-                InlineKeyboardButton("📅 Resumen Diario", callback_data="daily_summary")
-            ],
-            [
-                InlineKeyboardButton("❌ Desactivar Alertas", callback_data="disable_alerts")
-            ],
-            [
-                InlineKeyboardButton("« Volver al Menú Principal", callback_data="main_menu")
-            ]
-        ]
-        return InlineKeyboardMarkup(keyboard)
+    def get_keyboard(name: str, language: str) -> InlineKeyboardMarkup:
+        """Return the prebuilt keyboard ``name`` in the given language."""
+        return _KEYBOARDS[language_of(language)][name]
+
+    @staticmethod
+    def get_main_menu(language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return the main menu keyboard."""
+        return KeyboardHandler.get_keyboard("main", language)
+
+    @staticmethod
+    def get_settings_menu(language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return the settings menu keyboard."""
+        return KeyboardHandler.get_keyboard("settings", language)
+
+    @staticmethod
+    def get_temperature_unit_menu(language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return the temperature unit selection keyboard."""
+        return KeyboardHandler.get_keyboard("unit", language)
+
+    @staticmethod
+    def get_language_menu(language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return the language selection keyboard."""
+        return KeyboardHandler.get_keyboard("language", language)
+
+    @staticmethod
+    def get_alert_menu(language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return the alerts menu keyboard."""
+        return KeyboardHandler.get_keyboard("alerts", language)
+
+    @staticmethod
+    def get_back_button(target: str, language: str = DEFAULT_LANGUAGE) -> InlineKeyboardMarkup:
+        """Return a single "back" button leading to ``target`` ("main_menu", "settings" or "alerts")."""
+        return KeyboardHandler.get_keyboard("back_main" if target == "main_menu" else f"back_{target}", language)
@@ -0,0 +1,77 @@
+import logging
+from typing import Awaitable, Callable, Optional
+from utils.metrics import REGISTRY
+from utils.state_backend import StateBackend, StateBackendError
+
+logger = logging.getLogger('weather_bot.leader')
+
+LEADER = REGISTRY.gauge(
+    "weather_bot_leader", "1 while this process holds the named lease, else 0.", ("lease",)
+)
+
+class LeaderLease:
+    """Lease-based election of the one process that runs a singleton duty.
+
+    The lease is a lock in the shared state backend that expires after
+    ``ttl`` seconds. Every process calls step every ``ttl / 3`` seconds to
+    try to take it, and the holder extends it instead. When the holder dies
+    its lease runs out and another process takes over within ``ttl`` seconds.
+
+    A holder that fails to extend the lease, or cannot reach the backend,
+    steps down at once, since another process may take the lease as soon
+    as it expires.
+    """
+
+    def __init__(self, backend: StateBackend, name: str = "scheduler", ttl: float = 15.0,
+                 on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_deposed: Optional[Callable[[], Awaitable[None]]] = None):
+        self.backend = backend
+        self.name = name
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.token: Optional[str] = None
+        LEADER.labels(name).set(0)
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+
+    async def step(self) -> bool:
+        """Take or extend the lease once; return whether this process is the leader."""
+        try:
+            if self.token is None:
+                token = await self.backend.call(self.backend.acquire_lock, f"leader:{self.name}", self.ttl)
+                if token is not None:
+                    await self._elected(token)
+            elif not await self.backend.call(self.backend.extend_lock, f"leader:{self.name}", self.token, self.ttl):
+                logger.warning("Lost the %s lease", self.name)
+                await self._deposed()
+        except StateBackendError as e:
+            logger.error("Error renewing the %s lease: %s", self.name, e)
+            if self.token is not None:
+                await self._deposed()
+        return self.is_leader
+
+    async def _elected(self, token: str):
+        self.token = token
+        LEADER.labels(self.name).set(1)
+        logger.info("Took the %s lease", self.name)
+        if self.on_elected is not None:
+            await self.on_elected()
+
+    async def _deposed(self):
+        self.token = None
+        LEADER.labels(self.name).set(0)
+        if self.on_deposed is not None:
+            await self.on_deposed()
+
+    async def release(self):
+        """Give the lease up, so another process can take it without waiting for it to expire."""
+        if self.token is None:
+            return
+        try:
+            await self.backend.call(self.backend.release_lock, f"leader:{self.name}", self.token)
+        except StateBackendError as e:
+            logger.error("Error releasing the %s lease: %s", self.name, e)
+        await self._deposed()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from models.weather_cache import normalize_location
+from models.weather_snapshot import CurrentSnapshot
+from utils.state_backend import StateBackend, StateBackendError
+
+class LocationResolver:
+    """Map free-text locations to WeatherAPI canonical "lat,lon" queries.
+
+    Every spelling a user has typed is remembered in a persistent alias index,
+    so "madrid", "Madrid " and "Madrid, Spain" resolve to one cache key and
+    are validated against the API only once.
+
+    With a shared state backend the index lives in two of its hashes, so
+    every bot process sees the aliases the others learned, and the local
+    dictionaries only cache what this process has looked up. Otherwise the
+    index is a JSON file, rewritten off the event loop.
+    """
+
+    def __init__(self, index_file: str = "data/location_aliases.json", backend: Optional[StateBackend] = None,
+                 prefix: str = "locations"):
+        self.index_file = index_file
+        self.backend = backend if backend is not None and backend.shared else None
+        self.aliases_key = f"{prefix}:aliases"
+        self.names_key = f"{prefix}:names"
+        self.aliases: Dict[str, str] = {}
+        self.names: Dict[str, str] = {}
+        self._save_lock = asyncio.Lock()
+        if self.backend is None:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Load the alias index from the state backend or from disk."""
+        try:
+            if self.backend is not None:
+                self.aliases = self.backend.hgetall(self.aliases_key)
+                self.names = self.backend.hgetall(self.names_key)
+            elif os.path.exists(self.index_file):
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.aliases = data.get("aliases", {})
+                self.names = data.get("names", {})
+        except Exception as e:
+            print(f"Error loading location index: {e}")
+
+    def _write_index(self, data: Dict[str, Dict[str, str]]):
+        """Atomically write a snapshot of the alias index to disk.
+
+        The temporary file is unique to the process, so processes sharing
+        the data directory never write into each other's half-written file.
+        """
+        tmp_file = f"{self.index_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            print(f"Error saving location index: {e}")
+
+    async def _save_alias(self, alias: str, canonical: str, name: str):
+        """Persist one alias, in the state backend or by rewriting the index file."""
+        if self.backend is not None:
+            try:
+                await self.backend.call(self.backend.hset, self.aliases_key, alias, canonical)
+                await self.backend.call(self.backend.hset, self.aliases_key, canonical, canonical)
+                await self.backend.call(self.backend.hset, self.names_key, canonical, name)
+            except StateBackendError as e:
+                print(f"Error saving location alias: {e}")
+            return
+        # The snapshot is taken on the loop; the lock keeps writes in order
+        async with self._save_lock:
+            await asyncio.to_thread(self._write_index, {"aliases": dict(self.aliases), "names": dict(self.names)})
+
+    async def _fetch_alias(self, alias: str) -> Optional[str]:
+        """Look an alias up in the state backend, caching it and its name locally."""
+        try:
+            canonical = await self.backend.call(self.backend.hget, self.aliases_key, alias)
+            if canonical is None:
+                return None
+            name = await self.backend.call(self.backend.hget, self.names_key, canonical)
+        except StateBackendError as e:
+            print(f"Error reading location alias: {e}")
+            return None
+        self.aliases[alias] = canonical
+        if name is not None:
+            self.names[canonical] = name
+        return canonical
+
+    @staticmethod
+    def canonical_key(weather_data: CurrentSnapshot) -> str:
+        """Build the canonical query for the location of a weather snapshot."""
+        return f"{weather_data.lat},{weather_data.lon}"
+
+    @staticmethod
+    def display_name(weather_data: CurrentSnapshot) -> str:
+        """Build a human readable name for the location of a weather snapshot."""
+        return f"{weather_data.location_name}, {weather_data.country}"
+
+    def lookup(self, text: str) -> Optional[str]:
+        """Return the canonical key known to this process for this text, if any."""
+        return self.aliases.get(normalize_location(text))
+
+    def get_name(self, canonical: str) -> str:
+        """Return the display name of a canonical key, falling back to the key itself."""
+        return self.names.get(canonical, canonical)
+
+    async def add_alias(self, text: str, weather_data: CurrentSnapshot) -> str:
+        """Record that ``text`` refers to the location in ``weather_data``."""
+        canonical = self.canonical_key(weather_data)
+        alias = normalize_location(text)
+        name = self.display_name(weather_data)
+        if self.aliases.get(alias) != canonical or self.names.get(canonical) != name:
+            self.aliases[alias] = canonical
+            self.aliases.setdefault(canonical, canonical)
+            self.names[canonical] = name
+            await self._save_alias(alias, canonical, name)
+        return canonical
+
+    async def resolve(self, text: str,
+                      fetch: Callable[[str], Awaitable[CurrentSnapshot]]) -> Tuple[str, Optional[CurrentSnapshot]]:
+        """Resolve free text to its canonical key.
+
+        Returns the canonical key and the validation response, which is None
+        when the alias was already known and no upstream call was needed.
+        """
+        canonical = self.lookup(text)
+        if canonical is None and self.backend is not None:
+            canonical = await self._fetch_alias(normalize_location(text))
+        if canonical:
+            return canonical, None
+        weather_data = await fetch(text)
+        return await self.add_alias(text, weather_data), weather_data
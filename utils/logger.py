@@ -1,38 +1,172 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
+import queue
+import random
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, Optional
 
-def setup_logger(name: str) -> logging.Logger:
-    """Set up a logger with file and console handlers."""
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
+_context: contextvars.ContextVar[Dict] = contextvars.ContextVar("log_context", default={})
 
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+CONTEXT_FIELDS = ("update_id", "user_id", "route")
+
+@contextmanager
+def log_context(**fields):
+    """Attach fields such as update_id, user_id or route to records logged inside the block."""
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including the log context."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of the records at or below a level."""
+
+    def __init__(self, level: int = logging.DEBUG, rate: float = 1.0):
+        super().__init__()
+        self.level = level
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > self.level or self.rate >= 1.0 or random.random() < self.rate
 
-    # Create file handler with rotation
-    file_handler = RotatingFileHandler(
-        f'logs/weather_bot_{datetime.now().strftime("%Y%m%d")}.log',
-        maxBytes=1024*1024,  # 1MB
-        backupCount=5
+class ContextQueueHandler(QueueHandler):
+    """Enqueue records without formatting them; the listener thread does that.
+
+    The caller's log context is copied onto the record here, since it lives
+    in the caller's task. When the queue is full records are dropped and
+    counted rather than blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        for field, value in _context.get().items():
+            setattr(record, field, value)
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listeners: Dict[str, QueueListener] = {}
+
+def dropped_records() -> int:
+    """Return how many records were dropped because a logging queue was full."""
+    return sum(
+        handler.dropped
+        for name in _listeners
+        for handler in logging.getLogger(name).handlers
+        if isinstance(handler, ContextQueueHandler)
     )
-    file_handler.setLevel(logging.INFO)
 
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
+def setup_logger(name: str, json_format: Optional[bool] = None, level: Optional[str] = None,
+                 debug_sample_rate: Optional[float] = None, queue_size: int = 10000) -> logging.Logger:
+    """Set up a logger whose records are written to a daily file and the console by a background thread.
 
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    Calling it again for the same name returns the already configured logger.
+    Defaults come from LOG_FORMAT ("text" or "json"), LOG_LEVEL and
+    LOG_DEBUG_SAMPLE_RATE.
+    """
+    logger = logging.getLogger(name)
+    if name in _listeners:
+        return logger
+
+    if json_format is None:
+        json_format = os.getenv('LOG_FORMAT', 'text').lower() == 'json'
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    if debug_sample_rate is None:
+        debug_sample_rate = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+
+    os.makedirs('logs', exist_ok=True)
+
+    if json_format:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    # Rotates at midnight, so a long-running process does not keep writing
+    # to the file named after its start date
+    file_handler = TimedRotatingFileHandler(
+        'logs/weather_bot.log', when='midnight', backupCount=7, encoding='utf-8', delay=True
     )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = ContextQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(logging.DEBUG, debug_sample_rate))
 
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.setLevel(level)
+    logger.addHandler(queue_handler)
+    logger.propagate = False
 
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+    atexit.register(listener.stop)
     return logger
+
+def _restart_listeners():
+    """Give a forked child its own logging queues and threads; the parent's threads do not survive a fork."""
+    for name, listener in list(_listeners.items()):
+        log_queue = queue.Queue(maxsize=listener.queue.maxsize)
+        for handler in logging.getLogger(name).handlers:
+            if isinstance(handler, ContextQueueHandler):
+                handler.queue = log_queue
+                handler.dropped = 0
+        replacement = QueueListener(log_queue, *listener.handlers, respect_handler_level=True)
+        replacement.start()
+        _listeners[name] = replacement
+        atexit.register(replacement.stop)
+
+os.register_at_fork(after_in_child=_restart_listeners)
+
+def use_worker_log_file(index: int):
+    """Write this process's log file to logs/weather_bot.worker-<index>.log.
+
+    Forked workers sharing one daily file would each rotate it at midnight,
+    deleting one another's rotated copies.
+    """
+    for listener in _listeners.values():
+        for handler in listener.handlers:
+            if isinstance(handler, TimedRotatingFileHandler):
+                with handler.lock:
+                    handler.close()
+                    handler.baseFilename = os.path.abspath(f'logs/weather_bot.worker-{index}.log')
+
+def stop_listeners():
+    """Stop the logging threads after they write out the queued records.
+
+    For processes leaving through os._exit, which skips the atexit hooks
+    that normally do this.
+    """
+    for listener in _listeners.values():
+        listener.stop()
@@ -0,0 +1,237 @@
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Tuple
+
+DEFAULT_LANGUAGE = "es"
+LANGUAGES = ("es", "en")
+
+# WeatherAPI condition code -> (day text, night text) per language
+_CONDITIONS: Dict[int, Dict[str, Tuple[str, str]]] = {
+    1000: {"en": ("Sunny", "Clear"), "es": ("Soleado", "Despejado")},
+    1003: {"en": ("Partly cloudy",), "es": ("Parcialmente nublado",)},
+    1006: {"en": ("Cloudy",), "es": ("Nublado",)},
+    1009: {"en": ("Overcast",), "es": ("Cubierto",)},
+    1030: {"en": ("Mist",), "es": ("Neblina",)},
+    1063: {"en": ("Patchy rain nearby",), "es": ("Posible lluvia dispersa",)},
+    1066: {"en": ("Patchy snow nearby",), "es": ("Posible nieve dispersa",)},
+    1069: {"en": ("Patchy sleet nearby",), "es": ("Posible aguanieve dispersa",)},
+    1072: {"en": ("Patchy freezing drizzle nearby",), "es": ("Posible llovizna helada dispersa",)},
+    1087: {"en": ("Thundery outbreaks nearby",), "es": ("Posibles tormentas eléctricas",)},
+    1114: {"en": ("Blowing snow",), "es": ("Ventisca",)},
+    1117: {"en": ("Blizzard",), "es": ("Tormenta de nieve",)},
+    1135: {"en": ("Fog",), "es": ("Niebla",)},
+    1147: {"en": ("Freezing fog",), "es": ("Niebla helada",)},
+    1150: {"en": ("Patchy light drizzle",), "es": ("Llovizna ligera dispersa",)},
+    1153: {"en": ("Light drizzle",), "es": ("Llovizna ligera",)},
+    1168: {"en": ("Freezing drizzle",), "es": ("Llovizna helada",)},
+    1171: {"en": ("Heavy freezing drizzle",), "es": ("Llovizna helada intensa",)},
+    1180: {"en": ("Patchy light rain",), "es": ("Lluvia ligera dispersa",)},
+    1183: {"en": ("Light rain",), "es": ("Lluvia ligera",)},
+    1186: {"en": ("Moderate rain at times",), "es": ("Lluvia moderada por momentos",)},
+    1189: {"en": ("Moderate rain",), "es": ("Lluvia moderada",)},
+    1192: {"en": ("Heavy rain at times",), "es": ("Lluvia intensa por momentos",)},
+    1195: {"en": ("Heavy rain",), "es": ("Lluvia intensa",)},
+    1198: {"en": ("Light freezing rain",), "es": ("Lluvia helada ligera",)},
+    1201: {"en": ("Moderate or heavy freezing rain",), "es": ("Lluvia helada moderada o intensa",)},
+    1204: {"en": ("Light sleet",), "es": ("Aguanieve ligera",)},
+    1207: {"en": ("Moderate or heavy sleet",), "es": ("Aguanieve moderada o intensa",)},
+    1210: {"en": ("Patchy light snow",), "es": ("Nieve ligera dispersa",)},
+    1213: {"en": ("Light snow",), "es": ("Nieve ligera",)},
+    1216: {"en": ("Patchy moderate snow",), "es": ("Nieve moderada dispersa",)},
+    1219: {"en": ("Moderate snow",), "es": ("Nieve moderada",)},
+    1222: {"en": ("Patchy heavy snow",), "es": ("Nieve intensa dispersa",)},
+    1225: {"en": ("Heavy snow",), "es": ("Nieve intensa",)},
+    1237: {"en": ("Ice pellets",), "es": ("Granizo",)},
+    1240: {"en": ("Light rain shower",), "es": ("Lluvia ligera intermitente",)},
+    1243: {"en": ("Moderate or heavy rain shower",), "es": ("Lluvia moderada o intensa intermitente",)},
+    1246: {"en": ("Torrential rain shower",), "es": ("Lluvia torrencial",)},
+    1249: {"en": ("Light sleet showers",), "es": ("Aguanieve ligera intermitente",)},
+    1252: {"en": ("Moderate or heavy sleet showers",), "es": ("Aguanieve moderada o intensa intermitente",)},
+    1255: {"en": ("Light snow showers",), "es": ("Nevada ligera intermitente",)},
+    1258: {"en": ("Moderate or heavy snow showers",), "es": ("Nevada moderada o intensa intermitente",)},
+    1261: {"en": ("Light showers of ice pellets",), "es": ("Granizo ligero intermitente",)},
+    1264: {"en": ("Moderate or heavy showers of ice pellets",), "es": ("Granizo moderado o intenso intermitente",)},
+    1273: {"en": ("Patchy light rain with thunder",), "es": ("Lluvia ligera dispersa con truenos",)},
+    1276: {"en": ("Moderate or heavy rain with thunder",), "es": ("Lluvia moderada o intensa con truenos",)},
+    1279: {"en": ("Patchy light snow with thunder",), "es": ("Nieve ligera dispersa con truenos",)},
+    1282: {"en": ("Moderate or heavy snow with thunder",), "es": ("Nieve moderada o intensa con truenos",)},
+}
+
+_WEEKDAYS = {
+    "es": ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"),
+    "en": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+}
+
+_MONTHS = {
+    "es": ("enero", "febrero", "marzo", "abril", "mayo", "junio", "julio",
+           "agosto", "septiembre", "octubre", "noviembre", "diciembre"),
+    "en": ("January", "February", "March", "April", "May", "June", "July",
+           "August", "September", "October", "November", "December"),
+}
+
+_TEMPLATES = {
+    "es": {
+        "date": "{weekday}, {day:02d} de {month}",
+        "welcome": "¡Bienvenido al Bicho_Bot del Clima!\n\nSelecciona una opción del menú:",
+        "main_menu": "Menú Principal:",
+        "use_menu": "Por favor, usa el menú principal:",
+        "settings": "Configuración\n\nSelecciona una opción:",
+        "alerts": "Configuración de Alertas\n\nSelecciona una opción:",
+        "ask_location": "Por favor, envía el nombre de tu ciudad.\nEjemplo: Madrid",
+        "location_required": "Por favor, establece primero tu ubicación.\nIntroduce el nombre de tu ciudad.\nEjemplo: Madrid",
+        "location_set": "Ubicación establecida en: {name}",
+        "location_not_found": "No se pudo encontrar esa ubicación. Por favor, intenta con otra.",
+        "ask_unit": "Selecciona tu unidad de temperatura preferida:",
+        "unit_changed": "Unidad de temperatura cambiada a {unit}°",
+        "ask_notification_time": "Configura el horario para recibir el pronóstico diario:\n\n"
+                                 "Por favor, envía la hora en formato HH:MM (24h)\nEjemplo: 08:00",
+        "notification_time_set": "Notificaciones diarias configuradas para las {time}",
+        "invalid_time": "Formato de hora inválido. Por favor, usa el formato HH:MM (ejemplo: 08:00)",
+        "ask_language": "Selecciona tu idioma preferido:",
+        "language_changed": "Idioma cambiado a Español",
+        "ask_temp_limits": "Configura las alertas de temperatura\n\n"
+                           "Envía los límites de temperatura en formato: MIN MAX\nEjemplo: 15 25",
+        "temp_limits_set": "Alertas de temperatura configuradas:\nMínima: {min}°{unit}\nMáxima: {max}°{unit}",
+        "invalid_temp_limits": "Formato inválido. Por favor, envía dos números separados por espacio (ejemplo: 15 25)",
+        "summary_requires_location": "Primero debes configurar tu ubicación en el menú de configuración.",
+        "summary_on": "Resumen diario activado",
+        "summary_off": "Resumen diario desactivado",
+        "alerts_disabled": "Todas las alertas han sido desactivadas",
+        "help": "Ayuda del Bicho_Bot del Clima\n\n"
+                "Clima Actual: Ver el clima actual en tu ubicación\n"
+                "Pronóstico: Ver pronóstico de 3 días\n"
+                "Configuración: Cambiar ubicación, unidades, etc.\n"
+                "Alertas: Configurar alertas de temperatura\n\n"
+                "Para cambiar tu ubicación:\n"
+                "1. Ve a Configuración\n"
+                "2. Selecciona 'Cambiar Ubicación'\n"
+                "3. Envía el nombre de tu ciudad\n\n"
+                "Para configurar alertas:\n"
+                "1. Ve a Alertas\n"
+                "2. Elige el tipo de alerta\n"
+                "3. Sigue las instrucciones en pantalla",
+        "current_weather": "Clima en {name}, {country}\nTemperatura: {temp}°{unit}\n"
+                           "Condición: {condition}\nHumedad: {humidity}%\nViento: {wind} km/h",
+        "weather_error": "Lo siento, hubo un error al obtener los datos del clima. Por favor, intenta nuevamente más tarde.",
+        "forecast_header": "Pronóstico de {days} días para {name}:\n\n",
+        "forecast_day": "{date}\nMáxima: {max}°{unit}\nMínima: {min}°{unit}\n"
+                        "Condición: {condition}\nProbabilidad de lluvia: {rain}%\n\n",
+        "forecast_error": "Lo siento, hubo un error al obtener el pronóstico. Por favor, intenta nuevamente más tarde.",
+        "stale_notice": "\n\n⚠️ El servicio del clima no responde. Datos de hace {age}.",
+        "age_minutes": "{value} min",
+        "age_hours": "{value} h",
+        "age_days": "{value} días",
+        "daily_notification": "Buenos días! Aquí está tu pronóstico diario para {name}:\n\n"
+                              "Temperatura actual: {temp}°{unit}\nMáxima: {max}°{unit}\nMínima: {min}°{unit}\n"
+                              "Condición: {condition}\nProbabilidad de lluvia: {rain}%",
+        "alert_below": "⚠️ Alerta de temperatura: {temp}°{unit}\nLa temperatura ha bajado de tu mínimo de {limit}°{unit}",
+        "alert_above": "⚠️ Alerta de temperatura: {temp}°{unit}\nLa temperatura ha superado tu máximo de {limit}°{unit}",
+        "error": "Lo siento, ha ocurrido un error. Por favor, intenta nuevamente.",
+    },
+    "en": {
+        "date": "{weekday}, {month} {day:02d}",
+        "welcome": "Welcome to Bicho_Bot Weather!\n\nChoose an option from the menu:",
+        "main_menu": "Main Menu:",
+        "use_menu": "Please use the main menu:",
+        "settings": "Settings\n\nChoose an option:",
+        "alerts": "Alert Settings\n\nChoose an option:",
+        "ask_location": "Please send the name of your city.\nExample: London",
+        "location_required": "Please set your location first.\nEnter the name of your city.\nExample: London",
+        "location_set": "Location set to: {name}",
+        "location_not_found": "That location could not be found. Please try another one.",
+        "ask_unit": "Choose your preferred temperature unit:",
+        "unit_changed": "Temperature unit changed to {unit}°",
+        "ask_notification_time": "Set the time to receive your daily forecast:\n\n"
+                                 "Please send the time in HH:MM format (24h)\nExample: 08:00",
+        "notification_time_set": "Daily notifications set for {time}",
+        "invalid_time": "Invalid time format. Please use the HH:MM format (example: 08:00)",
+        "ask_language": "Choose your preferred language:",
+        "language_changed": "Language changed to English",
+        "ask_temp_limits": "Set up temperature alerts\n\n"
+                           "Send the temperature limits in the format: MIN MAX\nExample: 15 25",
+        "temp_limits_set": "Temperature alerts set:\nMinimum: {min}°{unit}\nMaximum: {max}°{unit}",
+        "invalid_temp_limits": "Invalid format. Please send two numbers separated by a space (example: 15 25)",
+        "summary_requires_location": "You need to set your location in the settings menu first.",
+        "summary_on": "Daily summary enabled",
+        "summary_off": "Daily summary disabled",
+        "alerts_disabled": "All alerts have been disabled",
+        "help": "Bicho_Bot Weather Help\n\n"
+                "Current Weather: See the current weather at your location\n"
+                "Forecast: See the 3-day forecast\n"
+                "Settings: Change location, units, etc.\n"
+                "Alerts: Set up temperature alerts\n\n"
+                "To change your location:\n"
+                "1. Go to Settings\n"
+                "2. Choose 'Change Location'\n"
+                "3. Send the name of your city\n\n"
+                "To set up alerts:\n"
+                "1. Go to Alerts\n"
+                "2. Choose the alert type\n"
+                "3. Follow the on-screen instructions",
+        "current_weather": "Weather in {name}, {country}\nTemperature: {temp}°{unit}\n"
+                           "Condition: {condition}\nHumidity: {humidity}%\nWind: {wind} km/h",
+        "weather_error": "Sorry, there was an error getting the weather data. Please try again later.",
+        "forecast_header": "{days}-day forecast for {name}:\n\n",
+        "forecast_day": "{date}\nHigh: {max}°{unit}\nLow: {min}°{unit}\n"
+                        "Condition: {condition}\nChance of rain: {rain}%\n\n",
+        "forecast_error": "Sorry, there was an error getting the forecast. Please try again later.",
+        "stale_notice": "\n\n⚠️ The weather service is not responding. Data from {age} ago.",
+        "age_minutes": "{value} min",
+        "age_hours": "{value} h",
+        "age_days": "{value} days",
+        "daily_notification": "Good morning! Here is your daily forecast for {name}:\n\n"
+                              "Current temperature: {temp}°{unit}\nHigh: {max}°{unit}\nLow: {min}°{unit}\n"
+                              "Condition: {condition}\nChance of rain: {rain}%",
+        "alert_below": "⚠️ Temperature alert: {temp}°{unit}\nThe temperature has dropped below your minimum of {limit}°{unit}",
+        "alert_above": "⚠️ Temperature alert: {temp}°{unit}\nThe temperature has risen above your maximum of {limit}°{unit}",
+        "error": "Sorry, an error occurred. Please try again.",
+    },
+}
+
+# Bound str.format methods, so rendering is one lookup and one fill
+_RENDERERS = {
+    language: {key: template.format for key, template in templates.items()}
+    for language, templates in _TEMPLATES.items()
+}
+
+# (code, is_day) -> text for each language
+_CONDITION_TEXT = {
+    language: {
+        (code, is_day): texts[language][0 if is_day or len(texts[language]) == 1 else 1]
+        for code, texts in _CONDITIONS.items()
+        for is_day in (True, False)
+    }
+    for language in LANGUAGES
+}
+
+def language_of(language: str) -> str:
+    """Return ``language`` if the catalog supports it, else the default language."""
+    return language if language in _RENDERERS else DEFAULT_LANGUAGE
+
+def render(language: str, key: str, **values) -> str:
+    """Fill the ``key`` template of a language with ``values``."""
+    return _RENDERERS[language_of(language)][key](**values)
+
+def condition_text(language: str, code: int, is_day: bool = True, fallback: str = "") -> str:
+    """Return the localized text of a WeatherAPI condition code."""
+    return _CONDITION_TEXT[language_of(language)].get((code, is_day), fallback)
+
+@lru_cache(maxsize=256)
+def format_date(language: str, iso_date: str) -> str:
+    """Format a YYYY-MM-DD date as a localized weekday, day and month."""
+    language = language_of(language)
+    day = date.fromisoformat(iso_date)
+    return _RENDERERS[language]["date"](
+        weekday=_WEEKDAYS[language][day.weekday()],
+        day=day.day,
+        month=_MONTHS[language][day.month - 1]
+    )
+
+def format_age(language: str, seconds: float) -> str:
+    """Format the age of a reading in whole minutes, hours or days."""
+    minutes = max(1, int(seconds // 60))
+    if minutes < 120:
+        return render(language, "age_minutes", value=minutes)
+    if minutes < 48 * 60:
+        return render(language, "age_hours", value=minutes // 60)
+    return render(language, "age_days", value=minutes // (24 * 60))
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from models.user_registry import UserRecord, UserRegistry
+from utils.metrics import NOTIFICATIONS
+from utils.circuit_breaker import CircuitOpenError
+from utils.quota import QuotaExceededError
+
+logger = logging.getLogger('weather_bot.dispatcher')
+
+class NotificationDispatcher:
+    """Send the daily forecast to every user due in a given minute.
+
+    Due users are taken from the registry's minute index and grouped by
+    location, so each location is fetched once per minute no matter how many
+    users share it. Messages are then sent concurrently, bounded by
+    ``max_concurrency``.
+
+    The last dispatched minute is persisted to ``state_file``. After a restart
+    the first tick also dispatches the minutes missed while the bot was down,
+    up to ``catch_up_minutes`` back, and never dispatches a minute twice.
+
+    Locations whose forecast the WeatherAPI budget cannot cover, or whose
+    fetch hit an open circuit breaker, are deferred and retried on the following ticks, for up to ``catch_up_minutes``.
+    """
+
+    def __init__(self, users: UserRegistry,
+                 fetch_forecast: Callable[[str, int], Awaitable[Dict]],
+                 format_message: Callable[[UserRecord, Dict], str],
+                 send_message: Callable[[int, str], Awaitable[None]],
+                 max_concurrency: int = 20,
+                 state_file: Optional[str] = "data/dispatcher_state.json",
+                 catch_up_minutes: int = 15,
+                 prefetch: Optional[Callable[[List[str]], Awaitable[None]]] = None):
+        self.users = users
+        self.fetch_forecast = fetch_forecast
+        self.format_message = format_message
+        self.send_message = send_message
+        self.max_concurrency = max_concurrency
+        self.state_file = state_file
+        self.catch_up_minutes = catch_up_minutes
+        self.prefetch = prefetch
+        self.last_dispatched = self._load_state()
+        self._deferred: List[Tuple[float, str, List[UserRecord]]] = []
+        self._lock = asyncio.Lock()
+
+    def _load_state(self) -> Optional[datetime]:
+        """Load the last dispatched minute from the state file."""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return None
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return datetime.fromisoformat(json.load(f)["last_dispatched"])
+        except Exception as e:
+            logger.error("Error loading dispatcher state: %s", e)
+            return None
+
+    def _save_state(self):
+        """Atomically persist the last dispatched minute."""
+        if not self.state_file:
+            return
+        tmp_file = f"{self.state_file}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({"last_dispatched": self.last_dispatched.isoformat()}, f)
+            os.replace(tmp_file, self.state_file)
+        except Exception as e:
+            logger.error("Error saving dispatcher state: %s", e)
+
+    def reload_state(self):
+        """Re-read the last dispatched minute, written meanwhile by another process."""
+        self.last_dispatched = self._load_state()
+
+    def due_users(self, minute: int) -> Dict[str, List[UserRecord]]:
+        """Group the users subscribed for ``minute`` by their location."""
+        groups: Dict[str, List[UserRecord]] = defaultdict(list)
+        for user_id in self.users.users_at_minute(minute):
+            record = self.users.get_user_preferences(user_id)
+            if record and record.daily_forecast and record.location:
+                groups[record.location].append(record)
+        return groups
+
+    async def dispatch(self, minute: int) -> int:
+        """Notify every user due at ``minute``; return the number of messages sent."""
+        return await self._deliver(self.due_users(minute), f"{minute // 60:02d}:{minute % 60:02d}")
+
+    async def dispatch_deferred(self) -> int:
+        """Retry the locations deferred for lack of WeatherAPI budget; return the messages sent."""
+        now = time.monotonic()
+        groups: Dict[str, List[UserRecord]] = defaultdict(list)
+        deadlines: Dict[str, float] = {}
+        for deadline, location, records in self._deferred:
+            if deadline < now:
+                logger.warning("Dropping %s deferred daily notifications for %s", len(records), location)
+                continue
+            deadlines[location] = min(deadline, deadlines.get(location, deadline))
+            groups[location].extend(
+                record for record in records
+                if record.daily_forecast and record.location == location
+                and self.users.get_user_preferences(record.user_id) is record
+            )
+        self._deferred = []
+        return await self._deliver(groups, "deferred", deadlines)
+
+    async def _deliver(self, groups: Dict[str, List[UserRecord]], label: str,
+                       deadlines: Optional[Dict[str, float]] = None) -> int:
+        """Fetch each location's forecast once and send it to the location's users."""
+        groups = {location: records for location, records in groups.items() if records}
+        if not groups:
+            return 0
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        deadline = time.monotonic() + self.catch_up_minutes * 60
+        deadlines = deadlines or {}
+
+        async def fetch(location: str) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    return await self.fetch_forecast(location, 1)
+                except (QuotaExceededError, CircuitOpenError):
+                    self._deferred.append((deadlines.get(location, deadline), location, groups[location]))
+                    return None
+                except Exception as e:
+                    logger.error("Error fetching forecast for %s: %s", location, e)
+                    return None
+
+        locations = list(groups)
+        if self.prefetch is not None:
+            try:
+                await self.prefetch(locations)
+            except Exception as e:
+                logger.error("Error prefetching forecasts: %s", e)
+        forecasts = await asyncio.gather(*(fetch(location) for location in locations))
+
+        sent_ok = NOTIFICATIONS.labels("daily", "sent")
+        sent_failed = NOTIFICATIONS.labels("daily", "failed")
+
+        async def send(record: UserRecord, data: Dict) -> bool:
+            async with semaphore:
+                try:
+                    await self.send_message(record.user_id, self.format_message(record, data))
+                    sent_ok.inc()
+                    return True
+                except Exception as e:
+                    logger.error("Error sending daily notification to %s: %s", record.user_id, e)
+                    sent_failed.inc()
+                    return False
+
+        sends = [
+            send(record, data)
+            for location, data in zip(locations, forecasts) if data is not None
+            for record in groups[location]
+        ]
+        sent = sum(await asyncio.gather(*sends))
+        logger.info("Daily notifications for %s: %s sent to %s users in %s locations",
+                    label, sent, sum(map(len, groups.values())), len(groups))
+        return sent
+
+    def pending_minutes(self, now: datetime) -> List[datetime]:
+        """Return the minutes up to ``now`` that still need dispatching."""
+        current = now.replace(second=0, microsecond=0)
+        if self.last_dispatched is None:
+            return [current]
+        start = max(self.last_dispatched + timedelta(minutes=1),
+                    current - timedelta(minutes=self.catch_up_minutes))
+        minutes = []
+        while start <= current:
+            minutes.append(start)
+            start += timedelta(minutes=1)
+        return minutes
+
+    async def tick(self):
+        """Dispatch notifications for the current minute and any missed ones."""
+        async with self._lock:
+            if self._deferred:
+                await self.dispatch_deferred()
+            for moment in self.pending_minutes(datetime.now()):
+                await self.dispatch(moment.hour * 60 + moment.minute)
+                self.last_dispatched = moment
+                self._save_state()
@@ -0,0 +1,146 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+from utils.metrics import REGISTRY
+
+INTERACTIVE = 0
+VALIDATION = 1
+BACKGROUND = 2
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", VALIDATION: "validation", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("quota_priority", default=INTERACTIVE)
+
+QUOTA_GRANTED = REGISTRY.counter(
+    "weatherapi_quota_granted_total", "WeatherAPI calls granted by the budgeter.", ("priority",)
+)
+QUOTA_REJECTED = REGISTRY.counter(
+    "weatherapi_quota_rejected_total", "WeatherAPI calls refused because the budget was tight.", ("priority",)
+)
+QUOTA_WAIT = REGISTRY.histogram(
+    "weatherapi_quota_wait_seconds", "Time spent waiting for WeatherAPI budget.", ("priority",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+class QuotaExceededError(RuntimeError):
+    """The WeatherAPI budget cannot cover a call of this priority right now."""
+
+@contextmanager
+def quota_priority(priority: int):
+    """Charge the WeatherAPI calls made inside the block to ``priority``."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    return _priority.get()
+
+def with_priority(priority: int, func: Callable) -> Callable:
+    """Wrap a coroutine function so its WeatherAPI calls are charged to ``priority``."""
+    async def wrapper(*args, **kwargs):
+        with quota_priority(priority):
+            return await func(*args, **kwargs)
+    wrapper.__name__ = getattr(func, "__name__", "wrapper")
+    return wrapper
+
+class QuotaBudgeter:
+    """Token bucket shared by every WeatherAPI call, with priority classes.
+
+    The bucket refills at ``rate_per_minute`` up to ``burst`` tokens. Each
+    priority may only spend tokens above its reserve, a fraction of the
+    bucket kept for more important work: background work stops first when
+    the budget runs low, then validation, and interactive requests can use
+    the whole bucket. A call that cannot be covered waits up to the
+    priority's ``max_wait`` for the refill, then raises QuotaExceededError.
+    """
+
+    DEFAULT_RESERVES = {INTERACTIVE: 0.0, VALIDATION: 0.2, BACKGROUND: 0.5}
+    DEFAULT_MAX_WAIT = {INTERACTIVE: 3.0, VALIDATION: 5.0, BACKGROUND: 0.0}
+
+    def __init__(self, rate_per_minute: float, burst: Optional[float] = None,
+                 reserves: Optional[Dict[int, float]] = None,
+                 max_wait: Optional[Dict[int, float]] = None,
+                 timer: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1.0, rate_per_minute / 6))
+        self.reserves = {**self.DEFAULT_RESERVES, **(reserves or {})}
+        self.max_wait = {**self.DEFAULT_MAX_WAIT, **(max_wait or {})}
+        self.timer = timer
+        self.tokens = self.capacity
+        self._updated = timer()
+        self._blocked_until = 0.0
+        REGISTRY.callback_gauge(
+            "weatherapi_quota_tokens", "WeatherAPI calls that can be made right now without waiting.", (),
+            lambda: {(): self.available()}
+        )
+
+    def _refill(self):
+        now = self.timer()
+        if now > self._updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def available(self, priority: int = INTERACTIVE) -> float:
+        """Return the tokens ``priority`` could spend right now."""
+        self._refill()
+        if self.timer() < self._blocked_until:
+            return 0.0
+        return max(0.0, self.tokens - self.reserves[priority] * self.capacity)
+
+    def max_cost(self, priority: Optional[int] = None) -> float:
+        """Return the largest single call ``priority`` can ever be granted."""
+        priority = current_priority() if priority is None else priority
+        return self.capacity * (1.0 - self.reserves[priority])
+
+    def _delay(self, priority: int, cost: float) -> float:
+        """Return how long until ``priority`` can spend ``cost`` tokens."""
+        self._refill()
+        now = self.timer()
+        blocked = max(0.0, self._blocked_until - now)
+        floor = self.reserves[priority] * self.capacity
+        if cost > self.capacity - floor:
+            return float("inf")
+        missing = floor + cost - self.tokens
+        return max(blocked, missing / self.rate if missing > 0 else 0.0)
+
+    def try_acquire(self, cost: float = 1.0, priority: Optional[int] = None) -> bool:
+        """Spend ``cost`` tokens if available without waiting."""
+        priority = current_priority() if priority is None else priority
+        if self._delay(priority, cost) > 0:
+            return False
+        self.tokens -= cost
+        QUOTA_GRANTED.labels(PRIORITY_NAMES[priority]).inc(cost)
+        return True
+
+    async def acquire(self, cost: float = 1.0, priority: Optional[int] = None):
+        """Spend ``cost`` tokens, waiting for the refill up to the priority's max_wait."""
+        priority = current_priority() if priority is None else priority
+        name = PRIORITY_NAMES[priority]
+        if self.try_acquire(cost, priority):
+            return
+        started = self.timer()
+        deadline = started + self.max_wait[priority]
+        # Waiters re-check after sleeping; lower reserves let interactive
+        # waiters take refilled tokens that lower priorities may not touch
+        while True:
+            delay = self._delay(priority, cost)
+            if delay == 0:
+                self.tokens -= cost
+                QUOTA_GRANTED.labels(name).inc(cost)
+                QUOTA_WAIT.labels(name).observe(self.timer() - started)
+                return
+            if self.timer() + delay > deadline:
+                QUOTA_REJECTED.labels(name).inc(cost)
+                raise QuotaExceededError(f"WeatherAPI budget exhausted for {name} requests")
+            await asyncio.sleep(delay)
+
+    def throttle(self, retry_after: Optional[float] = None):
+        """Empty the bucket after the upstream answered 429, pausing it for ``retry_after`` seconds."""
+        self._refill()
+        self.tokens = 0.0
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, self.timer() + retry_after)
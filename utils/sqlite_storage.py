@@ -0,0 +1,158 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, Optional
+from models.user_preferences import UserPreferences
+from utils.storage import STORAGE_WRITE_LATENCY, BaseStorage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    location TEXT,
+    language TEXT NOT NULL DEFAULT 'es',
+    temperature_unit TEXT NOT NULL DEFAULT 'C',
+    notification_time TEXT,
+    temp_min REAL,
+    temp_max REAL,
+    daily_forecast INTEGER NOT NULL DEFAULT 0
+);
+-- Lookups by these columns are served by the in-memory user registry
+DROP INDEX IF EXISTS idx_users_location;
+DROP INDEX IF EXISTS idx_users_notification_time;
+DROP INDEX IF EXISTS idx_users_daily_forecast;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_COLUMNS = "user_id, location, language, temperature_unit, notification_time, temp_min, temp_max, daily_forecast"
+
+_UPSERT = f"""
+INSERT INTO users ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    location = excluded.location,
+    language = excluded.language,
+    temperature_unit = excluded.temperature_unit,
+    notification_time = excluded.notification_time,
+    temp_min = excluded.temp_min,
+    temp_max = excluded.temp_max,
+    daily_forecast = excluded.daily_forecast
+"""
+
+def _to_row(data: Dict) -> tuple:
+    """Convert a preferences dictionary into a users table row."""
+    thresholds = data.get("temp_alert_thresholds") or (None, None)
+    return (
+        int(data["user_id"]),
+        data.get("location"),
+        data.get("language", "es"),
+        data.get("temperature_unit", "C"),
+        data.get("notification_time"),
+        thresholds[0],
+        thresholds[1],
+        1 if data.get("daily_forecast") else 0,
+    )
+
+def _from_row(row: tuple) -> Dict:
+    """Convert a users table row into a preferences dictionary."""
+    user_id, location, language, unit, notification_time, temp_min, temp_max, daily_forecast = row
+    return {
+        "user_id": user_id,
+        "location": location,
+        "language": language,
+        "temperature_unit": unit,
+        "notification_time": notification_time,
+        "temp_alert_thresholds": (temp_min, temp_max) if temp_min is not None and temp_max is not None else None,
+        "daily_forecast": bool(daily_forecast),
+    }
+
+class SQLiteStorage(BaseStorage):
+    """User preference storage in a SQLite database running in WAL mode.
+
+    Each save is a single-row upsert instead of a rewrite of every user.
+    """
+
+    def __init__(self, db_file: str = "data/user_preferences.db",
+                 migrate_from: Optional[str] = "data/user_preferences.json"):
+        self.db_file = db_file
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(_SCHEMA)
+        if migrate_from:
+            self.migrate_from_json(migrate_from)
+
+    def migrate_from_json(self, json_file: str) -> int:
+        """Import users from a legacy JSON storage file once.
+
+        Returns the number of users imported. The migration is recorded in the
+        meta table, so later starts skip it even if the JSON file remains.
+        """
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+            if done or not os.path.exists(json_file):
+                return 0
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error reading {json_file} for migration: {e}")
+                return 0
+            rows = [_to_row(user) for user in data.values()]
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(_UPSERT, rows)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (json_file,)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            return len(rows)
+
+    def get_user_preferences(self, user_id: int) -> Optional[UserPreferences]:
+        """Get user preferences from storage."""
+        with self._lock:
+            row = self.conn.execute(f"SELECT {_COLUMNS} FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row:
+            return UserPreferences.from_dict(_from_row(row))
+        return None
+
+    def save_user_preferences(self, preferences: UserPreferences):
+        """Save user preferences to storage."""
+        row = _to_row(preferences.to_dict())
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                self.conn.execute(_UPSERT, row)
+        except sqlite3.Error as e:
+            print(f"Error saving data: {e}")
+        STORAGE_WRITE_LATENCY.labels("sqlite", "save").observe(time.perf_counter() - started)
+
+    def delete_user_preferences(self, user_id: int):
+        """Delete user preferences from storage."""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                self.conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+        except sqlite3.Error as e:
+            print(f"Error deleting data: {e}")
+        STORAGE_WRITE_LATENCY.labels("sqlite", "delete").observe(time.perf_counter() - started)
+
+    def iter_user_data(self) -> Iterator[Dict]:
+        """Iterate over the stored dictionaries of every user."""
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {_COLUMNS} FROM users").fetchall()
+        return (_from_row(row) for row in rows)
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self.conn.close()
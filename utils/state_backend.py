@@ -0,0 +1,560 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+class StateBackendError(RuntimeError):
+    """The shared state backend failed or could not be reached."""
+
+def _parse_id(change_id: str) -> Tuple[int, int]:
+    """Split a "<ms>-<seq>" change id into comparable integers."""
+    ms, _, seq = change_id.partition("-")
+    return int(ms), int(seq or 0)
+
+class StateBackend(ABC):
+    """Key-value state that can be shared between bot processes.
+
+    Besides plain keys with an optional TTL, backends offer hashes, atomic
+    set-if-absent / extend-if-equal / delete-if-equal operations used for
+    locks and leases, and append-only change feeds that other processes read
+    with a cursor. ``shared`` tells whether other processes see the same state.
+
+    The primitives are blocking. Code running on the event loop goes
+    through ``call``, which moves them to a worker thread when ``blocking``
+    says they wait on a socket or on disk.
+    """
+
+    shared = False
+    blocking = True
+
+    async def call(self, func: Callable[..., Any], *args) -> Any:
+        """Run ``func(*args)``, usually one of this backend's primitives, without blocking the event loop."""
+        if not self.blocking:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return a key's value, or None if it is missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        """Set a key, expiring after ``ttl`` seconds when given."""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Delete a key if it exists."""
+
+    @abstractmethod
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        """Set a key with a TTL unless it exists; return whether it was set."""
+
+    @abstractmethod
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        """Delete a key only if it still holds ``value``; return whether it was deleted."""
+
+    @abstractmethod
+    def extend_if_equal(self, key: str, value: str, ttl: float) -> bool:
+        """Reset a key's TTL only if it still holds ``value``; return whether it was extended."""
+
+    @abstractmethod
+    def hget(self, name: str, field: str) -> Optional[str]:
+        """Return one field of a hash."""
+
+    @abstractmethod
+    def hset(self, name: str, field: str, value: str):
+        """Set one field of a hash."""
+
+    @abstractmethod
+    def hdel(self, name: str, *fields: str):
+        """Delete fields of a hash."""
+
+    @abstractmethod
+    def hgetall(self, name: str) -> Dict[str, str]:
+        """Return every field of a hash."""
+
+    @abstractmethod
+    def publish(self, feed: str, message: str) -> str:
+        """Append a message to a change feed and return its id."""
+
+    @abstractmethod
+    def latest_change(self, feed: str) -> str:
+        """Return the id of the newest message in a feed, or "0-0" when it is empty."""
+
+    @abstractmethod
+    def changes(self, feed: str, after: str, count: int = 1000) -> Tuple[List[Tuple[str, str]], bool]:
+        """Return up to ``count`` (id, message) pairs newer than ``after``.
+
+        The flag is False when older messages were trimmed from the feed
+        since ``after``, so the reader may have missed some and should reload.
+        """
+
+    def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """Take a lock that expires after ``ttl`` seconds; return its token, or None if it is held."""
+        token = uuid.uuid4().hex
+        return token if self.set_if_absent(f"lock:{name}", token, ttl) else None
+
+    def release_lock(self, name: str, token: str) -> bool:
+        """Release a lock taken with ``token``, unless it expired and was taken by someone else."""
+        return self.delete_if_equal(f"lock:{name}", token)
+
+    def extend_lock(self, name: str, token: str, ttl: float) -> bool:
+        """Push a held lock's expiry ``ttl`` seconds out; return False if it was lost."""
+        return self.extend_if_equal(f"lock:{name}", token, ttl)
+
+    def lock_held(self, name: str) -> bool:
+        """Check whether anyone holds a lock."""
+        return self.get(f"lock:{name}") is not None
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+class MemoryStateBackend(StateBackend):
+    """In-process state; the default when the bot runs as a single process."""
+
+    blocking = False
+
+    def __init__(self, feed_maxlen: int = 10000, timer=time.monotonic):
+        self.feed_maxlen = feed_maxlen
+        self.timer = timer
+        self._lock = threading.Lock()
+        self._values: Dict[str, Tuple[str, float]] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._feeds: Dict[str, Deque[Tuple[str, str]]] = {}
+        self._trimmed: Dict[str, str] = {}  # Id of the newest message trimmed from each feed
+        self._sequence = 0
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] and entry[1] <= self.timer():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        with self._lock:
+            self._values[key] = (value, self.timer() + ttl if ttl else 0.0)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (value, self.timer() + ttl)
+            return True
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            del self._values[key]
+            return True
+
+    def extend_if_equal(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) != value:
+                return False
+            self._values[key] = (value, self.timer() + ttl)
+            return True
+
+    def hget(self, name: str, field: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(name, {}).get(field)
+
+    def hset(self, name: str, field: str, value: str):
+        with self._lock:
+            self._hashes.setdefault(name, {})[field] = value
+
+    def hdel(self, name: str, *fields: str):
+        with self._lock:
+            values = self._hashes.get(name, {})
+            for field in fields:
+                values.pop(field, None)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def publish(self, feed: str, message: str) -> str:
+        with self._lock:
+            self._sequence += 1
+            change_id = f"{self._sequence}-0"
+            messages = self._feeds.setdefault(feed, deque())
+            messages.append((change_id, message))
+            while len(messages) > self.feed_maxlen:
+                self._trimmed[feed] = messages.popleft()[0]
+            return change_id
+
+    def latest_change(self, feed: str) -> str:
+        with self._lock:
+            messages = self._feeds.get(feed)
+            return messages[-1][0] if messages else "0-0"
+
+    def changes(self, feed: str, after: str, count: int = 1000) -> Tuple[List[Tuple[str, str]], bool]:
+        with self._lock:
+            cursor = _parse_id(after)
+            trimmed = self._trimmed.get(feed)
+            complete = trimmed is None or _parse_id(trimmed) <= cursor
+            result = [entry for entry in self._feeds.get(feed, ()) if _parse_id(entry[0]) > cursor]
+            return result[:count], complete
+
+class RedisStateBackend(StateBackend):
+    """State kept in a Redis-protocol server, shared by every bot process.
+
+    Speaks RESP over a plain socket, so no client library is needed. One
+    connection per process is opened lazily (and reopened after a fork)
+    and used under a lock. Change feeds are streams capped at
+    ``feed_maxlen`` messages; reading them needs Redis 6.2 or later.
+    """
+
+    shared = True
+
+    def __init__(self, url: str = "redis://localhost:6379/0", timeout: float = 2.0,
+                 feed_maxlen: int = 10000):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.feed_maxlen = feed_maxlen
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+        self._pid = 0
+
+    def _connect(self):
+        self._disconnect()
+        try:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise StateBackendError(f"Cannot connect to {self.host}:{self.port}: {e}") from e
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile("rb")
+        self._pid = os.getpid()
+        if self.password:
+            self._call("AUTH", self.password)
+        if self.db:
+            self._call("SELECT", self.db)
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._reader.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            return StateBackendError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise StateBackendError(f"Unexpected reply from the server: {line!r}")
+
+    def _call(self, *args):
+        """Send one command on the current connection and return its reply; the lock must be held."""
+        if self._sock is None or self._pid != os.getpid():
+            self._connect()
+        try:
+            self._sock.sendall(self._encode(args))
+            reply = self._read()
+        except (OSError, ConnectionError) as e:
+            self._disconnect()
+            raise StateBackendError(f"Redis command {args[0]} failed: {e}") from e
+        if isinstance(reply, StateBackendError):
+            raise reply
+        return reply
+
+    def execute(self, *args):
+        """Run one command and return its decoded reply."""
+        with self._lock:
+            return self._call(*args)
+
+    def get(self, key: str) -> Optional[str]:
+        return self.execute("GET", key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        if ttl:
+            self.execute("SET", key, value, "PX", int(ttl * 1000))
+        else:
+            self.execute("SET", key, value)
+
+    def delete(self, key: str):
+        self.execute("DEL", key)
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        return self.execute("SET", key, value, "NX", "PX", int(ttl * 1000)) == "OK"
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        # WATCH makes the DEL fail if the key changed after the comparison
+        with self._lock:
+            self._call("WATCH", key)
+            if self._call("GET", key) != value:
+                self._call("UNWATCH")
+                return False
+            self._call("MULTI")
+            self._call("DEL", key)
+            return self._call("EXEC") is not None
+
+    def extend_if_equal(self, key: str, value: str, ttl: float) -> bool:
+        with self._lock:
+            self._call("WATCH", key)
+            if self._call("GET", key) != value:
+                self._call("UNWATCH")
+                return False
+            self._call("MULTI")
+            self._call("SET", key, value, "PX", int(ttl * 1000))
+            return self._call("EXEC") is not None
+
+    def hget(self, name: str, field: str) -> Optional[str]:
+        return self.execute("HGET", name, field)
+
+    def hset(self, name: str, field: str, value: str):
+        self.execute("HSET", name, field, value)
+
+    def hdel(self, name: str, *fields: str):
+        if fields:
+            self.execute("HDEL", name, *fields)
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        reply = self.execute("HGETALL", name) or []
+        return dict(zip(reply[::2], reply[1::2]))
+
+    def publish(self, feed: str, message: str) -> str:
+        return self.execute("XADD", feed, "MAXLEN", "~", self.feed_maxlen, "*", "m", message)
+
+    def latest_change(self, feed: str) -> str:
+        reply = self.execute("XREVRANGE", feed, "+", "-", "COUNT", 1)
+        return reply[0][0] if reply else "0-0"
+
+    def changes(self, feed: str, after: str, count: int = 1000) -> Tuple[List[Tuple[str, str]], bool]:
+        with self._lock:
+            oldest = self._call("XRANGE", feed, "-", "+", "COUNT", 1)
+            reply = self._call("XRANGE", feed, f"({after}", "+", "COUNT", count)
+        # Messages between the cursor and the oldest retained one may have
+        # been trimmed; a cursor of "0-0" was taken while the feed was empty
+        complete = after == "0-0" or not oldest or _parse_id(oldest[0][0]) <= _parse_id(after)
+        messages = [(change_id, dict(zip(fields[::2], fields[1::2])).get("m", "")) for change_id, fields in reply]
+        return messages, complete
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    name TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (name, field)
+);
+CREATE TABLE IF NOT EXISTS feeds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    feed TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_feeds_feed ON feeds (feed, id);
+CREATE TABLE IF NOT EXISTS feed_trims (
+    feed TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
+"""
+
+_LIVE = "(expires_at IS NULL OR expires_at > ?)"
+
+class SQLiteStateBackend(StateBackend):
+    """State kept in a SQLite database in WAL mode, shared by the bot processes of one host.
+
+    Suits the supervisor mode, where every worker runs on the same machine.
+    Each process opens its own connection lazily, so the backend can be
+    created before forking. Expired keys are deleted every
+    ``purge_every`` writes.
+    """
+
+    shared = True
+
+    def __init__(self, db_file: str = "data/state.db", feed_maxlen: int = 10000, purge_every: int = 1000):
+        self.db_file = db_file
+        self.feed_maxlen = feed_maxlen
+        self.purge_every = purge_every
+        os.makedirs(os.path.dirname(self.db_file) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._writes = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Return this process's connection, opening it on first use."""
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.executescript(_SQLITE_SCHEMA)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            try:
+                return self.conn.execute(query, params)
+            except sqlite3.Error as e:
+                raise StateBackendError(f"State database error: {e}") from e
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self._execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._execute(f"SELECT value FROM kv WHERE key = ? AND {_LIVE}", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        self._execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else None)
+        )
+        self._written()
+
+    def delete(self, key: str):
+        self._execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def set_if_absent(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        # Inserts, or takes over an expired key, in one statement
+        cursor = self._execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.expires_at IS NOT NULL AND kv.expires_at <= ?",
+            (key, value, now + ttl, now)
+        )
+        self._written()
+        return cursor.rowcount == 1
+
+    def delete_if_equal(self, key: str, value: str) -> bool:
+        cursor = self._execute(
+            f"DELETE FROM kv WHERE key = ? AND value = ? AND {_LIVE}", (key, value, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def extend_if_equal(self, key: str, value: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            f"UPDATE kv SET expires_at = ? WHERE key = ? AND value = ? AND {_LIVE}", (now + ttl, key, value, now)
+        )
+        return cursor.rowcount == 1
+
+    def hget(self, name: str, field: str) -> Optional[str]:
+        row = self._execute("SELECT value FROM hashes WHERE name = ? AND field = ?", (name, field)).fetchone()
+        return row[0] if row else None
+
+    def hset(self, name: str, field: str, value: str):
+        self._execute("INSERT OR REPLACE INTO hashes (name, field, value) VALUES (?, ?, ?)", (name, field, value))
+
+    def hdel(self, name: str, *fields: str):
+        with self._lock:
+            try:
+                self.conn.executemany(
+                    "DELETE FROM hashes WHERE name = ? AND field = ?", [(name, field) for field in fields]
+                )
+            except sqlite3.Error as e:
+                raise StateBackendError(f"State database error: {e}") from e
+
+    def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._execute("SELECT field, value FROM hashes WHERE name = ?", (name,)).fetchall())
+
+    def publish(self, feed: str, message: str) -> str:
+        change_id = self._execute("INSERT INTO feeds (feed, message) VALUES (?, ?)", (feed, message)).lastrowid
+        if change_id % 100 == 0:
+            self._trim(feed)
+        return f"{change_id}-0"
+
+    def _trim(self, feed: str):
+        """Drop all but the newest ``feed_maxlen`` messages of a feed, remembering where it was cut."""
+        row = self._execute(
+            "SELECT id FROM feeds WHERE feed = ? ORDER BY id DESC LIMIT 1 OFFSET ?", (feed, self.feed_maxlen)
+        ).fetchone()
+        if row is None:
+            return
+        self._execute("INSERT OR REPLACE INTO feed_trims (feed, last_id) VALUES (?, ?)", (feed, row[0]))
+        self._execute("DELETE FROM feeds WHERE feed = ? AND id <= ?", (feed, row[0]))
+
+    def latest_change(self, feed: str) -> str:
+        row = self._execute("SELECT MAX(id) FROM feeds WHERE feed = ?", (feed,)).fetchone()
+        return f"{row[0]}-0" if row[0] is not None else "0-0"
+
+    def changes(self, feed: str, after: str, count: int = 1000) -> Tuple[List[Tuple[str, str]], bool]:
+        cursor = _parse_id(after)[0]
+        trimmed = self._execute("SELECT last_id FROM feed_trims WHERE feed = ?", (feed,)).fetchone()
+        rows = self._execute(
+            "SELECT id, message FROM feeds WHERE feed = ? AND id > ? ORDER BY id LIMIT ?", (feed, cursor, count)
+        ).fetchall()
+        return [(f"{change_id}-0", message) for change_id, message in rows], trimmed is None or trimmed[0] <= cursor
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+def create_state_backend() -> StateBackend:
+    """Create the state backend selected by the STATE_BACKEND environment variable."""
+    backend = os.getenv("STATE_BACKEND", "memory").lower()
+    if backend == "memory":
+        return MemoryStateBackend()
+    if backend == "sqlite":
+        return SQLiteStateBackend(os.getenv("STATE_PATH", "data/state.db"))
+    if backend == "redis":
+        return RedisStateBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown state backend: {backend}")
@@ -0,0 +1,55 @@
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from models.user_preferences import UserPreferences
+from utils.state_backend import StateBackend
+from utils.storage import STORAGE_WRITE_LATENCY, BaseStorage
+
+class StateStorage(BaseStorage):
+    """User preferences kept in the shared state backend.
+
+    Every user's preferences are one JSON value in a hash. Each save or
+    delete also publishes the user id to a change feed, which the registries
+    of the other bot processes replay to stay current (see UserRegistry.sync).
+    """
+
+    shared = True
+
+    def __init__(self, backend: StateBackend, users_key: str = "users", feed: str = "users:changes"):
+        self.backend = backend
+        self.users_key = users_key
+        self.feed = feed
+
+    def get_user_preferences(self, user_id: int) -> Optional[UserPreferences]:
+        """Get user preferences from storage."""
+        value = self.backend.hget(self.users_key, str(user_id))
+        if value is None:
+            return None
+        return UserPreferences.from_dict(json.loads(value))
+
+    def save_user_preferences(self, preferences: UserPreferences):
+        """Save user preferences to storage."""
+        started = time.perf_counter()
+        key = str(preferences.user_id)
+        self.backend.hset(self.users_key, key, json.dumps(preferences.to_dict(), separators=(",", ":")))
+        self.backend.publish(self.feed, key)
+        STORAGE_WRITE_LATENCY.labels("state", "save").observe(time.perf_counter() - started)
+
+    def delete_user_preferences(self, user_id: int):
+        """Delete user preferences from storage."""
+        started = time.perf_counter()
+        key = str(user_id)
+        self.backend.hdel(self.users_key, key)
+        self.backend.publish(self.feed, key)
+        STORAGE_WRITE_LATENCY.labels("state", "delete").observe(time.perf_counter() - started)
+
+    def iter_user_data(self) -> Iterator[Dict]:
+        """Iterate over the stored dictionaries of every user."""
+        return (json.loads(value) for value in self.backend.hgetall(self.users_key).values())
+
+    def latest_change(self) -> str:
+        return self.backend.latest_change(self.feed)
+
+    def changes(self, after: str) -> Tuple[List[Tuple[str, int]], bool]:
+        messages, complete = self.backend.changes(self.feed, after)
+        return [(change_id, int(user_id)) for change_id, user_id in messages], complete
@@ -1,13 +1,87 @@
+import atexit
 import json
 import os
-from typing import Dict, Optional
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional, Tuple
 from models.user_preferences import UserPreferences
+from utils.metrics import REGISTRY
 
-class Storage:
-    def __init__(self, storage_file: str = "data/user_preferences.json"):
+STORAGE_WRITE_LATENCY = REGISTRY.histogram(
+    "weather_bot_storage_write_seconds", "Time spent persisting user preferences.", ("backend", "op")
+)
+
+class BaseStorage(ABC):
+    """Interface shared by the user preference storage backends.
+
+    ``shared`` backends may be written by other bot processes; their
+    changes are read back through latest_change and changes.
+    """
+
+    shared = False
+
+    @abstractmethod
+    def get_user_preferences(self, user_id: int) -> Optional[UserPreferences]:
+        """Get user preferences from storage."""
+
+    @abstractmethod
+    def save_user_preferences(self, preferences: UserPreferences):
+        """Save user preferences to storage."""
+
+    @abstractmethod
+    def delete_user_preferences(self, user_id: int):
+        """Delete user preferences from storage."""
+
+    @abstractmethod
+    def iter_user_data(self) -> Iterator[Dict]:
+        """Iterate over the stored dictionaries of every user."""
+
+    def latest_change(self) -> str:
+        """Return a cursor positioned after the newest change."""
+        return "0-0"
+
+    def changes(self, after: str) -> Tuple[List[Tuple[str, int]], bool]:
+        """Return the (cursor, user id) changes made after ``after``, and False if some were lost."""
+        return [], True
+
+    def close(self):
+        """Release any resources held by the backend."""
+
+class Storage(BaseStorage):
+    """User preferences kept in a JSON snapshot file.
+
+    In write-behind mode (the default) every mutation is appended to a
+    journal next to the snapshot, and a background thread folds the journal
+    into a new snapshot every ``flush_interval`` seconds or after
+    ``flush_every`` changes. Without it every mutation rewrites the snapshot.
+
+    Snapshots are serialized and written outside the data lock, so saves
+    only wait for the copy of the data and the journal append.
+    """
+
+    def __init__(self, storage_file: str = "data/user_preferences.json",
+                 write_behind: bool = True, flush_interval: float = 5.0, flush_every: int = 500):
         self.storage_file = storage_file
+        self.journal_file = f"{storage_file}.journal"
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._lock = threading.RLock()  # Guards data, the journal and the pending count
+        self._snapshot_lock = threading.Lock()  # Serializes snapshot writers
+        self._journal = None
+        self._pending = 0
+        self._closed = threading.Event()
+        self._flush_now = threading.Event()
         self._ensure_data_directory()
         self.data = self._load_data()
+        if self._replay_journal():
+            self._save_data()
+        if self.write_behind:
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
 
     def _ensure_data_directory(self):
         """Ensure the data directory exists."""
@@ -24,27 +98,176 @@ class Storage:
             print(f"Error loading data: {e}")
             return {}
 
-    def _save_data(self):
-        """Save data to storage file."""
+    def _replay_journal(self) -> int:
+        """Apply journaled mutations left over from the last run; return how many."""
+        if not os.path.exists(self.journal_file):
+            return 0
+        applied = 0
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # Torn final line from a crash mid-append
+                if entry["op"] == "set":
+                    self.data[entry["id"]] = entry["data"]
+                else:
+                    self.data.pop(entry["id"], None)
+                applied += 1
+        return applied
+
+    def _save_data(self, durable: bool = True):
+        """Atomically replace the snapshot file with the current data and trim the journal.
+
+        The data is copied under the lock and serialized outside it, so saves
+        arriving meanwhile only wait for the copy. Journal entries appended
+        during the write are kept; replaying them later is idempotent. The
+        snapshot is fsynced when ``durable``, since the journal it replaces
+        is then truncated.
+        """
+        started = time.perf_counter()
+        with self._snapshot_lock:
+            with self._lock:
+                snapshot = dict(self.data)
+                journal_offset = self._journal.tell() if self._journal is not None else 0
+                pending = self._pending
+            tmp_file = f"{self.storage_file}.tmp"
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump(snapshot, f, separators=(",", ":"))
+                    if durable:
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_file, self.storage_file)
+            except Exception as e:
+                print(f"Error saving data: {e}")
+                return
+            with self._lock:
+                try:
+                    if self._journal is not None:
+                        with open(self.journal_file, 'r', encoding='utf-8') as f:
+                            f.seek(journal_offset)
+                            tail = f.read()
+                        self._journal.seek(0)
+                        self._journal.truncate()
+                        self._journal.write(tail)
+                        self._journal.flush()
+                    elif os.path.exists(self.journal_file):
+                        os.remove(self.journal_file)
+                except Exception as e:
+                    # The snapshot is written; an untrimmed journal only replays entries it already holds
+                    print(f"Error trimming journal: {e}")
+                    return
+                self._pending = max(0, self._pending - pending)
+        STORAGE_WRITE_LATENCY.labels("json", "snapshot").observe(time.perf_counter() - started)
+
+    def _journal_entry(self, op: str, key: str, data: Optional[Dict] = None) -> bool:
+        """Append one mutation to the journal; the caller holds the lock.
+
+        Returns False when write-behind is off and the caller has to write a
+        snapshot instead, once it released the lock.
+        """
+        if self._journal is None:
+            return False
+        entry = {"op": op, "id": key}
+        if data is not None:
+            entry["data"] = data
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=2)
+            self._journal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._journal.flush()
         except Exception as e:
-            print(f"Error saving data: {e}")
+            print(f"Error writing journal: {e}")
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self._flush_now.set()
+        return True
+
+    def _flush_loop(self):
+        """Fold the journal into a snapshot periodically, or when asked to, until closed."""
+        while not self._closed.is_set():
+            self._flush_now.wait(self.flush_interval)
+            self._flush_now.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing data: {e}")
+
+    def flush(self):
+        """Write a snapshot now if there are journaled changes."""
+        if self._pending:
+            self._save_data()
 
     def get_user_preferences(self, user_id: int) -> Optional[UserPreferences]:
         """Get user preferences from storage."""
         if str(user_id) in self.data:
-            return UserPreferences.from_dict(self.data[str(user_id)])
+            return UserPreferences.from_dict(dict(self.data[str(user_id)]))
         return None
 
     def save_user_preferences(self, preferences: UserPreferences):
         """Save user preferences to storage."""
-        self.data[str(preferences.user_id)] = preferences.to_dict()
-        self._save_data()
+        started = time.perf_counter()
+        key = str(preferences.user_id)
+        data = preferences.to_dict()
+        with self._lock:
+            self.data[key] = data
+            journaled = self._journal_entry("set", key, data)
+        if not journaled:
+            self._save_data(durable=False)
+        STORAGE_WRITE_LATENCY.labels("json", "set").observe(time.perf_counter() - started)
 
     def delete_user_preferences(self, user_id: int):
         """Delete user preferences from storage."""
-        if str(user_id) in self.data:
-            del self.data[str(user_id)]
-            self._save_data()
+        started = time.perf_counter()
+        key = str(user_id)
+        with self._lock:
+            if key not in self.data:
+                return
+            del self.data[key]
+            journaled = self._journal_entry("del", key)
+        if not journaled:
+            self._save_data(durable=False)
+        STORAGE_WRITE_LATENCY.labels("json", "del").observe(time.perf_counter() - started)
+
+    def iter_user_data(self) -> Iterator[Dict]:
+        """Iterate over the stored dictionaries of every user."""
+        return iter(list(self.data.values()))
+
+    def close(self):
+        """Flush pending writes and stop the background flusher."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._journal is not None:
+            self._flush_now.set()
+            self._flusher.join()
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+def create_storage(state=None) -> BaseStorage:
+    """Create the storage backend selected by the STORAGE_BACKEND environment variable.
+
+    The "state" backend keeps preferences in the given state backend.
+    """
+    backend = os.getenv("STORAGE_BACKEND", "json").lower()
+    if backend == "state":
+        from utils.state_storage import StateStorage
+        if state is None:
+            raise ValueError("The state storage backend needs a state backend")
+        return StateStorage(state)
+    if backend == "sqlite":
+        from utils.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(
+            os.getenv("STORAGE_PATH", "data/user_preferences.db"),
+            migrate_from=os.getenv("STORAGE_MIGRATE_FROM", "data/user_preferences.json")
+        )
+    if backend == "json":
+        return Storage(
+            os.getenv("STORAGE_PATH", "data/user_preferences.json"),
+            write_behind=os.getenv("STORAGE_WRITE_BEHIND", "1") == "1",
+            flush_interval=float(os.getenv("STORAGE_FLUSH_INTERVAL", "5")),
+            flush_every=int(os.getenv("STORAGE_FLUSH_EVERY", "500"))
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,126 @@
+import logging
+import os
+import signal
+import time
+from typing import Callable, Dict, Optional
+from utils.logger import stop_listeners
+
+logger = logging.getLogger('weather_bot.supervisor')
+
+_SIGNALS = {signal.SIGTERM, signal.SIGINT}
+
+class Supervisor:
+    """Run ``workers`` forked copies of a worker function and keep them running.
+
+    Each child calls ``target(index)`` and exits with its return value.
+    Children that exit are started again after a delay that doubles with
+    every consecutive failure of the same index, up to ``max_restart_delay``;
+    a child that ran for ``stable_after`` seconds resets it.
+
+    SIGTERM or SIGINT is passed on to every child, and children still
+    running ``grace`` seconds later are killed.
+    """
+
+    def __init__(self, workers: int, target: Callable[[int], Optional[int]],
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0,
+                 stable_after: float = 60.0, grace: float = 30.0):
+        self.workers = workers
+        self.target = target
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.stable_after = stable_after
+        self.grace = grace
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self._started: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+        self._pending: Dict[int, float] = {}  # worker index -> restart time
+        self._deadline: Optional[float] = None
+
+    @property
+    def stopping(self) -> bool:
+        return self._deadline is not None
+
+    def _spawn(self, index: int):
+        # Signals stay blocked until the child has dropped the parent's handlers
+        signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+        try:
+            pid = os.fork()
+            if pid == 0:
+                for signum in _SIGNALS:
+                    signal.signal(signum, signal.SIG_DFL)
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+                code = 1
+                try:
+                    code = self.target(index) or 0
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else 1
+                except BaseException:
+                    logger.exception("Worker %s crashed", index)
+                finally:
+                    stop_listeners()
+                    os._exit(code)
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+        self.children[pid] = index
+        self._started[pid] = time.monotonic()
+        logger.info("Started worker %s (pid %s)", index, pid)
+
+    def _reap(self):
+        """Collect exited children and schedule their restart."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            started = self._started.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            if started is not None and time.monotonic() - started >= self.stable_after:
+                self._failures[index] = 0
+            failures = self._failures[index] = self._failures.get(index, 0) + 1
+            delay = min(self.max_restart_delay, self.restart_delay * 2 ** (failures - 1))
+            logger.warning("Worker %s (pid %s) exited with code %s, restarting it in %.0fs",
+                           index, pid, os.waitstatus_to_exitcode(status), delay)
+            self._pending[index] = time.monotonic() + delay
+
+    def stop(self, signum=None, frame=None):
+        """Ask every child to stop; a second call kills them."""
+        if self.stopping:
+            self._deadline = 0.0
+            return
+        logger.info("Stopping %s workers", len(self.children))
+        self._deadline = time.monotonic() + self.grace
+        self._pending.clear()
+        self._signal(signal.SIGTERM)
+
+    def _signal(self, signum: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def run(self, poll_interval: float = 0.2) -> int:
+        """Start the workers and supervise them until stopped and every child has exited."""
+        for signum in _SIGNALS:
+            signal.signal(signum, self.stop)
+        for index in range(self.workers):
+            self._spawn(index)
+        while self.children or self._pending:
+            time.sleep(poll_interval)
+            self._reap()
+            now = time.monotonic()
+            if self.stopping:
+                if self.children and now >= self._deadline:
+                    logger.warning("Killing %s workers that did not stop in time", len(self.children))
+                    self._signal(signal.SIGKILL)
+                continue
+            for index, restart_at in list(self._pending.items()):
+                if restart_at <= now:
+                    del self._pending[index]
+                    self._spawn(index)
+        logger.info("All workers stopped")
+        return 0
@@ -0,0 +1,268 @@
+import asyncio
+import time
+from typing import Dict, Iterable, List, Optional
+import httpx
+from models.weather_snapshot import CurrentSnapshot, ForecastSnapshot
+from utils.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError, backoff_delay
+from utils.metrics import REGISTRY
+from utils.quota import QuotaBudgeter, QuotaExceededError
+
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "weatherapi_request_seconds", "WeatherAPI request latency.", ("endpoint", "method")
+)
+UPSTREAM_RESPONSES = REGISTRY.counter(
+    "weatherapi_responses_total", "WeatherAPI responses by status code, or \"error\" when no response arrived.",
+    ("endpoint", "status")
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "weatherapi_retries_total", "WeatherAPI requests retried after a transient failure.", ("endpoint",)
+)
+
+NO_LOCATION_FOUND = 1006  # WeatherAPI error code for an unknown "q" value
+
+class LocationNotFoundError(LookupError):
+    """WeatherAPI does not know the requested location."""
+
+# Failures meaning WeatherAPI could not answer right now, as opposed to a bad request
+UPSTREAM_ERRORS = (httpx.HTTPError, QuotaExceededError, CircuitOpenError)
+
+def _raise_for_status(response: httpx.Response):
+    """Raise LocationNotFoundError for unknown locations, or httpx's error for other failures."""
+    if response.status_code == 400:
+        try:
+            error = response.json().get("error", {})
+        except ValueError:
+            error = {}
+        if error.get("code") == NO_LOCATION_FOUND:
+            raise LocationNotFoundError(error.get("message", "No matching location found."))
+    response.raise_for_status()
+
+def _is_transient(response: httpx.Response) -> bool:
+    """Check whether a response signals an upstream failure worth retrying."""
+    return response.status_code >= 500
+
+class WeatherClient:
+    """Async WeatherAPI client sharing one keep-alive connection pool.
+
+    Each endpoint has its own circuit breaker. Transport errors and 5xx
+    answers are retried up to ``retries`` times with jittered exponential
+    backoff; once ``failure_threshold`` calls in a row have failed, calls to
+    that endpoint raise CircuitOpenError without touching the network until
+    ``reset_timeout`` seconds have passed.
+    """
+
+    def __init__(self, api_key: str, base_url: str = "http://api.weatherapi.com/v1",
+                 timeout: float = 10.0, max_connections: int = 100,
+                 max_keepalive_connections: int = 20, bulk_chunk_size: int = 50,
+                 bulk_concurrency: int = 10, budget: Optional[QuotaBudgeter] = None,
+                 retries: int = 2, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.api_key = api_key
+        self.budget = budget
+        self.retries = retries
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        REGISTRY.callback_gauge(
+            "weatherapi_circuit_open", "Whether the circuit breaker of a WeatherAPI endpoint is open.", ("endpoint",),
+            lambda: {(name,): float(breaker.state == OPEN) for name, breaker in self.breakers.items()}
+        )
+        self.bulk_chunk_size = bulk_chunk_size
+        self.bulk_concurrency = bulk_concurrency
+        self.bulk_supported = True  # Cleared when the plan rejects bulk requests
+        self.base_url = base_url.rstrip("/")
+        self._timeout = httpx.Timeout(timeout, connect=min(timeout, 5.0))
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=30.0
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+                http1=True,
+                http2=False
+            )
+        return self._client
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        """Return the circuit breaker guarding an endpoint."""
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                endpoint, self.failure_threshold, self.reset_timeout
+            )
+        return breaker
+
+    async def _send(self, method: str, endpoint: str, cost: int, **kwargs) -> httpx.Response:
+        """Send one request, recording its latency and status code.
+
+        ``cost`` calls are first taken from the quota budget, if there is one;
+        a 429 answer empties the budget for the Retry-After period.
+        """
+        if self.budget is not None:
+            await self.budget.acquire(cost)
+        started = time.perf_counter()
+        status = "error"
+        try:
+            response = await self.client.request(method, f"/{endpoint}", **kwargs)
+            status = str(response.status_code)
+            if response.status_code == 429 and self.budget is not None:
+                retry_after = response.headers.get("Retry-After", "")
+                self.budget.throttle(float(retry_after) if retry_after.isdigit() else None)
+            return response
+        finally:
+            UPSTREAM_LATENCY.labels(endpoint, method).observe(time.perf_counter() - started)
+            UPSTREAM_RESPONSES.labels(endpoint, status).inc()
+
+    async def _request(self, method: str, endpoint: str, cost: int = 1,
+                       retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Send a request through the endpoint's circuit breaker, retrying transient failures.
+
+        Raises CircuitOpenError when the circuit is open. The last 5xx answer
+        is returned once the retries are used up; the last transport error
+        is raised.
+        """
+        breaker = self.breaker(endpoint)
+        retries = self.retries if retries is None else retries
+        attempt = 0
+        while True:
+            breaker.before_call()
+            try:
+                response = await self._send(method, endpoint, cost, **kwargs)
+            except httpx.TransportError:
+                breaker.record_failure()
+                if attempt >= retries or breaker.state == OPEN:
+                    raise
+            except BaseException:
+                breaker.release()  # Budget refusals and cancellations say nothing about the upstream
+                raise
+            else:
+                if response.status_code == 429:
+                    breaker.release()
+                    return response
+                if not _is_transient(response):
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt >= retries or breaker.state == OPEN:
+                    return response
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+            UPSTREAM_RETRIES.labels(endpoint).inc()
+
+    async def _get(self, endpoint: str, params: Dict, timeout: Optional[float] = None) -> Dict:
+        """Issue a GET against a WeatherAPI endpoint and return the decoded JSON."""
+        query = {"key": self.api_key, **params}
+        kwargs = {"params": query}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self._request("GET", endpoint, **kwargs)
+        _raise_for_status(response)
+        return response.json()
+
+    async def get_current(self, location: str, timeout: Optional[float] = None) -> CurrentSnapshot:
+        """Fetch current weather for a location."""
+        data = await self._get("current.json", {"q": location}, timeout=timeout)
+        return CurrentSnapshot.from_response(data)
+
+    async def get_forecast(self, location: str, days: int = 3,
+                           timeout: Optional[float] = None) -> ForecastSnapshot:
+        """Fetch a forecast of the given number of days for a location."""
+        data = await self._get("forecast.json", {"q": location, "days": days}, timeout=timeout)
+        return ForecastSnapshot.from_response(data)
+
+    async def _post_bulk(self, endpoint: str, locations: List[str], params: Dict,
+                         parse) -> Dict[str, Dict]:
+        """POST one bulk request and map each location to its parsed response."""
+        payload = {"locations": [{"q": location, "custom_id": str(i)} for i, location in enumerate(locations)]}
+        response = await self._request(
+            "POST", endpoint, cost=len(locations), retries=0,
+            params={"key": self.api_key, "q": "bulk", **params}, json=payload
+        )
+        response.raise_for_status()
+        results = {}
+        for item in response.json().get("bulk", []):
+            query = item.get("query", {})
+            try:
+                location = locations[int(query.get("custom_id"))]
+            except (TypeError, ValueError, IndexError):
+                continue
+            if "error" not in query and "location" in query:
+                results[location] = parse(query)
+        return results
+
+    async def _fetch_many(self, endpoint: str, locations: Iterable[str], params: Dict,
+                          parse, fetch_one) -> Dict[str, Dict]:
+        """Fetch many locations through bulk requests, or parallel GETs when bulk is unavailable.
+
+        Locations that fail, that the quota budget cannot cover, or whose
+        endpoint circuit is open are left out of the result instead of raising.
+        Bulk requests are not retried, since failed chunks fall back to GETs.
+        """
+        locations = list(dict.fromkeys(locations))
+        results: Dict[str, Dict] = {}
+        if not locations:
+            return results
+        semaphore = asyncio.Semaphore(self.bulk_concurrency)
+
+        fallback = locations
+        if self.bulk_supported:
+            size = self.bulk_chunk_size
+            if self.budget is not None:
+                # A bulk call costs one call per location; keep chunks affordable
+                size = max(1, min(size, int(self.budget.max_cost())))
+            chunks = [locations[i:i + size] for i in range(0, len(locations), size)]
+
+            async def post(chunk: List[str]) -> Dict[str, Dict]:
+                async with semaphore:
+                    return await self._post_bulk(endpoint, chunk, params, parse)
+
+            fallback = []
+            outcomes = await asyncio.gather(*(post(chunk) for chunk in chunks), return_exceptions=True)
+            for chunk, outcome in zip(chunks, outcomes):
+                if isinstance(outcome, (QuotaExceededError, CircuitOpenError)):
+                    continue
+                if isinstance(outcome, BaseException):
+                    if isinstance(outcome, httpx.HTTPStatusError) and outcome.response.status_code in (400, 401, 403):
+                        self.bulk_supported = False  # Plan without bulk access
+                    elif not isinstance(outcome, httpx.HTTPError):
+                        raise outcome
+                    fallback.extend(chunk)
+                else:
+                    results.update(outcome)
+
+        async def get(location: str):
+            async with semaphore:
+                try:
+                    results[location] = await fetch_one(location)
+                except (httpx.HTTPError, LocationNotFoundError, QuotaExceededError, CircuitOpenError):
+                    pass
+
+        await asyncio.gather(*(get(location) for location in fallback))
+        return results
+
+    async def get_current_bulk(self, locations: Iterable[str]) -> Dict[str, CurrentSnapshot]:
+        """Fetch current weather for many locations, keyed by location."""
+        return await self._fetch_many(
+            "current.json", locations, {}, CurrentSnapshot.from_response, self.get_current
+        )
+
+    async def get_forecast_bulk(self, locations: Iterable[str], days: int = 3) -> Dict[str, ForecastSnapshot]:
+        """Fetch forecasts for many locations, keyed by location."""
+        return await self._fetch_many(
+            "forecast.json", locations, {"days": days}, ForecastSnapshot.from_response,
+            lambda location: self.get_forecast(location, days=days)
+        )
+
+    async def close(self):
+        """Close the underlying connection pool."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
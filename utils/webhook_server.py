@@ -0,0 +1,74 @@
+import hmac
+import json
+import logging
+import re
+from asyncio import Queue
+from http import HTTPStatus
+from typing import Optional
+from telegram import Bot, Update
+from telegram.ext import Application, ExtBot
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.web import Application as TornadoApplication, RequestHandler
+
+logger = logging.getLogger('weather_bot.webhook')
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+class WebhookHandler(RequestHandler):
+    """Accept Telegram's webhook POSTs and queue the updates for the application."""
+
+    SUPPORTED_METHODS = ("POST",)
+
+    def initialize(self, bot: Bot, update_queue: Queue, secret_token: Optional[str]):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.secret_token = secret_token
+
+    async def post(self):
+        if self.secret_token is not None and not hmac.compare_digest(
+                self.request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            self.send_error(HTTPStatus.FORBIDDEN)
+            return
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.bot)
+        except Exception as e:
+            logger.error("Invalid webhook payload: %s", e)
+            self.send_error(HTTPStatus.BAD_REQUEST)
+            return
+        if update is None:
+            self.send_error(HTTPStatus.BAD_REQUEST)
+            return
+        if isinstance(self.bot, ExtBot):
+            self.bot.insert_callback_data(update)
+        await self.update_queue.put(update)
+        self.set_status(HTTPStatus.OK)
+
+    def log_exception(self, typ, value, tb):
+        logger.error("Webhook handler failed", exc_info=(typ, value, tb))
+
+class WebhookServer:
+    """Serve the Telegram webhook for an initialized application.
+
+    Unlike Application.run_webhook, the listening socket can be bound with
+    SO_REUSEPORT, so several worker processes can accept connections on the
+    same port and the kernel spreads them between the workers. Setting the
+    webhook with Telegram is left to the caller, since it must happen once
+    and not in every worker.
+    """
+
+    def __init__(self, application: Application, url_path: str, secret_token: Optional[str] = None):
+        self.server = HTTPServer(TornadoApplication([
+            (rf"/{re.escape(url_path.strip('/'))}/?", WebhookHandler,
+             {"bot": application.bot, "update_queue": application.update_queue, "secret_token": secret_token})
+        ]))
+
+    def listen(self, port: int, address: str = "0.0.0.0", reuse_port: bool = True):
+        """Start accepting connections; must be called from the running event loop."""
+        self.server.add_sockets(bind_sockets(port, address, reuse_port=reuse_port))
+        logger.info("Serving the webhook on %s:%s", address, port)
+
+    async def stop(self):
+        """Stop accepting connections and close the open ones."""
+        self.server.stop()
+        await self.server.close_all_connections()
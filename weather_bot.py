@@ -1,12 +1,13 @@
 import os
+import asyncio
 import logging
+import signal
 import sys
 import traceback
 from datetime import datetime, time
 import pytz
-import requests
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, error as telegram_error
+from telegram import Bot, Update, error as telegram_error
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -15,13 +16,31 @@ from telegram.ext import (
     ContextTypes,
     filters,
 )
+from apscheduler.events import EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from models.user_preferences import UserPreferences
+from models.user_registry import UserRegistry
 from models.weather_cache import WeatherCache
-from utils.logger import setup_logger
-from utils.storage import Storage
+from models.weather_snapshot import ForecastSnapshot
+from utils.logger import dropped_records, setup_logger, use_worker_log_file
+from utils.storage import create_storage
 from utils.keyboard_handler import KeyboardHandler
+from utils.weather_client import UPSTREAM_ERRORS, WeatherClient
+from utils.cache_store import SQLiteCacheStore, StateCacheStore
+from utils.state_backend import create_state_backend
+from utils.leader import LeaderLease
+from utils.supervisor import Supervisor
+from utils.webhook_server import WebhookServer
+from utils.conversation_state import (
+    EXPECTING_LOCATION, EXPECTING_TEMP_LIMITS, EXPECTING_TIME, ConversationState
+)
+from utils.location_resolver import LocationResolver
+from utils.notification_dispatcher import NotificationDispatcher
+from utils.alert_engine import AlertEngine, BELOW_MIN
+from utils.callback_router import CallbackRouter
+from utils.metrics import REGISTRY, MetricsServer, instrument_handler
+from utils.quota import BACKGROUND, VALIDATION, QuotaBudgeter, quota_priority, with_priority
+from utils.messages import DEFAULT_LANGUAGE, LANGUAGES, condition_text, format_age, format_date, render
 
 # Configure exception handling
 def handle_exception(exc_type, exc_value, exc_traceback):
@@ -38,202 +57,549 @@ logger = setup_logger('weather_bot')
 # Constants
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')  # Updated to match .env file
-WEATHER_BASE_URL = 'http://api.weatherapi.com/v1'
+WEATHER_BASE_URL = os.getenv('WEATHER_BASE_URL', 'http://api.weatherapi.com/v1')
+WEATHER_API_TIMEOUT = float(os.getenv('WEATHER_API_TIMEOUT', '10'))
 PORT = int(os.environ.get('PORT', '8443'))
+NOTIFICATION_CONCURRENCY = int(os.getenv('NOTIFICATION_CONCURRENCY', '20'))
+NOTIFICATION_CATCH_UP_MINUTES = int(os.getenv('NOTIFICATION_CATCH_UP_MINUTES', '15'))
+WEATHER_CACHE_L2_PATH = os.getenv('WEATHER_CACHE_L2_PATH', 'data/weather_cache.db')
+REGISTRY_SYNC_SECONDS = float(os.getenv('REGISTRY_SYNC_SECONDS', '2'))  # Shared storage only
+WEATHER_CACHE_STALE_TTL = int(os.getenv('WEATHER_CACHE_STALE_TTL', '300'))
+HOT_LOCATIONS = int(os.getenv('HOT_LOCATIONS', '50'))
+WEATHER_CACHE_POLICY = os.getenv('WEATHER_CACHE_POLICY', 'tinylfu')
+WEATHER_CACHE_CURRENT_BYTES = int(os.getenv('WEATHER_CACHE_CURRENT_BYTES', str(8 * 1024 * 1024)))
+WEATHER_CACHE_FORECAST_BYTES = int(os.getenv('WEATHER_CACHE_FORECAST_BYTES', str(32 * 1024 * 1024)))
+ALERT_SWEEP_MINUTES = int(os.getenv('ALERT_SWEEP_MINUTES', '10'))
+ALERT_HYSTERESIS = float(os.getenv('ALERT_HYSTERESIS', '1.0'))
+# WeatherAPI plan limits shared by every call (empty rate disables budgeting)
+WEATHER_API_RATE_PER_MINUTE = os.getenv('WEATHER_API_RATE_PER_MINUTE', '600')
+WEATHER_API_BURST = os.getenv('WEATHER_API_BURST', '')
+# Retries per call and the circuit breaker guarding each WeatherAPI endpoint
+WEATHER_API_RETRIES = int(os.getenv('WEATHER_API_RETRIES', '2'))
+WEATHER_API_BREAKER_THRESHOLD = int(os.getenv('WEATHER_API_BREAKER_THRESHOLD', '5'))
+WEATHER_API_BREAKER_RESET = float(os.getenv('WEATHER_API_BREAKER_RESET', '30'))
+METRICS_PORT = os.getenv('METRICS_PORT', '9090')  # Empty disables the metrics endpoint
+# Webhook worker processes; more than one needs shared state (see README)
+WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or None
+LEADER_LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS', '15'))
+
+# Jobs run by a single process: the one holding the scheduler lease
+LEADER_JOBS = ('daily_dispatch', 'alert_sweep', 'cache_purge', 'dispatch_catch_up')
+
+SCHEDULER_LAG = REGISTRY.histogram(
+    "weather_bot_scheduler_lag_seconds", "Delay between a job's scheduled and actual start.", ("job",),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 30.0, 60.0)
+)
+SCHEDULER_MISSED = REGISTRY.counter(
+    "weather_bot_scheduler_missed_total", "Job runs skipped because they started too late.", ("job",)
+)
 
 class WeatherBot:
-    def __init__(self):
-        self.cache = WeatherCache()
-        self.storage = Storage()
+    def __init__(self, workers: int = 1, worker_index: int = 0):
+        self.workers = workers
+        self.worker_index = worker_index
+        # A shared state backend holds the L2 cache, locks and conversation
+        # steps, so several bot processes can serve the same users
+        self.state = create_state_backend()
+        if self.state.shared:
+            self.cache_store = StateCacheStore(self.state)
+        else:
+            self.cache_store = SQLiteCacheStore(WEATHER_CACHE_L2_PATH) if WEATHER_CACHE_L2_PATH else None
+        self.cache = WeatherCache(
+            store=self.cache_store,
+            stale_ttl=WEATHER_CACHE_STALE_TTL,
+            policy=WEATHER_CACHE_POLICY,
+            current_max_bytes=WEATHER_CACHE_CURRENT_BYTES,
+            forecast_max_bytes=WEATHER_CACHE_FORECAST_BYTES,
+            locks=self.state if self.state.shared else None
+        )
+        self.conversations = ConversationState(self.state)
+        self.storage = create_storage(self.state)
+        self.users = UserRegistry(self.storage)
         self.keyboard_handler = KeyboardHandler()
+        # Each worker budgets its share of the plan
+        self.quota = QuotaBudgeter(
+            float(WEATHER_API_RATE_PER_MINUTE) / workers,
+            burst=float(WEATHER_API_BURST) / workers if WEATHER_API_BURST else None
+        ) if WEATHER_API_RATE_PER_MINUTE else None
+        self.weather_client = WeatherClient(
+            WEATHER_API_KEY, WEATHER_BASE_URL, timeout=WEATHER_API_TIMEOUT, budget=self.quota,
+            retries=WEATHER_API_RETRIES, failure_threshold=WEATHER_API_BREAKER_THRESHOLD,
+            reset_timeout=WEATHER_API_BREAKER_RESET
+        )
+        self.location_resolver = LocationResolver(backend=self.state)
+        self.dispatcher = NotificationDispatcher(
+            self.users,
+            self.fetch_forecast,
+            self.format_daily_notification,
+            self.send_notification,
+            max_concurrency=NOTIFICATION_CONCURRENCY,
+            catch_up_minutes=NOTIFICATION_CATCH_UP_MINUTES,
+            prefetch=lambda locations: self.prefetch_forecasts(locations, days=1)
+        )
+        self.alert_engine = AlertEngine(
+            self.users,
+            self.fetch_current_weather,
+            self.format_temperature_alert,
+            self.send_notification,
+            hysteresis=ALERT_HYSTERESIS,
+            max_concurrency=NOTIFICATION_CONCURRENCY,
+            prefetch=self.prefetch_current_weather,
+            state=self.state
+        )
+        self.router = CallbackRouter(self.users.load_user_preferences)
+        self.register_routes()
+        self.bot = None  # Set from the running application in post_init
         self.scheduler = AsyncIOScheduler()
-        self.scheduler.start()
+        self.scheduler.add_listener(self.observe_job, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+        self.metrics_server = None
+        self.register_metrics()
+        # With several workers only the lease holder runs the leader jobs
+        self.leader = LeaderLease(
+            self.state, ttl=LEADER_LEASE_SECONDS,
+            on_elected=self.take_over_jobs, on_deposed=self.hand_over_jobs
+        ) if workers > 1 else None
+
+    def schedule_jobs(self):
+        """Register the recurring jobs; safe to call again, existing jobs are replaced.
+
+        With several workers the leader jobs are left to the lease holder,
+        and every worker contends for the lease instead. Each worker refreshes
+        the hot locations of its own cache, which also prunes its access counts.
+        """
+        # Keep the locations most requested from this worker fresh before they expire
+        self.scheduler.add_job(
+            with_priority(BACKGROUND, self.cache.refresh_hot),
+            'interval',
+            minutes=1,
+            args=[HOT_LOCATIONS],
+            id='cache_refresh',
+            replace_existing=True,
+            coalesce=True
+        )
+        if self.storage.shared:
+            # Pick up preference changes made by the other bot processes
+            self.scheduler.add_job(
+                self.sync_registry,
+                'interval',
+                seconds=REGISTRY_SYNC_SECONDS,
+                id='registry_sync',
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1
+            )
+        if self.leader is None:
+            self.schedule_leader_jobs()
+            return
+        self.scheduler.add_job(
+            self.leader.step,
+            'interval',
+            seconds=self.leader.ttl / 3,
+            id='leader_lease',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
+    def schedule_leader_jobs(self):
+        """Register the notification, alert and cache purge jobs.
+
+        The daily notification schedule itself is the registry's minute index,
+        rebuilt from storage at startup, so no per-user jobs are needed.
+        Jobs calling WeatherAPI are charged to the background quota class.
+        """
+        tick = with_priority(BACKGROUND, self.dispatcher.tick)
+        # One job per minute serves every user's daily notification
+        self.scheduler.add_job(
+            tick,
+            'cron',
+            minute='*',
+            id='daily_dispatch',
+            replace_existing=True,
+            coalesce=True,
+            misfire_grace_time=30
+        )
+        self.scheduler.add_job(
+            with_priority(BACKGROUND, self.alert_engine.sweep),
+            'interval',
+            minutes=ALERT_SWEEP_MINUTES,
+            id='alert_sweep',
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+        if self.cache_store is not None:
+            self.scheduler.add_job(
+                self.cache_store.purge,
+                'interval',
+                hours=1,
+                args=[24 * 3600],
+                id='cache_purge',
+                replace_existing=True
+            )
+        # Deliver the minutes missed while the bot was restarting
+        self.scheduler.add_job(tick, id='dispatch_catch_up', replace_existing=True)
+
+    def unschedule_leader_jobs(self):
+        """Remove the jobs registered by schedule_leader_jobs."""
+        for job_id in LEADER_JOBS:
+            if self.scheduler.get_job(job_id) is not None:
+                self.scheduler.remove_job(job_id)
+
+    async def take_over_jobs(self):
+        """Start the leader jobs in this worker after it took the scheduler lease.
+
+        The registry and the last dispatched minute are brought up to date
+        first, so the catch-up run covers the minutes the previous leader
+        missed, and the alert arrays are rebuilt with the alert states the
+        previous leader persisted.
+        """
+        logger.info("Worker %s is now running the scheduled jobs", self.worker_index)
+        await self.sync_registry()
+        self.dispatcher.reload_state()
+        self.alert_engine.reset()
+        self.schedule_leader_jobs()
+
+    async def hand_over_jobs(self):
+        """Stop the leader jobs in this worker after it lost the scheduler lease."""
+        logger.info("Worker %s stopped running the scheduled jobs", self.worker_index)
+        self.unschedule_leader_jobs()
+
+    def register_metrics(self):
+        """Expose the cache and registry counters as scrape-time gauges."""
+        REGISTRY.callback_gauge(
+            "weather_cache_hit_ratio", "Weather cache hit ratio per tier.", ("tier",),
+            lambda: {(tier,): ratio for tier, ratio in self.cache.hit_ratios().items()}
+        )
+        REGISTRY.callback_gauge(
+            "weather_cache_events", "Weather cache event counters since startup.", ("event",),
+            lambda: {(event,): count for event, count in self.cache.stats.items()}
+        )
+        REGISTRY.callback_gauge(
+            "weather_cache_l1_bytes", "Approximate bytes held by each in-memory cache.", ("endpoint",),
+            lambda: {(endpoint,): stats["bytes"] for endpoint, stats in self.cache.policy_stats().items()}
+        )
+        REGISTRY.callback_gauge(
+            "weather_cache_l1_entries", "Entries held by each in-memory cache.", ("endpoint",),
+            lambda: {(endpoint,): stats["entries"] for endpoint, stats in self.cache.policy_stats().items()}
+        )
+        REGISTRY.callback_gauge(
+            "weather_cache_policy_events",
+            "Admissions, admission rejections, evictions and expirations of each in-memory cache since startup.",
+            ("endpoint", "event"),
+            lambda: {
+                (endpoint, event): count
+                for endpoint, stats in self.cache.policy_stats().items()
+                for event, count in stats.items() if event not in ("bytes", "entries")
+            }
+        )
+        REGISTRY.callback_gauge(
+            "weather_bot_users", "Users loaded in the registry.", (),
+            lambda: {(): len(self.users)}
+        )
+        REGISTRY.callback_gauge(
+            "weather_bot_log_records_dropped", "Log records dropped because the logging queue was full.", (),
+            lambda: {(): dropped_records()}
+        )
+
+    def observe_job(self, event):
+        """Record how late a scheduler job started, or that it was missed."""
+        if event.code == EVENT_JOB_MISSED:
+            SCHEDULER_MISSED.labels(event.job_id).inc()
+            return
+        now = datetime.now(event.scheduled_run_times[-1].tzinfo)
+        lag = (now - event.scheduled_run_times[-1]).total_seconds()
+        SCHEDULER_LAG.labels(event.job_id).observe(max(0.0, lag))
+
+    async def post_init(self, application: Application):
+        """Keep a reference to the running application's bot and start the scheduler."""
+        self.bot = application.bot
+        if METRICS_PORT and self.metrics_server is None:
+            # Workers serve their metrics on consecutive ports
+            self.metrics_server = MetricsServer(port=int(METRICS_PORT) + self.worker_index)
+            self.metrics_server.start()
+        self.schedule_jobs()
+        if not self.scheduler.running:
+            self.scheduler.start()
+        if self.leader is not None:
+            await self.leader.step()
+        logger.info("Scheduler started with %s users loaded, %s cache entries rehydrated",
+                    len(self.users), self.cache.stats['rehydrated'])
+
+    async def shutdown(self, application: Application):
+        """Release shared resources when the application stops."""
+        if self.leader is not None:
+            await self.leader.release()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        await self.weather_client.close()
+        self.storage.close()
+        if self.cache_store is not None:
+            self.cache_store.close()
+        self.state.close()
+
+    async def sync_registry(self):
+        """Apply the preference changes other processes wrote to shared storage."""
+        try:
+            updated = self.users.apply_changes(await asyncio.to_thread(self.users.fetch_changes))
+        except Exception as e:
+            logger.error("Error syncing the user registry: %s", e)
+            return
+        if updated:
+            logger.debug("Registry synced %s users", updated)
+
+    async def fetch_current_weather(self, location: str) -> dict:
+        """Get current weather from cache, coalescing concurrent upstream fetches."""
+        location = self.location_resolver.lookup(location) or location
+        return await self.cache.get_or_fetch(
+            "current", location,
+            lambda: self.weather_client.get_current(location)
+        )
+
+    async def fetch_forecast(self, location: str, days: int) -> dict:
+        """Get a forecast from cache, coalescing concurrent upstream fetches."""
+        location = self.location_resolver.lookup(location) or location
+        return await self.cache.get_or_fetch_forecast(
+            location, days,
+            lambda horizon: self.weather_client.get_forecast(location, days=horizon)
+        )
+
+    async def last_known(self, endpoint: str, location: str):
+        """Return the newest cached reading for a location and its age in seconds, or None."""
+        entry = await self.cache.last_known(endpoint, self.location_resolver.lookup(location) or location)
+        if entry is None:
+            return None
+        return entry[1], max(0.0, datetime.now().timestamp() - entry[0])
+
+    async def fetch_current_weather_or_last_known(self, location: str):
+        """Get current weather, falling back to the last known reading while WeatherAPI is unavailable.
+
+        Returns the reading and, when it is past its TTL because refreshing
+        it failed, or for a fallback, its age in seconds (else None).
+        """
+        try:
+            current = await self.fetch_current_weather(location)
+            return current, await self.cache.failed_refresh_age(
+                "current", self.location_resolver.lookup(location) or location
+            )
+        except UPSTREAM_ERRORS:
+            fallback = await self.last_known("current", location)
+            if fallback is None:
+                raise
+            logger.warning("WeatherAPI unavailable, serving current weather for %s from %.0fs ago",
+                           location, fallback[1])
+            return fallback
+
+    async def fetch_forecast_or_last_known(self, location: str, days: int):
+        """Get a forecast, falling back to the last known one while WeatherAPI is unavailable.
+
+        Returns the forecast and, when it is past its TTL because refreshing
+        it failed, or for a fallback, its age in seconds (else None).
+        """
+        try:
+            forecast = await self.fetch_forecast(location, days)
+            return forecast, await self.cache.failed_refresh_age(
+                "forecast", self.location_resolver.lookup(location) or location
+            )
+        except UPSTREAM_ERRORS:
+            fallback = await self.last_known("forecast", location)
+            if fallback is None:
+                raise
+            logger.warning("WeatherAPI unavailable, serving forecast for %s from %.0fs ago",
+                           location, fallback[1])
+            return fallback[0].slice(days), fallback[1]
+
+    async def validate_location(self, location: str) -> dict:
+        """Fetch current weather for free-text input, remembering unknown locations."""
+        with quota_priority(VALIDATION):
+            return await self.cache.get_or_fetch(
+                "current", location,
+                lambda: self.weather_client.get_current(location)
+            )
+
+    async def prefetch_current_weather(self, locations):
+        """Fill the cache with current weather for many locations using bulk requests."""
+        keys = {self.location_resolver.lookup(location) or location for location in locations}
+        missing = [key for key in keys if await self.cache.get_current_weather(key) is None]
+        results = await self.weather_client.get_current_bulk(missing)
+        for key, data in results.items():
+            await self.cache.set_current_weather(key, data)
+
+    async def prefetch_forecasts(self, locations, days: int):
+        """Fill the cache with forecasts for many locations using bulk requests."""
+        keys = {self.location_resolver.lookup(location) or location for location in locations}
+        missing = [key for key in keys if await self.cache.get_forecast(key, days) is None]
+        horizon = max(days, self.cache.forecast_horizon)
+        results = await self.weather_client.get_forecast_bulk(missing, days=horizon)
+        for key, data in results.items():
+            await self.cache.set_forecast(key, data)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Send a message when the command /start is issued."""
         user_id = update.effective_user.id
-        preferences = self.storage.get_user_preferences(user_id)
+        preferences = await self.users.load_user_preferences(user_id)
         
         if not preferences:
-            preferences = UserPreferences(user_id=user_id)
-            self.storage.save_user_preferences(preferences)
+            preferences = self.users.create(user_id)
+            await self.users.save_user_preferences(preferences)
 
-        welcome_message = (
-            "¡Bienvenido al Bicho_Bot del Clima!\n\n"
-            "Selecciona una opción del menú:"
-        )
         await update.message.reply_text(
-            welcome_message,
-            reply_markup=self.keyboard_handler.get_main_menu()
+            render(preferences.language, "welcome"),
+            reply_markup=self.keyboard_handler.get_main_menu(preferences.language)
         )
 
+    def register_routes(self):
+        """Build the callback router's route tables."""
+        router = self.router
+        router.add("weather", lambda update, context, preferences, argument: self.get_weather(update, context))
+        router.add("forecast", lambda update, context, preferences, argument: self.get_forecast(update, context))
+        # Routes that only show a message with a keyboard
+        for data, message, keyboard in (
+            ("settings", "settings", "settings"),
+            ("alerts", "alerts", "alerts"),
+            ("main_menu", "main_menu", "main"),
+            ("change_unit", "ask_unit", "unit"),
+            ("change_language", "ask_language", "language"),
+            ("help", "help", "main"),
+        ):
+            router.add(data, self.show_menu(message, keyboard), needs_preferences=True)
+        router.add("change_location", self.ask_location, needs_preferences=True)
+        router.add("daily_notification", self.ask_notification_time, needs_preferences=True)
+        router.add("temp_alerts", self.ask_temp_limits, needs_preferences=True)
+        router.add("daily_summary", self.toggle_daily_summary, needs_preferences=True)
+        router.add("disable_alerts", self.disable_alerts, needs_preferences=True)
+        router.add_prefix("unit_", self.set_unit, needs_preferences=True)
+        router.add_prefix("lang_", self.set_language, needs_preferences=True)
+
     async def button_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle button presses."""
-        query = update.callback_query
-        await query.answer()
-        user_id = query.from_user.id
-        preferences = self.storage.get_user_preferences(user_id)
-
-        if query.data == "weather":
-            await self.get_weather(update, context)
-        elif query.data == "forecast":
-            await self.get_forecast(update, context)
-        elif query.data == "settings":
-            await query.edit_message_text(
-                "Configuración\n\nSelecciona una opción:",
-                reply_markup=self.keyboard_handler.get_settings_menu()
-            )
-        elif query.data == "alerts":
-            await query.edit_message_text(
-                "Configuración de Alertas\n\nSelecciona una opción:",
-                reply_markup=self.keyboard_handler.get_alert_menu()
-            )
-        elif query.data == "main_menu":
-            await query.edit_message_text(
-                "Menú Principal:",
-                reply_markup=self.keyboard_handler.get_main_menu()
-            )
-        elif query.data == "change_location":
-            context.user_data['expecting_location'] = True
-            await query.edit_message_text(
-                "Por favor, envía el nombre de tu ciudad.\n"
-                "Ejemplo: Madrid",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Volver", callback_data="settings")
-                ]])
-            )
-        elif query.data == "change_unit":
-            await query.edit_message_text(
-                "Selecciona tu unidad de temperatura preferida:",
-                reply_markup=self.keyboard_handler.get_temperature_unit_menu()
-            )
-        elif query.data.startswith("unit_"):
-            unit = query.data.split("_")[1]
-            if preferences:
-                preferences.temperature_unit = unit
-                self.storage.save_user_preferences(preferences)
-                await query.edit_message_text(
-                    f"Unidad de temperatura cambiada a {unit}°",
-                    reply_markup=self.keyboard_handler.get_settings_menu()
-                )
-        elif query.data == "daily_notification":
-            await query.edit_message_text(
-                "Configura el horario para recibir el pronóstico diario:\n\n"
-                "Por favor, envía la hora en formato HH:MM (24h)\n"
-                "Ejemplo: 08:00",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Volver", callback_data="settings")
-                ]])
-            )
-            context.user_data['expecting_time'] = True
-        elif query.data == "change_language":
-            await query.edit_message_text(
-                "Selecciona tu idioma preferido:",
-                reply_markup=self.keyboard_handler.get_language_menu()
-            )
-        elif query.data.startswith("lang_"):
-            lang = query.data.split("_")[1]
-            if preferences:
-                preferences.language = lang
-                self.storage.save_user_preferences(preferences)
-                message = "Language changed to English" if lang == "en" else "Idioma cambiado a Español"
-                await query.edit_message_text(
-                    message,
-                    reply_markup=self.keyboard_handler.get_settings_menu()
-                )
-        elif query.data == "temp_alerts":
-            await query.edit_message_text(
-                "Configura las alertas de temperatura\n\n"
-                "Envía los límites de temperatura en formato: MIN MAX\n"
-                "Ejemplo: 15 25",
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Volver", callback_data="alerts")
-                ]])
+        await update.callback_query.answer()
+        await self.router.dispatch(update, context)
+
+    def show_menu(self, message: str, keyboard: str):
+        """Build a route handler that shows a catalog message with a prebuilt keyboard."""
+        async def handler(update, context, preferences, argument):
+            lang = self.language(preferences)
+            await update.callback_query.edit_message_text(
+                render(lang, message),
+                reply_markup=self.keyboard_handler.get_keyboard(keyboard, lang)
             )
-            context.user_data['expecting_temp_limits'] = True
-        elif query.data == "daily_summary":
-            if not preferences or not preferences.location:
-                await query.edit_message_text(
-                    "Primero debes configurar tu ubicación en el menú de configuración.",
-                    reply_markup=self.keyboard_handler.get_alert_menu()
-                )
-            else:
-                preferences.daily_forecast = not preferences.daily_forecast
-                self.storage.save_user_preferences(preferences)
-                status = "activado" if preferences.daily_forecast else "desactivado"
-                await query.edit_message_text(
-                    f"Resumen diario {status}",
-                    reply_markup=self.keyboard_handler.get_alert_menu()
-                )
-        elif query.data == "disable_alerts":
-            if preferences:
-                preferences.temp_alert_thresholds = None
-                preferences.daily_forecast = False
-                self.storage.save_user_preferences(preferences)
-            await query.edit_message_text(
-                "Todas las alertas han sido desactivadas",
-                reply_markup=self.keyboard_handler.get_alert_menu()
+        return handler
+
+    async def ask_location(self, update, context, preferences, argument):
+        lang = self.language(preferences)
+        await self.conversations.expect(update.callback_query.from_user.id, EXPECTING_LOCATION)
+        await update.callback_query.edit_message_text(
+            render(lang, "ask_location"),
+            reply_markup=self.keyboard_handler.get_back_button("settings", lang)
+        )
+
+    async def ask_notification_time(self, update, context, preferences, argument):
+        lang = self.language(preferences)
+        await update.callback_query.edit_message_text(
+            render(lang, "ask_notification_time"),
+            reply_markup=self.keyboard_handler.get_back_button("settings", lang)
+        )
+        await self.conversations.expect(update.callback_query.from_user.id, EXPECTING_TIME)
+
+    async def ask_temp_limits(self, update, context, preferences, argument):
+        lang = self.language(preferences)
+        await update.callback_query.edit_message_text(
+            render(lang, "ask_temp_limits"),
+            reply_markup=self.keyboard_handler.get_back_button("alerts", lang)
+        )
+        await self.conversations.expect(update.callback_query.from_user.id, EXPECTING_TEMP_LIMITS)
+
+    async def set_unit(self, update, context, preferences, unit):
+        if preferences and unit in ("C", "F"):
+            preferences.temperature_unit = unit
+            await self.users.save_user_preferences(preferences)
+            await update.callback_query.edit_message_text(
+                render(preferences.language, "unit_changed", unit=unit),
+                reply_markup=self.keyboard_handler.get_settings_menu(preferences.language)
             )
-        elif query.data == "help":
-            help_text = (
-                "Ayuda del Bicho_Bot del Clima\n\n"
-                "Clima Actual: Ver el clima actual en tu ubicación\n"
-                "Pronóstico: Ver pronóstico de 3 días\n"
-                "Configuración: Cambiar ubicación, unidades, etc.\n"
-                "Alertas: Configurar alertas de temperatura\n\n"
-                "Para cambiar tu ubicación:\n"
-                "1. Ve a Configuración\n"
-                "2. Selecciona 'Cambiar Ubicación'\n"
-                "3. Envía el nombre de tu ciudad\n\n"
-                "Para configurar alertas:\n"
-                "1. Ve a Alertas\n"
-                "2. Elige el tipo de alerta\n"
-                "3. Sigue las instrucciones en pantalla"
+
+    async def set_language(self, update, context, preferences, lang):
+        if preferences and lang in LANGUAGES:
+            preferences.language = lang
+            await self.users.save_user_preferences(preferences)
+            await update.callback_query.edit_message_text(
+                render(lang, "language_changed"),
+                reply_markup=self.keyboard_handler.get_settings_menu(lang)
             )
-            await query.edit_message_text(
-                help_text,
-                reply_markup=self.keyboard_handler.get_main_menu()
+
+    async def toggle_daily_summary(self, update, context, preferences, argument):
+        lang = self.language(preferences)
+        if not preferences or not preferences.location:
+            await update.callback_query.edit_message_text(
+                render(lang, "summary_requires_location"),
+                reply_markup=self.keyboard_handler.get_alert_menu(lang)
             )
+            return
+        preferences.daily_forecast = not preferences.daily_forecast
+        await self.users.save_user_preferences(preferences)
+        await update.callback_query.edit_message_text(
+            render(lang, "summary_on" if preferences.daily_forecast else "summary_off"),
+            reply_markup=self.keyboard_handler.get_alert_menu(lang)
+        )
+
+    async def disable_alerts(self, update, context, preferences, argument):
+        if preferences:
+            preferences.temp_alert_thresholds = None
+            preferences.daily_forecast = False
+            await self.users.save_user_preferences(preferences)
+        lang = self.language(preferences)
+        await update.callback_query.edit_message_text(
+            render(lang, "alerts_disabled"),
+            reply_markup=self.keyboard_handler.get_alert_menu(lang)
+        )
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle incoming messages."""
-        if not context.user_data:
+        user_id = update.effective_user.id
+        preferences = await self.users.load_user_preferences(user_id)
+        lang = self.language(preferences)
+        step = await self.conversations.get(user_id)
+
+        if step is None:
             await update.message.reply_text(
-                "Por favor, usa el menú principal:",
-                reply_markup=self.keyboard_handler.get_main_menu()
+                render(lang, "use_menu"),
+                reply_markup=self.keyboard_handler.get_main_menu(lang)
             )
             return
-
-        user_id = update.effective_user.id
-        preferences = self.storage.get_user_preferences(user_id)
         
-        if context.user_data.get('expecting_location'):
+        if step == EXPECTING_LOCATION:
             location = update.message.text.strip()
             try:
-                # Verify location with API
-                url = f"{WEATHER_BASE_URL}/current.json"
-                params = {'key': WEATHER_API_KEY, 'q': location}
-                response = requests.get(url, params=params)
-                response.raise_for_status()
+                # Verify location with API, unless this spelling was resolved before
+                canonical, weather_data = await self.location_resolver.resolve(
+                    location, self.validate_location
+                )
+                if weather_data:
+                    # The validation response is a fresh current.json answer
+                    await self.cache.set_current_weather(canonical, weather_data)
                 
                 if preferences:
-                    preferences.location = location
-                    self.storage.save_user_preferences(preferences)
+                    preferences.location = canonical
+                    await self.users.save_user_preferences(preferences)
                 
                 await update.message.reply_text(
-                    f"Ubicación establecida en: {location}",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "location_set", name=self.location_resolver.get_name(canonical)),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             except Exception as e:
-                logger.error(f"Error validating location: {str(e)}")
+                logger.error("Error validating location: %s", e)
                 await update.message.reply_text(
-                    "No se pudo encontrar esa ubicación. Por favor, intenta con otra.",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "location_not_found"),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             finally:
-                context.user_data['expecting_location'] = False
+                await self.conversations.clear(user_id)
 
-        elif context.user_data.get('expecting_time'):
+        elif step == EXPECTING_TIME:
             try:
                 time_str = update.message.text.strip()
                 hour, minute = map(int, time_str.split(':'))
@@ -241,24 +607,23 @@ class WeatherBot:
                 
                 if preferences:
                     preferences.notification_time = notification_time
-                    self.storage.save_user_preferences(preferences)
-                    await self.set_daily_notification(user_id, notification_time)
+                    await self.users.save_user_preferences(preferences)
                 
                 # Format time for display
                 formatted_time = f"{notification_time.hour:02d}:{notification_time.minute:02d}"
                 await update.message.reply_text(
-                    f"Notificaciones diarias configuradas para las {formatted_time}",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "notification_time_set", time=formatted_time),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             except ValueError:
                 await update.message.reply_text(
-                    "Formato de hora inválido. Por favor, usa el formato HH:MM (ejemplo: 08:00)",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "invalid_time"),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             finally:
-                context.user_data['expecting_time'] = False
+                await self.conversations.clear(user_id)
 
-        elif context.user_data.get('expecting_temp_limits'):
+        elif step == EXPECTING_TEMP_LIMITS:
             try:
                 temp_min, temp_max = map(float, update.message.text.strip().split())
                 if temp_min >= temp_max:
@@ -266,21 +631,20 @@ class WeatherBot:
                 
                 if preferences:
                     preferences.temp_alert_thresholds = (temp_min, temp_max)
-                    self.storage.save_user_preferences(preferences)
+                    await self.users.save_user_preferences(preferences)
                 
                 await update.message.reply_text(
-                    f"Alertas de temperatura configuradas:\n"
-                    f"Mínima: {temp_min}°{preferences.temperature_unit}\n"
-                    f"Máxima: {temp_max}°{preferences.temperature_unit}",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "temp_limits_set", min=temp_min, max=temp_max,
+                           unit=preferences.temperature_unit),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             except ValueError:
                 await update.message.reply_text(
-                    "Formato inválido. Por favor, envía dos números separados por espacio (ejemplo: 15 25)",
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    render(lang, "invalid_temp_limits"),
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             finally:
-                context.user_data['expecting_temp_limits'] = False
+                await self.conversations.clear(user_id)
 
     async def get_weather(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Get current weather for user's location."""
@@ -289,60 +653,50 @@ class WeatherBot:
         else:
             user_id = update.message.from_user.id
 
-        preferences = self.storage.get_user_preferences(user_id)
+        preferences = self.users.get_user_preferences(user_id)
 
         if not preferences or not preferences.location:
             await self.request_location(update, context)
             return
+        lang = preferences.language
 
         try:
-            # Check cache first
-            cached_weather = self.cache.get_current_weather(preferences.location)
-            if cached_weather:
-                weather_data = cached_weather
-            else:
-                # Make API request if not cached
-                url = f"{WEATHER_BASE_URL}/current.json"
-                params = {
-                    'key': WEATHER_API_KEY,
-                    'q': preferences.location
-                }
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                weather_data = response.json()
-                self.cache.set_current_weather(preferences.location, weather_data)
+            current, age = await self.fetch_current_weather_or_last_known(preferences.location)
 
             # Format weather message
-            current = weather_data['current']
-            location_data = weather_data['location']
-            
-            temp = current['temp_c']
+            temp = current.temp_c
             if preferences.temperature_unit == 'F':
-                temp = current['temp_f']
+                temp = current.temp_f
             
-            weather_message = (
-                f"Clima en {location_data['name']}, {location_data['country']}\n"
-                f"Temperatura: {temp}°{preferences.temperature_unit}\n"
-                f"Condición: {self.translate_condition(current['condition']['text'])}\n"
-                f"Humedad: {current['humidity']}%\n"
-                f"Viento: {current['wind_kph']} km/h"
+            weather_message = render(
+                lang, "current_weather",
+                name=current.location_name,
+                country=current.country,
+                temp=temp,
+                unit=preferences.temperature_unit,
+                condition=condition_text(lang, current.condition_code, current.is_day,
+                                         current.condition_text),
+                humidity=current.humidity,
+                wind=current.wind_kph
             )
+            if age is not None:
+                weather_message += render(lang, "stale_notice", age=format_age(lang, age))
 
             # Check if this is a callback query or direct command
             if update.callback_query:
                 await update.callback_query.edit_message_text(
                     weather_message,
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             else:
                 await update.message.reply_text(
                     weather_message,
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
 
         except Exception as e:
-            logger.error(f"Error fetching weather: {str(e)}")
-            error_message = "Lo siento, hubo un error al obtener los datos del clima. Por favor, intenta nuevamente más tarde."
+            logger.error("Error fetching weather: %s", e)
+            error_message = render(lang, "weather_error")
             if update.callback_query:
                 await update.callback_query.edit_message_text(error_message)
             else:
@@ -350,29 +704,22 @@ class WeatherBot:
 
     async def request_location(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Request location from user."""
-        message = (
-            "Por favor, establece primero tu ubicación.\n"
-            "Introduce el nombre de tu ciudad.\n"
-            "Ejemplo: Madrid"
-        )
+        preferences = self.users.get_user_preferences(update.effective_user.id)
+        lang = self.language(preferences)
+        message = render(lang, "location_required")
         
-        # Set the flag to expect location input
-        if context:
-            context.user_data['expecting_location'] = True
+        # Expect the location as the user's next message
+        await self.conversations.expect(update.effective_user.id, EXPECTING_LOCATION)
         
         if update.callback_query:
             await update.callback_query.edit_message_text(
                 message,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Volver", callback_data="main_menu")
-                ]])
+                reply_markup=self.keyboard_handler.get_back_button("main_menu", lang)
             )
         else:
             await update.message.reply_text(
                 message,
-                reply_markup=InlineKeyboardMarkup([[
-                    InlineKeyboardButton("« Volver", callback_data="main_menu")
-                ]])
+                reply_markup=self.keyboard_handler.get_back_button("main_menu", lang)
             )
 
     async def get_forecast(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -382,205 +729,105 @@ class WeatherBot:
         else:
             user_id = update.message.from_user.id
 
-        preferences = self.storage.get_user_preferences(user_id)
+        preferences = self.users.get_user_preferences(user_id)
 
         if not preferences or not preferences.location:
             await self.request_location(update, context)
             return
+        lang = preferences.language
 
         try:
-            url = f"{WEATHER_BASE_URL}/forecast.json"
-            params = {
-                'key': WEATHER_API_KEY,
-                'q': preferences.location,
-                'days': 3
-            }
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            forecast_data = response.json()
-
-            forecast_message = f"Pronóstico de 3 días para {forecast_data['location']['name']}:\n\n"
-            
-            for day in forecast_data['forecast']['forecastday']:
-                date = datetime.strptime(day['date'], '%Y-%m-%d').strftime('%A, %d de %B')
-                # Translate weekday names
-                date = date.replace('Monday', 'Lunes').replace('Tuesday', 'Martes').replace('Wednesday', 'Miércoles')
-                date = date.replace('Thursday', 'Jueves').replace('Friday', 'Viernes').replace('Saturday', 'Sábado')
-                date = date.replace('Sunday', 'Domingo')
-                # Translate month names
-                date = date.replace('January', 'enero').replace('February', 'febrero').replace('March', 'marzo')
-                date = date.replace('April', 'abril').replace('May', 'mayo').replace('June', 'junio')
-                date = date.replace('July', 'julio').replace('August', 'agosto').replace('September', 'septiembre')
-                date = date.replace('October', 'octubre').replace('November', 'noviembre').replace('December', 'diciembre')
-                
-                temp_max = day['day']['maxtemp_c']
-                temp_min = day['day']['mintemp_c']
-                if preferences.temperature_unit == 'F':
-                    temp_max = day['day']['maxtemp_f']
-                    temp_min = day['day']['mintemp_f']
-
-                forecast_message += (
-                    f"{date}\n"
-                    f"Máxima: {temp_max}°{preferences.temperature_unit}\n"
-                    f"Mínima: {temp_min}°{preferences.temperature_unit}\n"
-                    f"Condición: {self.translate_condition(day['day']['condition']['text'])}\n"
-                    f"Probabilidad de lluvia: {day['day']['daily_chance_of_rain']}%\n\n"
+            forecast_data, age = await self.fetch_forecast_or_last_known(preferences.location, days=3)
+
+            unit = preferences.temperature_unit
+            fahrenheit = unit == 'F'
+            forecast_message = render(
+                lang, "forecast_header", days=len(forecast_data.days), name=forecast_data.location_name
+            ) + "".join(
+                render(
+                    lang, "forecast_day",
+                    date=format_date(lang, day.date),
+                    max=day.maxtemp_f if fahrenheit else day.maxtemp_c,
+                    min=day.mintemp_f if fahrenheit else day.mintemp_c,
+                    unit=unit,
+                    condition=condition_text(lang, day.condition_code, fallback=day.condition_text),
+                    rain=day.chance_of_rain
                 )
+                for day in forecast_data.days
+            )
+            if age is not None:
+                forecast_message += render(lang, "stale_notice", age=format_age(lang, age))
 
             try:
                 await update.callback_query.edit_message_text(
                     forecast_message,
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             except telegram_error.BadRequest as e:
                 if "Message is not modified" not in str(e):
                     raise e
 
         except Exception as e:
-            logger.error(f"Error fetching forecast: {str(e)}")
-            error_message = "Lo siento, hubo un error al obtener el pronóstico. Por favor, intenta nuevamente más tarde."
+            logger.error("Error fetching forecast: %s", e)
+            error_message = render(lang, "forecast_error")
             try:
                 await update.callback_query.edit_message_text(
                     error_message,
-                    reply_markup=self.keyboard_handler.get_main_menu()
+                    reply_markup=self.keyboard_handler.get_main_menu(lang)
                 )
             except telegram_error.BadRequest as e:
                 if "Message is not modified" not in str(e):
                     raise e
 
-    async def set_daily_notification(self, user_id: int, notification_time: time):
-        """Schedule daily weather notification."""
-        job_id = f"daily_{user_id}"
-        
-        # Remove existing job if any
-        self.scheduler.remove_job(job_id)
-        
-        # Add new job
-        self.scheduler.add_job(
-            self.send_daily_notification,
-            'cron',
-            hour=notification_time.hour,
-            minute=notification_time.minute,
-            args=[user_id],
-            id=job_id
+    def format_daily_notification(self, preferences, data: ForecastSnapshot) -> str:
+        """Format the daily forecast message for a user."""
+        current = data.current
+        forecast = data.days[0]
+        location_name = data.location_name
+
+        temp = current.temp_c
+        temp_max = forecast.maxtemp_c
+        temp_min = forecast.mintemp_c
+        if preferences.temperature_unit == 'F':
+            temp = current.temp_f
+            temp_max = forecast.maxtemp_f
+            temp_min = forecast.mintemp_f
+
+        return render(
+            preferences.language, "daily_notification",
+            name=location_name,
+            temp=temp,
+            max=temp_max,
+            min=temp_min,
+            unit=preferences.temperature_unit,
+            condition=condition_text(preferences.language, forecast.condition_code,
+                                     fallback=forecast.condition_text),
+            rain=forecast.chance_of_rain
         )
 
-    async def send_daily_notification(self, user_id: int):
-        """Send daily weather notification."""
-        preferences = self.storage.get_user_preferences(user_id)
-        if preferences and preferences.location and preferences.daily_forecast:
-            try:
-                # Get weather data
-                url = f"{WEATHER_BASE_URL}/forecast.json"
-                params = {
-                    'key': WEATHER_API_KEY,
-                    'q': preferences.location,
-                    'days': 1
-                }
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-
-                # Format message
-                current = data['current']
-                forecast = data['forecast']['forecastday'][0]['day']
-                location_name = data['location']['name']
-                
-                temp = current['temp_c']
-                temp_max = forecast['maxtemp_c']
-                temp_min = forecast['mintemp_c']
-                if preferences.temperature_unit == 'F':
-                    temp = current['temp_f']
-                    temp_max = forecast['maxtemp_f']
-                    temp_min = forecast['mintemp_f']
-
-                message = (
-                    f"Buenos días! Aquí está tu pronóstico diario para {location_name}:\n\n"
-                    f"Temperatura actual: {temp}°{preferences.temperature_unit}\n"
-                    f"Máxima: {temp_max}°{preferences.temperature_unit}\n"
-                    f"Mínima: {temp_min}°{preferences.temperature_unit}\n"
-                    f"Condición: {self.translate_condition(forecast['condition']['text'])}\n"
-                    f"Probabilidad de lluvia: {forecast['daily_chance_of_rain']}%"
-                )
-
-                # Send message
-                application = Application.builder().token(TELEGRAM_TOKEN).build()
-                async with application:
-                    await application.bot.send_message(chat_id=user_id, text=message)
-
-            except Exception as e:
-                logger.error(f"Error sending daily notification: {str(e)}")
-
-    def translate_condition(self, condition):
-        """Translate weather conditions to Spanish."""
-        translations = {
-            'Clear': 'Despejado',
-            'Sunny': 'Soleado',
-            'Partly cloudy': 'Parcialmente nublado',
-            'Cloudy': 'Nublado',
-            'Overcast': 'Cubierto',
-            'Mist': 'Neblina',
-            'Patchy rain possible': 'Posible lluvia dispersa',
-            'Patchy rain nearby': 'Lluvia cerca',
-            'Patchy snow possible': 'Posible nieve dispersa',
-            'Patchy sleet possible': 'Posible aguanieve dispersa',
-            'Patchy freezing drizzle possible': 'Posible llovizna helada dispersa',
-            'Patchy snow nearby': 'Nieve cerca',
-            'Patchy drizzle nearby': 'Llovizna cerca', 
-            'Light rain with thunder': 'Lluvia ligera con truenos',
-            'Thunderstorm': 'Tormenta eléctrica',
-            'Heavy thunderstorm': 'Tormenta eléctrica intensa',
-            'Drizzle': 'Llovizna',
-            'Heavy drizzle': 'Llovizna intensa',
-            'Rain': 'Lluvia',
-            'Snow': 'Nieve',
-            'Sleet': 'Aguanieve',
-            'Thunderstorm with rain': 'Tormenta eléctrica con lluvia',
-            'Thunderstorm with drizzle': 'Tormenta eléctrica con llovizna',
-            'Thunderstorm with hail': 'Tormenta eléctrica con granizo',
-            'Patchy light drizzle': 'Llovizna ligera dispersa',
-            'Moderate drizzle': 'Llovizna moderada',
-            'Moderate rain at times': 'Lluvia moderada por momentos',
-            'Heavy rain at times': 'Lluvia intensa por momentos',
-            'Moderate or heavy snow showers': 'Nevadas moderadas o intensas',
-            'Thundery outbreaks possible': 'Posibles tormentas eléctricas',
-            'Blowing snow': 'Ventisca',
-            'Blizzard': 'Tormenta de nieve',
-            'Fog': 'Niebla',
-            'Freezing fog': 'Niebla helada',
-            'Light drizzle': 'Llovizna ligera',
-            'Freezing drizzle': 'Llovizna helada',
-            'Heavy freezing drizzle': 'Llovizna helada intensa',
-            'Light rain': 'Lluvia ligera',
-            'Moderate rain': 'Lluvia moderada',
-            'Heavy rain': 'Lluvia intensa',
-            'Light freezing rain': 'Lluvia helada ligera',
-            'Moderate or heavy freezing rain': 'Lluvia helada moderada o intensa',
-            'Light sleet': 'Aguanieve ligera',
-            'Moderate or heavy sleet': 'Aguanieve moderada o intensa',
-            'Light snow': 'Nieve ligera',
-            'Moderate snow': 'Nieve moderada',
-            'Heavy snow': 'Nieve intensa',
-            'Ice pellets': 'Granizo',
-            'Light rain shower': 'Lluvia ligera intermitente',
-            'Moderate or heavy rain shower': 'Lluvia moderada o intensa intermitente',
-            'Torrential rain shower': 'Lluvia torrencial',
-            'Light sleet showers': 'Aguanieve ligera intermitente',
-            'Moderate or heavy sleet showers': 'Aguanieve moderada o intensa intermitente',
-            'Light snow showers': 'Nevada ligera intermitente',
-            'Moderate or heavy snow showers': 'Nevada moderada o intensa intermitente',
-            'Light showers of ice pellets': 'Granizo ligero intermitente',
-            'Moderate or heavy showers of ice pellets': 'Granizo moderado o intenso intermitente',
-            'Patchy light rain with thunder': 'Lluvia ligera dispersa con truenos',
-            'Moderate or heavy rain with thunder': 'Lluvia moderada o intensa con truenos',
-            'Patchy light snow with thunder': 'Nieve ligera dispersa con truenos',
-            'Moderate or heavy snow with thunder': 'Nieve moderada o intensa con truenos'
-        }
-        return translations.get(condition, condition)
+    def format_temperature_alert(self, preferences, temp: float, direction: int) -> str:
+        """Format a temperature alert message for a user."""
+        temp_min, temp_max = preferences.temp_alert_thresholds
+        if direction == BELOW_MIN:
+            return render(preferences.language, "alert_below", temp=temp, limit=temp_min,
+                          unit=preferences.temperature_unit)
+        return render(preferences.language, "alert_above", temp=temp, limit=temp_max,
+                      unit=preferences.temperature_unit)
+
+    async def send_notification(self, user_id: int, message: str):
+        """Send a proactive message to a user through the running application's bot."""
+        if self.bot is None:
+            raise RuntimeError("Bot is not initialized yet")
+        await self.bot.send_message(chat_id=user_id, text=message)
+
+    @staticmethod
+    def language(preferences) -> str:
+        """Return the message language of a user, or the default for unknown users."""
+        return preferences.language if preferences else DEFAULT_LANGUAGE
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle errors."""
-        logger.error(f"Error: {context.error}")
+        logger.error("Error: %s", context.error)
         
         try:
             if isinstance(context.error, telegram_error.BadRequest):
@@ -589,7 +836,11 @@ class WeatherBot:
                     return
                 
             # For any other error, send a message to the user
-            error_message = "Lo siento, ha ocurrido un error. Por favor, intenta nuevamente."
+            preferences = None
+            if update and update.effective_user:
+                preferences = self.users.get_user_preferences(update.effective_user.id)
+            lang = self.language(preferences)
+            error_message = render(lang, "error")
             if update and update.effective_chat:
                 if update.callback_query:
                     await update.callback_query.answer(error_message)
@@ -597,10 +848,93 @@ class WeatherBot:
                     await context.bot.send_message(
                         chat_id=update.effective_chat.id,
                         text=error_message,
-                        reply_markup=self.keyboard_handler.get_main_menu()
+                        reply_markup=self.keyboard_handler.get_main_menu(lang)
                     )
         except Exception as e:
-            logger.error(f"Error in error handler: {e}")
+            logger.error("Error in error handler: %s", e)
+
+def build_application(weather_bot: WeatherBot, updater: bool = True) -> Application:
+    """Create the Application and register the bot's handlers.
+
+    Without an updater the caller feeds the update queue itself, as the
+    webhook workers do.
+    """
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        .post_init(weather_bot.post_init)
+        .post_shutdown(weather_bot.shutdown)
+    )
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
+
+    # Add handlers
+    application.add_handler(CommandHandler("start", instrument_handler("command:start", weather_bot.start)))
+    application.add_handler(CallbackQueryHandler(weather_bot.button_handler))
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND, instrument_handler("message", weather_bot.handle_message)
+    ))
+
+    # Add error handler
+    application.add_error_handler(weather_bot.error_handler)
+    return application
+
+async def serve_worker(index: int):
+    """Run one webhook worker until it receives SIGTERM or SIGINT.
+
+    Application.run_webhook cannot share its port, so the worker starts the
+    application by hand and serves the webhook on a SO_REUSEPORT socket.
+    """
+    use_worker_log_file(index)
+    weather_bot = WeatherBot(workers=WEB_WORKERS, worker_index=index)
+    application = build_application(weather_bot, updater=False)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    await application.initialize()
+    await weather_bot.post_init(application)
+    await application.start()
+    server = WebhookServer(application, TELEGRAM_TOKEN, secret_token=WEBHOOK_SECRET)
+    server.listen(PORT)
+    logger.info("Worker %s started (pid %s)", index, os.getpid())
+    try:
+        await stopping.wait()
+    finally:
+        logger.info("Worker %s stopping", index)
+        await server.stop()
+        await application.stop()
+        await weather_bot.shutdown(application)
+        await application.shutdown()
+
+def run_worker(index: int) -> int:
+    """Entry point of a forked webhook worker."""
+    asyncio.run(serve_worker(index))
+    return 0
+
+async def set_webhook(webhook_url: str):
+    """Point Telegram at the webhook, once for all the workers."""
+    async with Bot(TELEGRAM_TOKEN) as bot:
+        await bot.set_webhook(webhook_url, secret_token=WEBHOOK_SECRET)
+
+def run_supervisor(webhook_url: str):
+    """Serve the webhook from WEB_WORKERS forked worker processes sharing PORT.
+
+    Every worker handles updates; the one holding the scheduler lease also
+    runs the notification jobs, and another takes over if it dies. Workers
+    must share their state, so a shared state backend and STORAGE_BACKEND=state
+    are required. Nothing touching that state is opened before forking.
+    """
+    if not create_state_backend().shared:
+        raise ValueError("WEB_WORKERS > 1 needs STATE_BACKEND=sqlite or STATE_BACKEND=redis")
+    if os.getenv('STORAGE_BACKEND', 'json').lower() != 'state':
+        raise ValueError("WEB_WORKERS > 1 needs STORAGE_BACKEND=state")
+    asyncio.run(set_webhook(webhook_url))
+    logger.info("Starting %s webhook workers on port %s", WEB_WORKERS, PORT)
+    Supervisor(WEB_WORKERS, run_worker).run()
 
 def main():
     """Start the bot."""
@@ -615,20 +949,20 @@ def main():
             raise ValueError("WEATHER_API_KEY environment variable is not set")
         
         logger.info("Environment variables loaded successfully")
-        
+
+        if WEB_WORKERS > 1:
+            if not os.environ.get('RAILWAY_STATIC_URL'):
+                raise ValueError("WEB_WORKERS > 1 needs webhook mode (RAILWAY_STATIC_URL)")
+            webhook_url = f"{os.environ.get('RAILWAY_STATIC_URL')}/{TELEGRAM_TOKEN}"
+            logger.info("Starting webhook workers on Railway URL: %s", webhook_url)
+            run_supervisor(webhook_url)
+            return
+
         # Create the bot instance
         weather_bot = WeatherBot()
         
         # Create the Application and pass it your bot's token
-        application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-        # Add handlers
-        application.add_handler(CommandHandler("start", weather_bot.start))
-        application.add_handler(CallbackQueryHandler(weather_bot.button_handler))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, weather_bot.handle_message))
-        
-        # Add error handler
-        application.add_error_handler(weather_bot.error_handler)
+        application = build_application(weather_bot)
 
         logger.info("Starting bot...")
         
@@ -636,14 +970,15 @@ def main():
         if os.environ.get('RAILWAY_STATIC_URL'):
             railway_url = os.environ.get('RAILWAY_STATIC_URL')
             webhook_url = f"{railway_url}/{TELEGRAM_TOKEN}"
-            logger.info(f"Starting webhook on Railway URL: {webhook_url}")
+            logger.info("Starting webhook on Railway URL: %s", webhook_url)
             
             # Start the webhook
             application.run_webhook(
                 listen="0.0.0.0",
                 port=int(os.environ.get('PORT', '8443')),
                 url_path=TELEGRAM_TOKEN,
-                webhook_url=webhook_url
+                webhook_url=webhook_url,
+                secret_token=WEBHOOK_SECRET
             )
         else:
             # For local development
@@ -651,7 +986,7 @@ def main():
             application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
             
     except Exception as e:
-        logger.error(f"Error starting bot: {e}")
+        logger.error("Error starting bot: %s", e)
         raise e
 
 if __name__ == '__main__':